@@ -0,0 +1,346 @@
+"""
+Per-artist market memo: recent normalized valuations, split by original vs print
+and by medium family, with the time each one was recorded.
+
+Identifications whose source text carried prices are recorded. The model's own
+estimates are not, and neither are memo-filled ranges, so the memo only ever
+holds prices seen in source text.
+For later requests about the same artist whose source text has no prices:
+    - valuation_split says whether the memo can value the artwork the text names,
+      in which case the server asks Claude to identify it only, without a valuation, and
+    - fill_valuation sets the range from the memo on the identified result.
+
+Stored in SQLite (WAL) next to the result cache so every worker on a host shares it.
+
+Usage:
+    python artist_memo.py rebuild [--result-cache PATH] [--corpus corpus.jsonl]
+    python artist_memo.py show "Artist Name"
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from price_tokenizer import CURRENCY_SYMBOLS, iter_price_amounts
+
+ARTIST_MEMO_PATH = os.getenv(
+    "ARTIST_MEMO_PATH", os.path.join(tempfile.gettempdir(), "worthify_artist_memo.sqlite3")
+)
+ARTIST_MEMO_MAX_AGE_DAYS = float(os.getenv("ARTIST_MEMO_MAX_AGE_DAYS", "180"))
+ARTIST_MEMO_MAX_PER_SPLIT = int(os.getenv("ARTIST_MEMO_MAX_PER_SPLIT", "20"))
+ARTIST_MEMO_MIN_SAMPLES = int(os.getenv("ARTIST_MEMO_MIN_SAMPLES", "2"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS valuations (
+    id INTEGER PRIMARY KEY,
+    artist_key TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    medium TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    low REAL NOT NULL,
+    high REAL NOT NULL,
+    source TEXT NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_valuations_split
+    ON valuations (artist_key, kind, medium, recorded_at);
+"""
+
+# Coarse medium families; anything unmatched is "other"
+_MEDIUM_FAMILIES = (
+    ("painting", ("oil", "acrylic", "canvas", "tempera", "panel", "painting")),
+    ("works on paper", ("watercolor", "watercolour", "gouache", "drawing", "pencil", "charcoal", "ink", "pastel")),
+    ("print", ("print", "lithograph", "etching", "woodcut", "giclée", "giclee", "serigraph", "poster")),
+    ("sculpture", ("bronze", "sculpture", "marble", "ceramic", "stone", "cast")),
+    ("photography", ("photograph", "gelatin silver", "c-print", "chromogenic")),
+)
+_MAGNITUDES = {"k": 1e3, "m": 1e6, "million": 1e6, "b": 1e9, "billion": 1e9}
+_AMOUNT_PARTS = re.compile(r"(\d[\d,\s]*(?:\.\d+)?)\s?(k|m|b|million|billion)?\b", re.IGNORECASE)
+
+
+def artist_key(name: Optional[str]) -> Optional[str]:
+    """Lookup key for an artist name: accents stripped, case-folded, punctuation collapsed"""
+    if not name:
+        return None
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    key = " ".join(re.sub(r"[^\w]+", " ", text).split())
+    return key or None
+
+
+def medium_family(medium: Optional[str]) -> str:
+    lowered = (medium or "").lower()
+    for family, keywords in _MEDIUM_FAMILIES:
+        if any(keyword in lowered for keyword in keywords):
+            return family
+    return "other"
+
+
+def _parse_amount(amount: str) -> Optional[Tuple[str, float]]:
+    """("$", 1500000.0) for "$1.5M"; the currency is the symbol or upper-cased code"""
+    symbol = next((char for char in amount if char in CURRENCY_SYMBOLS), None)
+    currency = symbol or re.sub(r"[^A-Za-z]", "", _AMOUNT_PARTS.sub(" ", amount)).upper()[:3]
+    match = _AMOUNT_PARTS.search(amount)
+    if not currency or not match:
+        return None
+    value = float(re.sub(r"[,\s]", "", match.group(1)))
+    if match.group(2):
+        value *= _MAGNITUDES[match.group(2).lower()]
+    return currency, value
+
+
+def parse_value_range(value_range: Optional[str]) -> Optional[Tuple[str, float, float]]:
+    """(currency, low, high) for a normalized estimated_value_range, or None if it has no amounts"""
+    if not value_range:
+        return None
+    parsed = [amount for amount in map(_parse_amount, iter_price_amounts(value_range)) if amount]
+    if not parsed:
+        return None
+    currency = parsed[0][0]
+    values = [value for amount_currency, value in parsed[:2] if amount_currency == currency]
+    return currency, min(values), max(values)
+
+
+def format_amount(currency: str, value: float) -> str:
+    if value >= 1e6:
+        number = f"{value / 1e6:,.1f}".rstrip("0").rstrip(".") + " million"
+    else:
+        number = f"{value:,.0f}"
+    return f"{currency}{number}" if currency in CURRENCY_SYMBOLS else f"{number} {currency}"
+
+
+def text_has_prices(text: Optional[str]) -> bool:
+    return bool(text) and next(iter_price_amounts(text), None) is not None
+
+
+class ArtistMarketMemo:
+    """SQLite-backed per-artist valuation index shared across processes"""
+
+    def __init__(
+        self,
+        path: str = ARTIST_MEMO_PATH,
+        max_age_days: float = ARTIST_MEMO_MAX_AGE_DAYS,
+        max_per_split: int = ARTIST_MEMO_MAX_PER_SPLIT,
+        min_samples: int = ARTIST_MEMO_MIN_SAMPLES
+    ):
+        """
+        Args:
+            path: SQLite file; every process using the same path shares the memo
+            max_age_days: Valuations older than this are ignored
+            max_per_split: Newest valuations kept per artist, kind and medium family
+            min_samples: Valuations needed before fill_valuation answers on its own
+        """
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_per_split = max_per_split
+        self.min_samples = min_samples
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._recorded = 0
+        self._fills = 0
+        self._errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record(self, result: Dict[str, Any], source: str, recorded_at: Optional[float] = None) -> bool:
+        """
+        Add a normalized result's valuation. source is "text" when the range came from
+        priced source text, "model" otherwise. Returns False when there is nothing to record.
+        """
+        key = artist_key(result.get("identified_artist"))
+        parsed = parse_value_range(result.get("estimated_value_range"))
+        if not key or not parsed:
+            return False
+
+        currency, low, high = parsed
+        kind = result.get("is_original_or_print") or "unknown"
+        medium = medium_family(result.get("medium_guess"))
+        try:
+            conn = self._connection()
+            conn.execute(
+                'INSERT INTO valuations (artist_key, artist, kind, medium, currency, low, high, source, recorded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, result["identified_artist"], kind, medium, currency, low, high, source,
+                 recorded_at or time.time())
+            )
+            conn.execute(
+                'DELETE FROM valuations WHERE artist_key = ? AND kind = ? AND medium = ? AND id NOT IN '
+                '(SELECT id FROM valuations WHERE artist_key = ? AND kind = ? AND medium = ? '
+                'ORDER BY recorded_at DESC LIMIT ?)',
+                (key, kind, medium, key, kind, medium, self.max_per_split)
+            )
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"Artist memo write error: {e}")
+            return False
+
+        self._count('_recorded')
+        return True
+
+    def summary(self, artist: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Aggregated fresh valuations per (kind, medium family), or None if the artist has none"""
+        key = artist_key(artist)
+        if not key:
+            return None
+
+        cutoff = time.time() - self.max_age_days * 86400
+        try:
+            rows = self._connection().execute(
+                'SELECT artist, kind, medium, currency, low, high, source, recorded_at FROM valuations '
+                'WHERE artist_key = ? AND recorded_at >= ? ORDER BY recorded_at DESC',
+                (key, cutoff)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"Artist memo read error: {e}")
+            return None
+
+        if not rows:
+            return None
+
+        grouped: Dict[Tuple[str, str], list] = {}
+        for row in rows:
+            grouped.setdefault((row[1], row[2]), []).append(row)
+
+        splits = {}
+        for (kind, medium), split_rows in grouped.items():
+            # Prefer prices seen in source text over model estimates
+            text_rows = [row for row in split_rows if row[6] == "text"]
+            split_rows = text_rows or split_rows
+            currency = statistics.mode(row[3] for row in split_rows)
+            split_rows = [row for row in split_rows if row[3] == currency]
+            low = statistics.median(row[4] for row in split_rows)
+            high = statistics.median(row[5] for row in split_rows)
+            splits[f"{kind}/{medium}"] = {
+                "kind": kind,
+                "medium": medium,
+                "value_range": f"{format_amount(currency, low)} - {format_amount(currency, high)}",
+                "samples": len(split_rows),
+                "from_source_text": bool(text_rows),
+                "last_seen": time.strftime("%Y-%m-%d", time.gmtime(split_rows[0][7])),
+            }
+
+        return {"artist": rows[0][0], "splits": splits}
+
+    def valuation_split(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The memo split fill_valuation would use for a result, or None if the memo cannot value it.
+        Prefers the matching kind and medium family, else the kind across media; an unknown
+        kind matches any kind. Only splits with at least min_samples valuations qualify.
+        """
+        summary = self.summary(result.get("identified_artist"))
+        if not summary:
+            return None
+
+        kind = result.get("is_original_or_print") or "unknown"
+        medium = medium_family(result.get("medium_guess"))
+        candidates = [
+            split for split in summary["splits"].values()
+            if split["samples"] >= self.min_samples and kind in ("unknown", split["kind"])
+        ]
+        same_medium = [split for split in candidates if split["medium"] == medium]
+        split = max(same_medium or candidates, key=lambda split: split["samples"], default=None)
+        return dict(split, artist=summary["artist"]) if split else None
+
+    def fill_valuation(self, result: Dict[str, Any]) -> bool:
+        """
+        Set estimated_value_range/value_reasoning of a normalized result from the memo,
+        using the split chosen by valuation_split. Returns True if the result was filled.
+        """
+        split = self.valuation_split(result)
+        if split is None:
+            return False
+
+        result["estimated_value_range"] = split["value_range"]
+        result["value_reasoning"] = (
+            f"Based on {split['samples']} recent valuations of {split['artist']}'s "
+            f"{split['kind']} {split['medium']} works (latest {split['last_seen']})."
+        )
+        self._count('_fills')
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            artists, valuations = self._connection().execute(
+                'SELECT COUNT(DISTINCT artist_key), COUNT(*) FROM valuations'
+            ).fetchone()
+        except sqlite3.Error:
+            artists = valuations = None
+
+        with self._stats_lock:
+            return {
+                'path': self.path,
+                'artists': artists,
+                'valuations': valuations,
+                'recorded': self._recorded,
+                'fills': self._fills,
+                'errors': self._errors,
+            }
+
+
+def _stored_results(result_cache_path: Optional[str], corpus_path: Optional[str]) -> Iterable[Tuple[dict, str]]:
+    """(normalized result, source) pairs priced by source text, from the local result cache and the extraction corpus"""
+    if result_cache_path and os.path.exists(result_cache_path):
+        conn = sqlite3.connect(result_cache_path)
+        try:
+            for (value,) in conn.execute("SELECT value FROM entries WHERE key LIKE 'identify:%'"):
+                result = json.loads(value)
+                reasoning = (result.get("value_reasoning") or "").lower()
+                if "source text" in reasoning:
+                    yield result, "text"
+        finally:
+            conn.close()
+
+    if corpus_path:
+        with open(corpus_path, encoding="utf-8") as corpus:
+            for line in corpus:
+                if line.strip():
+                    sample = json.loads(line)
+                    if text_has_prices(sample["source_text"]):
+                        yield sample["claude"], "text"
+
+
+def main():
+    from local_cache import RESULT_CACHE_PATH
+
+    parser = argparse.ArgumentParser(description="Artist market memo tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Record valuations from stored results")
+    rebuild.add_argument("--result-cache", default=RESULT_CACHE_PATH)
+    rebuild.add_argument("--corpus", help="JSONL recorded via EXTRACTION_CORPUS_PATH")
+    show = subparsers.add_parser("show", help="Print the memo summary for an artist")
+    show.add_argument("artist")
+    args = parser.parse_args()
+
+    memo = ArtistMarketMemo()
+    if args.command == "rebuild":
+        recorded = sum(memo.record(result, source) for result, source in _stored_results(args.result_cache, args.corpus))
+        print(f"Recorded {recorded} valuations; {json.dumps(memo.stats())}")
+    elif args.command == "show":
+        print(json.dumps(memo.summary(args.artist), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,106 @@
 """
 Worthify Artwork Identification Server
-POST /identify -> identifies artwork from an image URL using SearchAPI.io + Claude Haiku
+POST /identify -> identifies artwork from one or more photos of it using SearchAPI.io + Claude Haiku
+GET /health -> liveness
+GET /ready -> readiness: 503 until config is present and the first upstream warm-up attempt has
+              finished (or WARMUP_TIMEOUT has passed); later upstream errors are reported, not gated on
+GET /stats -> counters for the optional pipeline stages and caches
+
+API keys and upstream clients are resolved lazily on first use, so importing this
+module needs no credentials and stays fast.
 """
 
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import json
+import hmac
 import logging
 import os
 import re
-import time
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 
-import anthropic
 import requests
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+from price_tokenizer import find_plain_numeric_range, find_price_range, iter_price_amounts
+from url_canonicalizer import canonicalize_url
+
 load_dotenv()
 
-SEARCHAPI_KEY = os.environ["SEARCHAPI_KEY"]
-ANTHROPIC_API_KEY = os.environ["ANTHROPIC_API_KEY"]
+SEARCHAPI_URL = "https://www.searchapi.io/api/v1/search"
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 DEBUG_ERRORS = os.getenv("DEBUG_ERRORS", "true").lower() not in {"0", "false", "no"}
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+CLAUDE_MODEL = "claude-haiku-4-5-20251001"
+
+# Optional first stage: ask Claude vision directly and skip SearchAPI when it is sure
+VISION_FAST_PATH_ENABLED = os.getenv("VISION_FAST_PATH_ENABLED", "false").lower() in {"1", "true", "yes"}
+VISION_FAST_PATH_MODEL = os.getenv("VISION_FAST_PATH_MODEL", CLAUDE_MODEL)
+VISION_MIN_ARTIST_CONFIDENCE = float(os.getenv("VISION_MIN_ARTIST_CONFIDENCE", "0.85"))
+VISION_MIN_TITLE_CONFIDENCE = float(os.getenv("VISION_MIN_TITLE_CONFIDENCE", "0.85"))
+
+# Rule-based extraction that skips Claude when the search text already states everything
+RULE_EXTRACTION_ENABLED = os.getenv("RULE_EXTRACTION_ENABLED", "false").lower() in {"1", "true", "yes"}
+# Append (source text, Claude result) pairs here to build the agreement corpus
+EXTRACTION_CORPUS_PATH = os.getenv("EXTRACTION_CORPUS_PATH")
+
+# Opt-in hedging: fire a second identical Claude request when the first runs past a latency percentile
+CLAUDE_HEDGING_ENABLED = os.getenv("CLAUDE_HEDGING_ENABLED", "false").lower() in {"1", "true", "yes"}
+CLAUDE_HEDGE_PERCENTILE = float(os.getenv("CLAUDE_HEDGE_PERCENTILE", "95"))
+CLAUDE_HEDGE_MAX_RATE = float(os.getenv("CLAUDE_HEDGE_MAX_RATE", "0.1"))
+CLAUDE_HEDGE_MIN_SAMPLES = int(os.getenv("CLAUDE_HEDGE_MIN_SAMPLES", "20"))
+CLAUDE_HEDGE_MAX_WORKERS = int(os.getenv("CLAUDE_HEDGE_MAX_WORKERS", "64"))
+
+# Per-artist memo of recent valuations that values unpriced results without asking Claude for a range
+ARTIST_MEMO_ENABLED = os.getenv("ARTIST_MEMO_ENABLED", "false").lower() in {"1", "true", "yes"}
+
+# Node-local SQLite result cache shared by all workers on the host (see local_cache.py)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "false").lower() in {"1", "true", "yes"}
+# Bump when prompts or normalization change so old results stop matching
+RESULT_CACHE_KEY_VERSION = "v5"
+
+# Photos of one artwork (front, signature, back label) accepted per /identify request
+MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "4"))
+
+# Record upstream exchanges to a cassette, or replay them offline (see upstream_cassette.py)
+# While one is active the result cache and artist memo are bypassed, so upstream requests depend only on the input
+UPSTREAM_CASSETTE_MODE = os.getenv("UPSTREAM_CASSETTE_MODE", "off").lower()
+UPSTREAM_CASSETTE_PATH = os.getenv("UPSTREAM_CASSETTE_PATH", "upstream_cassette.jsonl")
+UPSTREAM_REPLAY_TIMING = os.getenv("UPSTREAM_REPLAY_TIMING", "recorded").lower()
+
+# Weighted priority admission to the pipeline by user tier (see priority_scheduler.py); per worker process
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() in {"1", "true", "yes"}
+# X-User-Tier is only trusted alongside a matching X-Tier-Token; while unset every
+# request gets the default tier
+SCHEDULER_TIER_TOKEN = os.getenv("SCHEDULER_TIER_TOKEN")
+
+# On-demand sampling profiles of single requests (see request_profiler.py); on when either trigger is set
+PROFILING_ENABLED = bool(os.getenv("PROFILE_TOKEN")) or float(os.getenv("PROFILE_SAMPLE_RATE", "0")) > 0
 
 logging.basicConfig(level=LOG_LEVEL, format="%(levelname)s: %(message)s")
 logger = logging.getLogger("worthify.artwork_server")
 
-app = FastAPI(title="Worthify Artwork Identifier", version="1.0.0")
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Warm up in the background; /ready waits only for the first attempt, at most WARMUP_TIMEOUT
+    _warmup_state["started_at"] = time.perf_counter()
+    threading.Thread(target=_warm_up_until_ready, name="warm-up", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="Worthify Artwork Identifier", version="1.0.0", lifespan=_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
@@ -35,7 +108,185 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+_client_lock = threading.Lock()
+_anthropic_client = None
+_searchapi_session = None
+_result_cache = None
+_artist_memo = None
+_claude_hedger = None
+_scheduler = None
+_profiler = None
+_cassette = None
+
+
+class ConfigurationError(Exception):
+    pass
+
+
+def _require_env(name: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise ConfigurationError(f"{name} is not set")
+    return value
+
+
+def _get_anthropic_client():
+    """Build the Anthropic client on first use (importing the SDK alone takes ~2 s)."""
+    global _anthropic_client
+    if _anthropic_client is None:
+        with _client_lock:
+            if _anthropic_client is None:
+                import anthropic
+
+                _anthropic_client = anthropic.Anthropic(
+                    api_key=_require_env("ANTHROPIC_API_KEY")
+                )
+    return _anthropic_client
+
+
+def _get_searchapi_session() -> requests.Session:
+    """Shared session so SearchAPI calls reuse pooled, already-warm connections."""
+    global _searchapi_session
+    if _searchapi_session is None:
+        with _client_lock:
+            if _searchapi_session is None:
+                _searchapi_session = requests.Session()
+    return _searchapi_session
+
+
+def _get_result_cache():
+    """Open the shared local result cache on first use, or None when it is disabled or a cassette is active."""
+    global _result_cache
+    if not RESULT_CACHE_ENABLED or UPSTREAM_CASSETTE_MODE != "off":
+        return None
+    if _result_cache is None:
+        with _client_lock:
+            if _result_cache is None:
+                from local_cache import LocalResultCache
+
+                _result_cache = LocalResultCache()
+    return _result_cache
+
+
+def _get_artist_memo():
+    """Open the artist market memo on first use, or None when it is disabled or a cassette is active."""
+    global _artist_memo
+    # The memo decides which prompt Claude gets, so recorded and replayed runs would diverge
+    if not ARTIST_MEMO_ENABLED or UPSTREAM_CASSETTE_MODE != "off":
+        return None
+    if _artist_memo is None:
+        with _client_lock:
+            if _artist_memo is None:
+                from artist_memo import ArtistMarketMemo
+
+                _artist_memo = ArtistMarketMemo()
+    return _artist_memo
+
+
+def _get_claude_hedger():
+    """Hedged-call policy for Claude requests, or None when hedging is disabled."""
+    global _claude_hedger
+    if not CLAUDE_HEDGING_ENABLED:
+        return None
+    if _claude_hedger is None:
+        with _client_lock:
+            if _claude_hedger is None:
+                from hedging import HedgedCaller
+
+                _claude_hedger = HedgedCaller(
+                    "claude",
+                    percentile=CLAUDE_HEDGE_PERCENTILE,
+                    max_hedge_rate=CLAUDE_HEDGE_MAX_RATE,
+                    min_samples=CLAUDE_HEDGE_MIN_SAMPLES,
+                    max_workers=CLAUDE_HEDGE_MAX_WORKERS,
+                )
+    return _claude_hedger
+
+
+def _get_scheduler():
+    """Tier-weighted admission for /identify, or None when scheduling is disabled."""
+    global _scheduler
+    if not SCHEDULER_ENABLED:
+        return None
+    if _scheduler is None:
+        with _client_lock:
+            if _scheduler is None:
+                from priority_scheduler import PriorityScheduler
+
+                _scheduler = PriorityScheduler()
+                if not SCHEDULER_TIER_TOKEN:
+                    logger.warning("SCHEDULER_TIER_TOKEN is not set; X-User-Tier is ignored and all requests use the default tier")
+    return _scheduler
+
+
+def _get_profiler():
+    """Per-request profiler, or None when neither PROFILE_TOKEN nor PROFILE_SAMPLE_RATE is set."""
+    global _profiler
+    if not PROFILING_ENABLED:
+        return None
+    if _profiler is None:
+        with _client_lock:
+            if _profiler is None:
+                from request_profiler import RequestProfiler
+
+                _profiler = RequestProfiler()
+    return _profiler
+
+
+def _request_tier(request: Request) -> str | None:
+    """The caller's tier from X-User-Tier; None (the default tier) unless X-Tier-Token matches SCHEDULER_TIER_TOKEN."""
+    tier = request.headers.get("x-user-tier")
+    if not tier or not SCHEDULER_TIER_TOKEN:
+        return None
+    token = request.headers.get("x-tier-token", "")
+    if not hmac.compare_digest(token.encode(), SCHEDULER_TIER_TOKEN.encode()):
+        return None
+    return tier
+
+
+def _get_cassette():
+    """Upstream record/replay cassette, or None when UPSTREAM_CASSETTE_MODE is off."""
+    global _cassette
+    if UPSTREAM_CASSETTE_MODE == "off":
+        return None
+    if _cassette is None:
+        with _client_lock:
+            if _cassette is None:
+                from upstream_cassette import UpstreamCassette
+
+                _cassette = UpstreamCassette(UPSTREAM_CASSETTE_PATH, UPSTREAM_CASSETTE_MODE, UPSTREAM_REPLAY_TIMING)
+                logger.info("Upstream cassette %s (%s)", UPSTREAM_CASSETTE_PATH, UPSTREAM_CASSETTE_MODE)
+    return _cassette
+
+
+def _send_claude_message(**kwargs):
+    """messages.create, recorded to or replayed from the upstream cassette when one is active."""
+    cassette = _get_cassette()
+    if cassette is None:
+        return _get_anthropic_client().messages.create(**kwargs)
+
+    from upstream_cassette import message_from_dict, message_to_dict
+
+    response = cassette.exchange(
+        "claude", kwargs, lambda: message_to_dict(_get_anthropic_client().messages.create(**kwargs))
+    )
+    return message_from_dict(response)
+
+
+def _create_claude_message(**kwargs):
+    """messages.create, hedged when CLAUDE_HEDGING_ENABLED is set."""
+    hedger = _get_claude_hedger()
+    if hedger is None:
+        return _send_claude_message(**kwargs)
+    return hedger.call(lambda: _send_claude_message(**kwargs))
+
+
+def _result_cache_key(image_urls: list[str]) -> str:
+    # The first photo drives the vision fast path, so only the extra photos are order-free
+    keys = [canonicalize_url(url.strip()) for url in image_urls]
+    keys[1:] = sorted(keys[1:])
+    return f"identify:{RESULT_CACHE_KEY_VERSION}:{'|'.join(keys)}"
+
 
 EXTRACT_PROMPT = """\
 You are an art market expert. Extract artwork identification data from the source text below, \
@@ -79,9 +330,73 @@ value_reasoning: state whether range is from source text or your own knowledge.
 Source text:
 {raw_text}"""
 
+# Used when the artist memo will supply the valuation, so Claude is not asked for one
+IDENTIFY_ONLY_PROMPT = """\
+You are an art market expert. Identify the artwork described in the source text below, \
+then return ONLY valid JSON with these exact keys (no extra keys, no markdown fences):
+
+identified_artist, artwork_title, year_estimate, style, medium_guess,
+is_original_or_print, confidence_level
+
+Rules:
+- Use null for any field you cannot determine from the text or your own knowledge.
+- confidence_level must be one of: "low", "medium", "high"
+- is_original_or_print must be one of: "original", "print", "unknown"
+
+Source text:
+{raw_text}"""
+
+STRICT_IDENTIFY_ONLY_PROMPT = """\
+You are an art market expert. The following text describes an artwork. \
+Return ONLY a valid JSON object - no markdown, no explanation, no extra keys. \
+Use null only for fields you truly cannot determine even with your own knowledge.
+
+Required keys:
+identified_artist, artwork_title, year_estimate, style, medium_guess,
+is_original_or_print, confidence_level
+
+confidence_level: "low" | "medium" | "high"
+is_original_or_print: "original" | "print" | "unknown"
+
+Source text:
+{raw_text}"""
+
+VISION_PROMPT = """\
+You are an art market expert. Identify the artwork in this image from your own knowledge, \
+then return ONLY valid JSON with these exact keys (no extra keys, no markdown fences):
+
+identified_artist, artwork_title, year_estimate, style, medium_guess,
+is_original_or_print, confidence_level, estimated_value_range,
+value_reasoning, comparable_examples_summary, artist_confidence, title_confidence
+
+Rules:
+- Use null for any field you cannot determine.
+- confidence_level must be one of: "low", "medium", "high"
+- is_original_or_print must be one of: "original", "print", "unknown"
+- artist_confidence and title_confidence: a number from 0 to 1 for how certain you are of \
+the artist and of this specific work's title. Only go above 0.8 for works you recognize with \
+certainty; an unfamiliar or generic image should score low.
+- estimated_value_range: return ONLY the numeric price or price range (for example "$500 - $3,000"), \
+based on your own knowledge of this artist's market. Never return null if the artist is identified.
+- value_reasoning: state that the range comes from your own art market knowledge."""
+
 
 class IdentifyRequest(BaseModel):
-    image_url: str
+    image_url: str = ""
+    # Further photos of the same artwork; searched alongside image_url and merged into one result
+    image_urls: list[str] = []
+
+    def all_image_urls(self) -> list[str]:
+        """image_url followed by image_urls, without blanks or duplicate photos."""
+        urls: list[str] = []
+        seen: set[str] = set()
+        for url in [self.image_url, *self.image_urls]:
+            url = url.strip()
+            key = canonicalize_url(url) if url else None
+            if key and key not in seen:
+                urls.append(url)
+                seen.add(key)
+        return urls
 
 
 class ClaudeParseError(Exception):
@@ -90,41 +405,6 @@ class ClaudeParseError(Exception):
         self.output_preview = output_preview
 
 
-CURRENCY_CODES = (
-    "USD",
-    "EUR",
-    "GBP",
-    "NOK",
-    "SEK",
-    "DKK",
-    "CAD",
-    "AUD",
-    "CHF",
-    "JPY",
-    "CNY",
-    "HKD",
-    "SGD",
-    "NZD",
-)
-CURRENCY_SYMBOLS = "$€£¥"
-_CURRENCY_CODE_PATTERN = "|".join(CURRENCY_CODES)
-_NUMBER_PATTERN = r"(?:\d{1,3}(?:[,\s]\d{3})+|\d+)(?:\.\d+)?"
-_MAGNITUDE_PATTERN = r"(?:\s?(?:[kmb]\b|million\b|billion\b))?"
-_CURRENCY_AMOUNT_PATTERN = (
-    rf"(?:[{re.escape(CURRENCY_SYMBOLS)}]\s*{_NUMBER_PATTERN}{_MAGNITUDE_PATTERN}"
-    rf"|(?:{_CURRENCY_CODE_PATTERN})\s*{_NUMBER_PATTERN}{_MAGNITUDE_PATTERN}"
-    rf"|{_NUMBER_PATTERN}{_MAGNITUDE_PATTERN}\s*(?:{_CURRENCY_CODE_PATTERN}))"
-)
-_PRICE_RANGE_PATTERN = re.compile(
-    rf"({_CURRENCY_AMOUNT_PATTERN})\s*(?:to|[-–—])\s*({_CURRENCY_AMOUNT_PATTERN})",
-    re.IGNORECASE,
-)
-_PRICE_AMOUNT_PATTERN = re.compile(_CURRENCY_AMOUNT_PATTERN, re.IGNORECASE)
-_PLAIN_NUMERIC_RANGE_PATTERN = re.compile(
-    rf"({_NUMBER_PATTERN})\s*(?:to|[-–—])\s*({_NUMBER_PATTERN})"
-)
-
-
 def _truncate(text: str, limit: int = 500) -> str:
     text = text.strip()
     if len(text) <= limit:
@@ -206,7 +486,6 @@ def _extract_source_text(data: dict) -> str:
 def _searchapi_params(image_url: str, engine: str) -> dict:
     params = {
         "engine": engine,
-        "api_key": SEARCHAPI_KEY,
         "url": image_url,
     }
 
@@ -225,6 +504,22 @@ def _searchapi_params(image_url: str, engine: str) -> dict:
     return params
 
 
+def _searchapi_get(params: dict) -> dict:
+    """One SearchAPI request; the API key is added here so it never appears in params or cassettes."""
+
+    def fetch() -> dict:
+        resp = _get_searchapi_session().get(
+            SEARCHAPI_URL, params={**params, "api_key": _require_env("SEARCHAPI_KEY")}, timeout=30
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    cassette = _get_cassette()
+    if cassette is None:
+        return fetch()
+    return cassette.exchange("searchapi", params, fetch)
+
+
 def _call_searchapi(image_url: str) -> str:
     """Call SearchAPI.io and return source text for Claude extraction."""
     attempts = [
@@ -238,11 +533,7 @@ def _call_searchapi(image_url: str) -> str:
             params = _searchapi_params(image_url=image_url, engine=engine)
             logger.info("SearchAPI request engine=%s attempt=%s", engine, attempt)
 
-            resp = requests.get(
-                "https://www.searchapi.io/api/v1/search", params=params, timeout=30
-            )
-            resp.raise_for_status()
-            data = resp.json()
+            data = _searchapi_get(params)
             last_data_keys = sorted(data.keys())
 
             raw = _extract_source_text(data)
@@ -271,22 +562,53 @@ def _call_searchapi(image_url: str) -> str:
     return ""
 
 
-def _parse_with_claude(raw_text: str, strict: bool = False) -> dict:
-    """Send raw_text to Claude Haiku and parse the JSON response."""
-    prompt_template = STRICT_EXTRACT_PROMPT if strict else EXTRACT_PROMPT
-    message = anthropic_client.messages.create(
-        model="claude-haiku-4-5-20251001",
-        max_tokens=512,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt_template.format(raw_text=raw_text),
-            }
-        ],
+def _merge_source_texts(texts: list[str]) -> str:
+    """Join the source text of several photos, keeping each distinct line once in photo order."""
+    lines: list[str] = []
+    seen: set[str] = set()
+    for text in texts:
+        for line in text.splitlines():
+            normalized = " ".join(line.split())
+            if normalized and normalized not in seen:
+                lines.append(normalized)
+                seen.add(normalized)
+    return "\n".join(lines)
+
+
+def _search_images(image_urls: list[str]) -> str:
+    """
+    Source text for every photo, searched concurrently and merged.
+    Photos whose search fails are skipped; the first error is raised only when all of them fail.
+    """
+    if len(image_urls) == 1:
+        return _call_searchapi(image_urls[0])
+
+    def search(image_url: str) -> tuple[str, Exception | None]:
+        try:
+            return _call_searchapi(image_url), None
+        except requests.RequestException as exc:
+            logger.warning("SearchAPI failed for one of %s photos (%s): %s", len(image_urls), image_url, exc)
+            return "", exc
+
+    with ThreadPoolExecutor(max_workers=len(image_urls), thread_name_prefix="searchapi") as executor:
+        results = list(executor.map(search, image_urls))
+
+    errors = [error for _, error in results if error is not None]
+    if len(errors) == len(results):
+        raise errors[0]
+
+    merged = _merge_source_texts([text for text, _ in results])
+    logger.info(
+        "Merged %s characters of source text from %s/%s photos",
+        len(merged),
+        len(results) - len(errors),
+        len(results),
     )
-    text = message.content[0].text.strip()
-    logger.info("Claude returned %s characters (strict=%s)", len(text), strict)
+    return merged
+
 
+def _load_claude_json(text: str, label: str) -> object:
+    """Strip optional markdown fences from a Claude reply and parse it as JSON."""
     if text.startswith("```"):
         text = text.split("```")[1]
         if text.startswith("json"):
@@ -297,10 +619,171 @@ def _parse_with_claude(raw_text: str, strict: bool = False) -> dict:
         return json.loads(text)
     except json.JSONDecodeError as exc:
         preview = _truncate(text)
-        logger.warning("Claude JSON parse failed (strict=%s): %s", strict, preview)
+        logger.warning("Claude JSON parse failed (%s): %s", label, preview)
         raise ClaudeParseError(str(exc), preview) from exc
 
 
+def _parse_with_claude(raw_text: str, strict: bool = False, with_valuation: bool = True) -> dict:
+    """Send raw_text to Claude Haiku and parse the JSON response."""
+    if with_valuation:
+        prompt_template = STRICT_EXTRACT_PROMPT if strict else EXTRACT_PROMPT
+    else:
+        prompt_template = STRICT_IDENTIFY_ONLY_PROMPT if strict else IDENTIFY_ONLY_PROMPT
+    message = _create_claude_message(
+        model=CLAUDE_MODEL,
+        max_tokens=512 if with_valuation else 256,
+        messages=[
+            {
+                "role": "user",
+                "content": prompt_template.format(raw_text=raw_text),
+            }
+        ],
+    )
+    text = message.content[0].text.strip()
+    logger.info("Claude returned %s characters (strict=%s)", len(text), strict)
+
+    return _load_claude_json(text, f"strict={strict}")
+
+
+def _identify_with_vision(image_url: str) -> object:
+    """Ask Claude to identify the image directly, without SearchAPI."""
+    message = _send_claude_message(
+        model=VISION_FAST_PATH_MODEL,
+        max_tokens=512,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image", "source": {"type": "url", "url": image_url}},
+                    {"type": "text", "text": VISION_PROMPT},
+                ],
+            }
+        ],
+    )
+    text = message.content[0].text.strip()
+    logger.info("Claude vision returned %s characters", len(text))
+
+    return _load_claude_json(text, "vision")
+
+
+def _confidence_score(value: object) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _FastPathStats:
+    """Hit rate and latency bookkeeping for the vision fast path."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.errors = 0
+        self.vision_seconds = 0.0
+        self.hit_vision_seconds = 0.0
+        self.slow_path_runs = 0
+        self.slow_path_seconds = 0.0
+
+    def record_vision(self, seconds: float, hit: bool, error: bool = False) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.vision_seconds += seconds
+            if hit:
+                self.hits += 1
+                self.hit_vision_seconds += seconds
+            if error:
+                self.errors += 1
+
+    def record_slow_path(self, seconds: float) -> None:
+        with self._lock:
+            self.slow_path_runs += 1
+            self.slow_path_seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg_slow = self.slow_path_seconds / self.slow_path_runs if self.slow_path_runs else None
+            misses = self.attempts - self.hits
+            return {
+                "enabled": VISION_FAST_PATH_ENABLED,
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "errors": self.errors,
+                "hit_rate": self.hits / self.attempts if self.attempts else None,
+                "avg_vision_ms": (
+                    self.vision_seconds * 1000 / self.attempts if self.attempts else None
+                ),
+                "avg_slow_path_ms": avg_slow * 1000 if avg_slow is not None else None,
+                # Each hit saves the average slow path minus the vision call it made instead
+                "estimated_saved_ms": (
+                    (self.hits * avg_slow - self.hit_vision_seconds) * 1000
+                    if avg_slow is not None
+                    else None
+                ),
+                # Vision time spent on requests that fell through anyway
+                "added_ms_on_misses": (self.vision_seconds - self.hit_vision_seconds) * 1000
+                if misses
+                else 0.0,
+            }
+
+
+class _RuleExtractionStats:
+    """How often rule-based extraction was confident enough to skip Claude."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.bypassed = 0
+
+    def record(self, bypassed: bool) -> None:
+        with self._lock:
+            self.attempts += 1
+            if bypassed:
+                self.bypassed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": RULE_EXTRACTION_ENABLED,
+                "attempts": self.attempts,
+                "bypassed": self.bypassed,
+                "bypass_rate": self.bypassed / self.attempts if self.attempts else None,
+            }
+
+
+_vision_stats = _FastPathStats()
+_rule_extraction_stats = _RuleExtractionStats()
+
+
+def _try_vision_fast_path(image_url: str) -> dict | None:
+    """Return Claude's direct answer when it is confident in artist and title, else None."""
+    started = time.perf_counter()
+    try:
+        raw_result = _identify_with_vision(image_url)
+    except Exception as exc:
+        _vision_stats.record_vision(time.perf_counter() - started, hit=False, error=True)
+        logger.warning("Vision fast path failed, falling back to SearchAPI: %s", exc)
+        return None
+
+    elapsed = time.perf_counter() - started
+    accepted = (
+        isinstance(raw_result, dict)
+        and bool(_normalize_text_field(raw_result.get("identified_artist")))
+        and bool(_normalize_text_field(raw_result.get("artwork_title")))
+        and _confidence_score(raw_result.get("artist_confidence")) >= VISION_MIN_ARTIST_CONFIDENCE
+        and _confidence_score(raw_result.get("title_confidence")) >= VISION_MIN_TITLE_CONFIDENCE
+    )
+    _vision_stats.record_vision(elapsed, hit=accepted)
+
+    if not accepted:
+        logger.info("Vision fast path not confident enough (%.2fs), using SearchAPI", elapsed)
+        return None
+
+    logger.info("Vision fast path hit in %.2fs", elapsed)
+    return raw_result
+
+
 def _normalize_text_field(value: object) -> str | None:
     if value is None:
         return None
@@ -333,15 +816,15 @@ def _normalize_estimated_value_range(value: object) -> str | None:
     if not text:
         return None
 
-    range_match = _PRICE_RANGE_PATTERN.search(text)
-    if range_match:
-        lower = _clean_price_amount(range_match.group(1))
-        upper = _clean_price_amount(range_match.group(2))
+    price_range = find_price_range(text)
+    if price_range:
+        lower = _clean_price_amount(price_range.lower)
+        upper = _clean_price_amount(price_range.upper)
         return f"{lower} - {upper}"
 
     amounts = []
-    for match in _PRICE_AMOUNT_PATTERN.finditer(text):
-        cleaned = _clean_price_amount(match.group(0))
+    for amount in iter_price_amounts(text):
+        cleaned = _clean_price_amount(amount)
         if cleaned not in amounts:
             amounts.append(cleaned)
 
@@ -351,13 +834,13 @@ def _normalize_estimated_value_range(value: object) -> str | None:
             return f"{amounts[0]} - {amounts[1]}"
         return amounts[0]
 
-    plain_range = _PLAIN_NUMERIC_RANGE_PATTERN.search(text)
+    plain_range = find_plain_numeric_range(text)
     if plain_range and any(
         keyword in text.lower()
         for keyword in ("value", "worth", "price", "estimate", "estimated")
     ):
-        lower = plain_range.group(1).replace(" ", "")
-        upper = plain_range.group(2).replace(" ", "")
+        lower = plain_range.lower.replace(" ", "")
+        upper = plain_range.upper.replace(" ", "")
         return f"{lower} - {upper}"
 
     return text
@@ -407,20 +890,365 @@ def _normalize_analysis_result(result: dict) -> dict:
     return normalized
 
 
+_LABELED_FIELD_PATTERN = re.compile(
+    r"^[\s*•-]*(artist|title|artwork|year|date|medium|style|movement)\**\s*:\s*\**\s*(.+?)\s*\**\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_QUOTED_TITLE_PATTERN = re.compile(r"[\"“]([^\"“”\n]{2,120})[\"”]")
+_BY_ARTIST_PATTERN = re.compile(
+    r"\bby\s+((?:[A-Z][\w'’.-]*)(?:\s+(?:van|von|de|da|di|del|der|la|le|[A-Z][\w'’.-]*)){0,4})"
+)
+_YEAR_PATTERN = re.compile(r"\b(?:c\.\s*|circa\s+)?(1[3-9]\d{2}|20[0-2]\d)\b", re.IGNORECASE)
+_VALUE_KEYWORDS = ("value", "worth", "estimate", "range", "typically sell", "priced")
+_PRINT_MEDIUMS = ("screenprint", "lithograph", "etching", "woodcut", "giclée", "giclee", "digital print", "poster")
+_MEDIUM_KEYWORDS = (
+    "oil on canvas",
+    "oil on panel",
+    "oil on board",
+    "acrylic on canvas",
+    "watercolor",
+    "watercolour",
+    "gouache",
+    "pastel",
+    "charcoal",
+    "mixed media",
+    "bronze",
+) + _PRINT_MEDIUMS
+_STYLE_KEYWORDS = (
+    "Post-Impressionism",
+    "Impressionism",
+    "Abstract Expressionism",
+    "Expressionism",
+    "Cubism",
+    "Surrealism",
+    "Pop Art",
+    "Minimalism",
+    "Realism",
+    "Romanticism",
+    "Baroque",
+    "Renaissance",
+    "Art Nouveau",
+    "Contemporary",
+)
+
+
+def _first_keyword(text: str, keywords: tuple) -> str | None:
+    lowered = text.lower()
+    positions = [(lowered.find(k.lower()), k) for k in keywords if k.lower() in lowered]
+    return min(positions)[1] if positions else None
+
+
+def _rule_based_extract(raw_text: str) -> tuple[dict, bool]:
+    """
+    Pull the analysis fields straight out of SearchAPI text without an LLM.
+
+    Returns (result, confident). confident is True only when artist, title, year and
+    a value range are all present and artist/title are either explicitly labeled or
+    repeated in the text; only then may the Claude call be skipped.
+    """
+    labeled: dict[str, str] = {}
+    for match in _LABELED_FIELD_PATTERN.finditer(raw_text):
+        labeled.setdefault(match.group(1).lower(), match.group(2).strip(" *\"“”"))
+
+    artist = labeled.get("artist")
+    artist_confident = artist is not None
+    if artist is None:
+        candidates: dict[str, int] = {}
+        for match in _BY_ARTIST_PATTERN.finditer(raw_text):
+            name = match.group(1).rstrip(".")
+            candidates[name] = candidates.get(name, 0) + 1
+        if candidates:
+            artist, count = max(candidates.items(), key=lambda item: item[1])
+            artist_confident = count >= 2
+
+    title = labeled.get("title") or labeled.get("artwork")
+    title_confident = title is not None
+    if title is None:
+        quoted = [match.group(1).strip() for match in _QUOTED_TITLE_PATTERN.finditer(raw_text)]
+        if quoted:
+            title = max(quoted, key=quoted.count)
+            title_confident = quoted.count(title) >= 2
+
+    year_sources = [labeled.get("year") or labeled.get("date") or ""]
+    if title:
+        year_sources.extend(line for line in raw_text.splitlines() if title in line)
+    year = next(
+        (match.group(1) for match in map(_YEAR_PATTERN.search, year_sources) if match),
+        None,
+    )
+
+    value_range = None
+    for line in raw_text.splitlines():
+        if any(keyword in line.lower() for keyword in _VALUE_KEYWORDS):
+            price_range = find_price_range(line)
+            if price_range:
+                value_range = _normalize_estimated_value_range(price_range.text)
+                break
+
+    medium = labeled.get("medium") or _first_keyword(raw_text, _MEDIUM_KEYWORDS)
+    style = labeled.get("style") or labeled.get("movement") or _first_keyword(raw_text, _STYLE_KEYWORDS)
+
+    lowered = raw_text.lower()
+    if (medium and medium.lower() in _PRINT_MEDIUMS) or "reproduction" in lowered:
+        original_or_print = "print"
+    elif "original" in lowered:
+        original_or_print = "original"
+    else:
+        original_or_print = "unknown"
+
+    confident = bool(
+        artist and title and year and value_range and artist_confident and title_confident
+    )
+    result = {
+        "identified_artist": artist,
+        "artwork_title": title,
+        "year_estimate": year,
+        "style": style,
+        "medium_guess": medium,
+        "is_original_or_print": original_or_print,
+        "confidence_level": "high" if confident else "low",
+        "estimated_value_range": value_range,
+        "value_reasoning": "Range stated in the source text." if value_range else None,
+        "comparable_examples_summary": None,
+    }
+    return result, confident
+
+
+_corpus_lock = threading.Lock()
+
+
+def _record_extraction_sample(raw_text: str, claude_result: dict) -> None:
+    """Append a (source text, Claude result) pair to the agreement corpus."""
+    try:
+        line = json.dumps({"source_text": raw_text, "claude": claude_result}, ensure_ascii=False)
+        with _corpus_lock, open(EXTRACTION_CORPUS_PATH, "a", encoding="utf-8") as corpus:
+            corpus.write(line + "\n")
+    except OSError as exc:
+        logger.warning("Could not record extraction sample: %s", exc)
+
+
+_warmup_lock = threading.Lock()
+_warmup_state = {
+    "clients": "pending",
+    "upstream": "pending",
+    "warmup_seconds": None,
+    "error": None,
+    "first_attempt_done": False,
+    "started_at": None,
+}
+# Longest /ready waits for the first warm-up attempt, and the timeout of each warm-up call
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "20"))
+WARMUP_RETRY_SECONDS = 15
+WARMUP_MAX_RETRY_SECONDS = 300
+
+
+def _build_clients() -> None:
+    """Local half of start-up: check config and build upstream clients, without any network call."""
+    # Replay answers from the cassette and needs neither keys nor connections
+    if UPSTREAM_CASSETTE_MODE != "replay":
+        _require_env("SEARCHAPI_KEY")
+        _get_anthropic_client()
+    _get_searchapi_session()
+    _warmup_state["clients"] = "ready"
+
+
+def _warm_up() -> None:
+    """Build upstream clients and open connections so the first request is not a cold one."""
+    with _warmup_lock:
+        if _warmup_state["upstream"] in {"ready", "skipped"}:
+            return
+
+        started = time.perf_counter()
+        try:
+            _build_clients()
+            if UPSTREAM_CASSETTE_MODE == "replay":
+                _warmup_state.update(upstream="skipped", error=None)
+                return
+            _warmup_state["upstream"] = "warming"
+            _get_searchapi_session().head(SEARCHAPI_URL, timeout=WARMUP_TIMEOUT)
+            _get_anthropic_client().models.list(limit=1, timeout=WARMUP_TIMEOUT)
+        except Exception as exc:
+            logger.warning("Warm-up failed: %s", exc)
+            _warmup_state.update(upstream="failed", error=str(exc))
+            return
+        finally:
+            _warmup_state["warmup_seconds"] = round(time.perf_counter() - started, 3)
+            _warmup_state["first_attempt_done"] = True
+
+        _warmup_state.update(upstream="ready", error=None)
+        logger.info("Warm-up finished in %.2fs", _warmup_state["warmup_seconds"])
+
+
+def _warm_up_until_ready() -> None:
+    """Background warm-up, retried with backoff while upstreams are unreachable."""
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        _warm_up()
+        # Missing config does not fix itself; /ready reports it
+        if _warmup_state["upstream"] in {"ready", "skipped"} or _warmup_state["clients"] != "ready":
+            return
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_MAX_RETRY_SECONDS)
+
+
+@app.exception_handler(ConfigurationError)
+def _configuration_error_handler(request, exc: ConfigurationError):
+    logger.error("Server misconfigured: %s", exc)
+    return JSONResponse({"detail": str(exc)}, status_code=503)
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """
+    New instances take traffic once the first warm-up attempt has finished, failed or not,
+    or WARMUP_TIMEOUT after start-up. Afterwards upstream errors are reported but never
+    pull the instance out of rotation.
+    """
+    body = {"import_seconds": IMPORT_SECONDS}
+    try:
+        if _warmup_state["clients"] != "ready":
+            _build_clients()
+    except ConfigurationError as exc:
+        body.update(status="unavailable", error=str(exc))
+        return JSONResponse(body, status_code=503)
+
+    started_at = _warmup_state["started_at"] or _IMPORT_STARTED
+    warm_enough = _warmup_state["first_attempt_done"] or time.perf_counter() - started_at >= WARMUP_TIMEOUT
+    body.update(
+        status="ready" if warm_enough else "warming",
+        upstream_warmup=_warmup_state["upstream"],
+        warmup_seconds=_warmup_state["warmup_seconds"],
+    )
+    if _warmup_state["error"]:
+        body["upstream_error"] = _warmup_state["error"]
+    return JSONResponse(body, status_code=200 if warm_enough else 503)
+
+
+@app.get("/stats")
+def stats():
+    result_cache = _get_result_cache()
+    artist_memo = _get_artist_memo()
+    claude_hedger = _get_claude_hedger()
+    scheduler = _get_scheduler()
+    profiler = _get_profiler()
+    cassette = _get_cassette()
+    return {
+        "upstream_cassette": cassette.stats() if cassette else {"enabled": False},
+        "profiling": profiler.stats() if profiler else {"enabled": False},
+        "scheduler": scheduler.stats() if scheduler else {"enabled": False},
+        "claude_hedging": claude_hedger.stats() if claude_hedger else {"enabled": False},
+        "result_cache": result_cache.stats() if result_cache else {"enabled": False},
+        "artist_memo": artist_memo.stats() if artist_memo else {"enabled": False},
+        "vision_fast_path": _vision_stats.snapshot(),
+        "rule_extraction": _rule_extraction_stats.snapshot(),
+    }
+
+
+def _apply_artist_memo(result: dict, source_text: str | None) -> None:
+    """Record valuations priced by the source text; fill the range from the memo only when the result has none."""
+    from artist_memo import parse_value_range, text_has_prices
+
+    memo = _get_artist_memo()
+    if text_has_prices(source_text):
+        # Only prices from the source text are recorded, never model estimates or memo fills
+        memo.record(result, source="text")
+        return
+    if parse_value_range(result.get("estimated_value_range")) is None and memo.fill_valuation(result):
+        logger.info("Valuation filled from artist memo: %s", result["estimated_value_range"])
+
+
+def _finalize_result(raw_result: dict, source_text: str | None = None) -> dict:
+    result = _normalize_analysis_result(raw_result)
+    if _get_artist_memo() is not None:
+        _apply_artist_memo(result, source_text)
+    result["disclaimer"] = (
+        "This is an AI-generated estimate for informational purposes only. "
+        "Not a certified appraisal."
+    )
+    logger.info(
+        "Identify succeeded: artist=%s title=%s confidence=%s",
+        result.get("identified_artist"),
+        result.get("artwork_title"),
+        result.get("confidence_level"),
+    )
+    return result
+
+
 @app.post("/identify")
-def identify(req: IdentifyRequest):
-    if not req.image_url or not req.image_url.strip():
+async def identify(req: IdentifyRequest, request: Request, response: Response):
+    image_urls = req.all_image_urls()
+    if not image_urls:
         raise HTTPException(status_code=400, detail="image_url is required")
+    if len(image_urls) > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+
+    logger.info("Identify request received for image URLs: %s", ", ".join(image_urls))
+
+    pipeline = _run_identify_pipeline
+    profiler = _get_profiler()
+    profiled = profiler is not None and profiler.should_profile(request.headers.get("x-profile-token"))
+    if profiled:
+        pipeline = partial(_run_profiled_pipeline, response=response)
+
+    result_cache = _get_result_cache()
+    cache_key = _result_cache_key(image_urls) if result_cache else None
+    # A profiled request always runs the pipeline; a cache hit has nothing to profile
+    if result_cache and not profiled:
+        cached = await run_in_threadpool(result_cache.get, cache_key)
+        if cached is not None:
+            logger.info("Result cache hit for %s", cache_key)
+            return cached
+
+    scheduler = _get_scheduler()
+    if scheduler is None:
+        result = await run_in_threadpool(pipeline, image_urls)
+    else:
+        # Cache hits above skip the queue; only pipeline runs wait for a slot
+        from priority_scheduler import SchedulerFull
+
+        try:
+            async with scheduler.slot(_request_tier(request)) as tier:
+                logger.info("Identify admitted for tier %s", tier)
+                result = await run_in_threadpool(pipeline, image_urls)
+        except SchedulerFull as exc:
+            logger.warning("Identify rejected: %s", exc)
+            raise HTTPException(
+                status_code=503, detail=f"Server busy: {exc}", headers={"Retry-After": "5"}
+            ) from exc
+
+    if result_cache:
+        await run_in_threadpool(result_cache.set, cache_key, result)
+    return result
 
-    logger.info("Identify request received for image URL: %s", req.image_url)
 
+def _run_profiled_pipeline(image_urls: list[str], response: Response) -> dict:
+    """Run the pipeline under the sampling profiler; the profile is written even when it fails."""
+    profile_id = uuid.uuid4().hex[:12]
+    profile = {"path": None}
+    try:
+        with _get_profiler().profile(profile_id) as profile:
+            return _run_identify_pipeline(image_urls)
+    finally:
+        if profile["path"]:
+            logger.info("Identify profile written to %s", profile["path"])
+            response.headers["X-Profile-Id"] = profile_id
+
+
+def _run_identify_pipeline(image_urls: list[str]) -> dict:
+    if VISION_FAST_PATH_ENABLED:
+        # The first photo is the artwork itself; the others are details for the search
+        vision_result = _try_vision_fast_path(image_urls[0])
+        if vision_result is not None:
+            return _finalize_result(vision_result)
+
+    slow_path_started = time.perf_counter()
     try:
-        raw_text = _call_searchapi(req.image_url)
+        raw_text = _search_images(image_urls)
     except requests.HTTPError as exc:
         logger.exception("SearchAPI HTTP error")
         raise HTTPException(
@@ -442,12 +1270,47 @@ def identify(req: IdentifyRequest):
             },
         )
 
+    memo = _get_artist_memo()
+    rule_result = None
+    if RULE_EXTRACTION_ENABLED or memo is not None:
+        rule_result, confident = _rule_based_extract(raw_text)
+    if RULE_EXTRACTION_ENABLED:
+        _rule_extraction_stats.record(bypassed=confident)
+        if confident:
+            # Not a slow-path run: it would pull the fast path's saved-time baseline down
+            logger.info("Rule-based extraction complete, skipping Claude")
+            return _finalize_result(rule_result, raw_text)
+
+    memo_valuation = memo is not None and _memo_can_value(memo, rule_result, raw_text)
+    raw_result = _extract_with_claude(raw_text, with_valuation=not memo_valuation)
+    result = _finalize_result(raw_result, raw_text)
+    if memo_valuation and result["estimated_value_range"] is None:
+        # Rare: Claude named an artist or kind other than the text's; one call is still all we pay for
+        logger.info("Artist memo could not value %s; returning it without a range", result["identified_artist"])
+
+    _vision_stats.record_slow_path(time.perf_counter() - slow_path_started)
+    if EXTRACTION_CORPUS_PATH and not memo_valuation:
+        _record_extraction_sample(raw_text, result)
+    return result
+
+
+def _memo_can_value(memo, rule_result: dict, raw_text: str) -> bool:
+    """True when the text is unpriced and the memo has a split for the artwork the text describes."""
+    from artist_memo import text_has_prices
+
+    if text_has_prices(raw_text):
+        return False
+    return memo.valuation_split(_normalize_analysis_result(rule_result)) is not None
+
+
+def _extract_with_claude(raw_text: str, with_valuation: bool = True) -> dict:
+    """Claude extraction with one strict retry; raises a 422 HTTPException when nothing parses."""
     try:
-        raw_result = _parse_with_claude(raw_text, strict=False)
+        raw_result = _parse_with_claude(raw_text, strict=False, with_valuation=with_valuation)
     except (ClaudeParseError, KeyError, IndexError) as first_exc:
         logger.warning("Retrying Claude parse with strict prompt: %s", first_exc)
         try:
-            raw_result = _parse_with_claude(raw_text, strict=True)
+            raw_result = _parse_with_claude(raw_text, strict=True, with_valuation=with_valuation)
         except (ClaudeParseError, KeyError, IndexError) as exc:
             logger.exception("Identify failed: Could not parse artwork data")
             detail = {
@@ -470,16 +1333,7 @@ def identify(req: IdentifyRequest):
                 "reason": "Claude returned a non-object JSON payload.",
             },
         )
+    return raw_result
 
-    result = _normalize_analysis_result(raw_result)
-    result["disclaimer"] = (
-        "This is an AI-generated estimate for informational purposes only. "
-        "Not a certified appraisal."
-    )
-    logger.info(
-        "Identify succeeded: artist=%s title=%s confidence=%s",
-        result.get("identified_artist"),
-        result.get("artwork_title"),
-        result.get("confidence_level"),
-    )
-    return result
+
+IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 3)
@@ -0,0 +1,219 @@
+"""
+Negative-lookup filter for Worthify cache tables.
+A Bloom filter over known cache keys lets cache checks skip the database when
+a key is definitely absent. The filter is rebuilt periodically from the
+database and updated in place whenever this process writes a new cache entry.
+
+Entries written by other processes are only picked up on the next rebuild, so
+between rebuilds such a key can be reported as a miss. That costs a redundant
+analysis, never a wrong result.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        Args:
+            capacity: Number of keys the filter is sized for
+            error_rate: Target false-positive rate at capacity
+        """
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        for position in self._positions(key):
+            if not self._bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_false_positive_rate(self) -> float:
+        """False-positive rate implied by the current fill ratio"""
+        set_bits = int.from_bytes(self._bits, 'little').bit_count()
+        return (set_bits / self.num_bits) ** self.num_hashes
+
+
+class CacheKeyFilter:
+    """
+    Periodically rebuilt Bloom filter over cache keys.
+
+    Until the first rebuild finishes every key is reported as possibly present,
+    so callers fall through to the database exactly as without the filter.
+    """
+
+    def __init__(
+        self,
+        load_keys: Callable[[], Iterable[str]],
+        capacity: int = 1_000_000,
+        error_rate: float = 0.01,
+        rebuild_interval: float = 300.0
+    ):
+        """
+        Args:
+            load_keys: Returns every key currently in the cache tables
+            capacity: Minimum number of keys the filter is sized for
+            error_rate: Target false-positive rate
+            rebuild_interval: Seconds between background rebuilds
+        """
+        self._load_keys = load_keys
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._rebuild_interval = rebuild_interval
+
+        self._filter: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._added_during_rebuild: list = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self._skipped_lookups = 0
+        self._passed_lookups = 0
+        self._false_positives = 0
+        self._last_rebuild_at: Optional[float] = None
+        self._last_rebuild_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_contain(self, *keys: str) -> bool:
+        """False means none of the keys are cached and the database can be skipped"""
+        self._ensure_started()
+
+        current = self._filter
+        if current is None:
+            return True
+
+        maybe_present = any(key in current for key in keys)
+        with self._lock:
+            if maybe_present:
+                self._passed_lookups += 1
+            else:
+                self._skipped_lookups += 1
+        return maybe_present
+
+    def add(self, key: str):
+        """Record a key written by this process"""
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(key)
+            if self._rebuilding:
+                self._added_during_rebuild.append(key)
+
+    def record_false_positive(self):
+        """Called when the filter said 'maybe' but the database had no entry"""
+        with self._lock:
+            self._false_positives += 1
+
+    def rebuild(self) -> bool:
+        """Rebuild the filter from the database. Returns True on success."""
+        with self._lock:
+            if self._rebuilding:
+                return False
+            self._rebuilding = True
+            self._added_during_rebuild = []
+
+        started = time.perf_counter()
+        try:
+            keys = list(self._load_keys())
+            rebuilt = BloomFilter(max(self._capacity, len(keys) * 2), self._error_rate)
+            for key in keys:
+                rebuilt.add(key)
+
+            with self._lock:
+                for key in self._added_during_rebuild:
+                    rebuilt.add(key)
+                self._filter = rebuilt
+
+            self._last_rebuild_at = time.time()
+            self._last_rebuild_seconds = time.perf_counter() - started
+            print(f"Cache key filter rebuilt: {rebuilt.count} keys, "
+                  f"{rebuilt.memory_bytes / 1024:.0f} KiB in {self._last_rebuild_seconds:.2f}s")
+            return True
+
+        except Exception as e:
+            print(f"Cache key filter rebuild error: {e}")
+            return False
+
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._added_during_rebuild = []
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._filter
+        with self._lock:
+            skipped_lookups = self._skipped_lookups
+            passed_lookups = self._passed_lookups
+            false_positives = self._false_positives
+        # Keys that are truly absent either got skipped or slipped through as false positives
+        negative_lookups = skipped_lookups + false_positives
+        return {
+            'ready': current is not None,
+            'keys': current.count if current else 0,
+            'capacity': current.capacity if current else 0,
+            'memory_bytes': current.memory_bytes if current else 0,
+            'num_hashes': current.num_hashes if current else 0,
+            'target_false_positive_rate': self._error_rate,
+            'estimated_false_positive_rate': current.estimated_false_positive_rate() if current else None,
+            'observed_false_positives': false_positives,
+            'observed_false_positive_rate': (
+                false_positives / negative_lookups if negative_lookups else None
+            ),
+            'skipped_lookups': skipped_lookups,
+            'passed_lookups': passed_lookups,
+            'last_rebuild_at': self._last_rebuild_at,
+            'last_rebuild_seconds': self._last_rebuild_seconds,
+        }
+
+    def _ensure_started(self):
+        """Start the background rebuild thread on first use"""
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name="cache-key-filter-rebuild",
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.rebuild()
+            self._stop_event.wait(self._rebuild_interval)
@@ -0,0 +1,167 @@
+"""
+Refresh-ahead and stale-while-revalidate for the image cache.
+
+Popular entries (high cache_hits) are re-identified shortly before they expire,
+so they never drop out of the cache. Entries requested after expiry but within
+CACHE_STALE_MAX_SECONDS are served stale by supabase_client while this
+refresher re-identifies them in the background.
+
+The refresher does not know how to analyze an image; the process that stores
+identify results passes a revalidate(entry) callable that re-runs its pipeline
+for an image_cache row (image_url, cloudinary_url, image_hash, country) and
+returns (detected_garments, search_results), or None to leave the entry as it is.
+
+    supabase_manager.start_cache_refresher(reanalyze_entry)
+
+That call is a no-op unless CACHE_REFRESH_ENABLED is set. Until a refresher is
+started, CACHE_STALE_MAX_SECONDS has no effect: expired entries are misses, so
+nothing is ever served stale without being revalidated.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+CACHE_REFRESH_AHEAD_SECONDS = float(os.getenv("CACHE_REFRESH_AHEAD_SECONDS", "3600"))
+CACHE_REFRESH_MIN_HITS = int(os.getenv("CACHE_REFRESH_MIN_HITS", "10"))
+CACHE_REFRESH_INTERVAL = float(os.getenv("CACHE_REFRESH_INTERVAL", "300"))
+CACHE_REFRESH_BATCH_SIZE = int(os.getenv("CACHE_REFRESH_BATCH_SIZE", "20"))
+CACHE_REFRESH_MAX_CONCURRENCY = int(os.getenv("CACHE_REFRESH_MAX_CONCURRENCY", "2"))
+CACHE_REFRESH_EXPIRES_IN_DAYS = int(os.getenv("CACHE_REFRESH_EXPIRES_IN_DAYS", "30"))
+
+Revalidate = Callable[[Dict[str, Any]], Optional[Tuple[List[Dict], List[Dict]]]]
+
+
+class CacheRefresher:
+    """Background re-identification of hot and stale cache entries"""
+
+    def __init__(
+        self,
+        manager,
+        revalidate: Revalidate,
+        refresh_ahead: float = CACHE_REFRESH_AHEAD_SECONDS,
+        min_hits: int = CACHE_REFRESH_MIN_HITS,
+        interval: float = CACHE_REFRESH_INTERVAL,
+        batch_size: int = CACHE_REFRESH_BATCH_SIZE,
+        max_concurrency: int = CACHE_REFRESH_MAX_CONCURRENCY,
+        expires_in_days: int = CACHE_REFRESH_EXPIRES_IN_DAYS
+    ):
+        """
+        Args:
+            manager: SupabaseManager (find_refresh_candidates, refresh_cache_entry, set_stale_handler)
+            revalidate: Re-runs the analysis for an entry; returns (detected_garments, search_results) or None
+            refresh_ahead: Refresh hot entries expiring within this many seconds
+            min_hits: cache_hits needed for an entry to count as hot
+            interval: Seconds between refresh-ahead scans
+            batch_size: Maximum entries scheduled per scan
+            max_concurrency: Re-identifications running at once
+            expires_in_days: New lifetime of a refreshed entry
+        """
+        self._manager = manager
+        self._revalidate = revalidate
+        self.refresh_ahead = refresh_ahead
+        self.min_hits = min_hits
+        self.interval = interval
+        self.batch_size = batch_size
+        self.expires_in_days = expires_in_days
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="cache-refresh")
+        self._lock = threading.Lock()
+        # One revalidation per entry at a time, however many requests see it stale
+        self._in_flight: set = set()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._scheduled = {'stale': 0, 'ahead': 0}
+        self._refreshed = 0
+        self._unchanged = 0
+        self._failed = 0
+        self._deduplicated = 0
+        self._scans = 0
+
+    def schedule(self, entry: Dict[str, Any], reason: str = 'stale') -> bool:
+        """Queue a background revalidation unless one is already running for this entry"""
+        cache_id = entry.get('id')
+        if cache_id is None:
+            return False
+
+        with self._lock:
+            if cache_id in self._in_flight:
+                self._deduplicated += 1
+                return False
+            self._in_flight.add(cache_id)
+            self._scheduled[reason] += 1
+
+        self._executor.submit(self._refresh, entry)
+        return True
+
+    def _refresh(self, entry: Dict[str, Any]):
+        cache_id = entry['id']
+        try:
+            result = self._revalidate(entry)
+            if result is None:
+                outcome = '_unchanged'
+            else:
+                detected_garments, search_results = result
+                refreshed = self._manager.refresh_cache_entry(
+                    cache_id, detected_garments, search_results, expires_in_days=self.expires_in_days
+                )
+                outcome = '_refreshed' if refreshed else '_failed'
+        except Exception as e:
+            print(f"Cache refresh failed for {cache_id}: {e}")
+            outcome = '_failed'
+        finally:
+            with self._lock:
+                self._in_flight.discard(cache_id)
+
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def refresh_ahead_once(self) -> int:
+        """Schedule hot entries that expire soon. Returns how many were scheduled."""
+        try:
+            candidates = self._manager.find_refresh_candidates(self.refresh_ahead, self.min_hits, self.batch_size)
+        except Exception as e:
+            print(f"Refresh-ahead scan error: {e}")
+            return 0
+
+        with self._lock:
+            self._scans += 1
+        return sum(self.schedule(entry, reason='ahead') for entry in candidates)
+
+    def start(self):
+        """Serve stale entries through this refresher and scan for hot entries every interval seconds"""
+        self._manager.set_stale_handler(self.schedule)
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-refresh-ahead", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._manager.set_stale_handler(None)
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh_ahead_once()
+            self._stop_event.wait(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'scheduled_stale': self._scheduled['stale'],
+                'scheduled_ahead': self._scheduled['ahead'],
+                'refreshed': self._refreshed,
+                'unchanged': self._unchanged,
+                'failed': self._failed,
+                'deduplicated': self._deduplicated,
+                'in_flight': len(self._in_flight),
+                'scans': self._scans,
+            }
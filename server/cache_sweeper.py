@@ -0,0 +1,146 @@
+"""
+Expired image_cache sweeper for Worthify backend.
+Deletes (or archives) expired cache rows in small batches so the table and its
+indexes stop growing without bound.
+
+Only orphaned rows are swept: a row still referenced by any user_searches entry
+is kept however long ago it expired, since history screens read their results
+through the cache. Most analyzed images are in someone's history, so this
+reclaims little until history itself is trimmed; it bounds the growth from
+results nobody kept (failed saves, cache refills, deleted history).
+
+Batches are bounded and separated by a pause, and the database side uses
+FOR UPDATE SKIP LOCKED, so a sweep never holds long locks or competes with
+user traffic. Several workers can run it at once.
+
+Run one sweep from cron with:
+    python cache_sweeper.py
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CACHE_SWEEP_BATCH_SIZE = int(os.getenv("CACHE_SWEEP_BATCH_SIZE", "500"))
+CACHE_SWEEP_MAX_BATCHES = int(os.getenv("CACHE_SWEEP_MAX_BATCHES", "20"))
+CACHE_SWEEP_BATCH_PAUSE = float(os.getenv("CACHE_SWEEP_BATCH_PAUSE", "0.5"))
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "3600"))
+CACHE_SWEEP_ARCHIVE = os.getenv("CACHE_SWEEP_ARCHIVE", "false").lower() in {"1", "true", "yes"}
+
+
+class CacheSweeper:
+    """Rate-limited batch sweeper for expired cache rows"""
+
+    def __init__(
+        self,
+        sweep_batch: Callable[[int, bool], int],
+        batch_size: int = CACHE_SWEEP_BATCH_SIZE,
+        max_batches: int = CACHE_SWEEP_MAX_BATCHES,
+        batch_pause: float = CACHE_SWEEP_BATCH_PAUSE,
+        interval: float = CACHE_SWEEP_INTERVAL,
+        archive: bool = CACHE_SWEEP_ARCHIVE
+    ):
+        """
+        Args:
+            sweep_batch: Removes up to batch_size expired rows and returns how many it removed
+            batch_size: Maximum rows removed per batch
+            max_batches: Maximum batches per sweep; the rest waits for the next sweep
+            batch_pause: Seconds to sleep between batches
+            interval: Seconds between sweeps when running in the background
+            archive: Copy swept rows to image_cache_archive before deleting them
+        """
+        self._sweep_batch = sweep_batch
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self.archive = archive
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sweep_lock = threading.Lock()
+
+        self._sweeps = 0
+        self._rows_reclaimed = 0
+        self._errors = 0
+        self._last_sweep: Optional[Dict[str, Any]] = None
+
+    def sweep_once(self) -> Dict[str, Any]:
+        """
+        Run one sweep: batches until a batch comes back short, max_batches is hit, or stop() is called.
+        Returns the stats for this sweep.
+        """
+        with self._sweep_lock:
+            started_at = time.time()
+            started = time.perf_counter()
+            reclaimed = 0
+            batches = 0
+            error = None
+
+            while batches < self.max_batches and not self._stop_event.is_set():
+                try:
+                    swept = self._sweep_batch(self.batch_size, self.archive)
+                except Exception as e:
+                    error = str(e)
+                    self._errors += 1
+                    print(f"Cache sweep error after {batches} batches: {e}")
+                    break
+
+                batches += 1
+                reclaimed += swept
+                if swept < self.batch_size:
+                    break
+
+                self._stop_event.wait(self.batch_pause)
+
+            duration = time.perf_counter() - started
+            self._sweeps += 1
+            self._rows_reclaimed += reclaimed
+            self._last_sweep = {
+                'started_at': started_at,
+                'duration_seconds': duration,
+                'batches': batches,
+                'rows_reclaimed': reclaimed,
+                'archived': self.archive,
+                'error': error,
+            }
+            print(f"Cache sweep reclaimed {reclaimed} rows in {batches} batches ({duration:.2f}s)")
+            return self._last_sweep
+
+    def start(self):
+        """Sweep in a background thread every interval seconds"""
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.batch_pause + 5.0)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sweeps': self._sweeps,
+            'rows_reclaimed': self._rows_reclaimed,
+            'errors': self._errors,
+            'last_sweep': self._last_sweep,
+        }
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.sweep_once()
+            self._stop_event.wait(self.interval)
+
+
+if __name__ == "__main__":
+    from supabase_client import supabase_manager
+
+    if not supabase_manager.enabled:
+        raise SystemExit("Supabase is not configured; set SUPABASE_URL and SUPABASE_SERVICE_KEY")
+
+    CacheSweeper(supabase_manager.sweep_expired_cache_batch).sweep_once()
@@ -0,0 +1,179 @@
+"""
+Write-behind counter buffer for Worthify backend.
+Aggregates counter increments (cache hits, access counts) per key in process
+and flushes them to the database in bulk instead of one round trip per hit.
+
+Pending increments are flushed when the flush interval elapses, when the number
+of pending keys reaches max_pending, and on interpreter shutdown. On a crash at
+most one interval's worth (or max_pending keys) of increments is lost.
+"""
+
+import atexit
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class PartialFlush(Exception):
+    """Raised by a flush_fn that applied only part of a batch; remaining is what was not written"""
+
+    def __init__(self, remaining: Dict[Hashable, int], message: str = ''):
+        super().__init__(message or f"{len(remaining)} keys not written")
+        self.remaining = remaining
+
+
+class CounterBuffer:
+    """Thread-safe buffer that batches counter increments per key"""
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[Dict[Hashable, int]], None],
+        flush_interval: float = 5.0,
+        max_pending: int = 500
+    ):
+        """
+        Args:
+            name: Label used in log output
+            flush_fn: Called with {key: increment} for every flush; raising keeps the batch pending,
+                raising PartialFlush keeps only its remaining increments pending
+            flush_interval: Seconds between background flushes
+            max_pending: Number of distinct pending keys that triggers an immediate flush
+        """
+        self.name = name
+        self._flush_fn = flush_fn
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+
+        self._pending: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self._flushed_increments = 0
+        self._flush_count = 0
+        self._failed_flushes = 0
+        self._dropped_increments = 0
+        self._last_flush_at: Optional[float] = None
+
+    def increment(self, key: Hashable, amount: int = 1):
+        """Record an increment without touching the database"""
+        if key is None or amount == 0:
+            return
+
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + amount
+            pending_keys = len(self._pending)
+
+        if self._closed:
+            # Late increments after shutdown are written straight through
+            self.flush()
+            return
+
+        self._ensure_started()
+
+        if pending_keys >= self._max_pending:
+            self._wake_event.set()
+
+    def flush(self) -> int:
+        """
+        Flush all pending increments.
+        Returns the number of increments written, 0 if nothing was pending or the flush failed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._pending = {}
+
+            try:
+                self._flush_fn(batch)
+            except PartialFlush as e:
+                # Increments already applied must not be written a second time
+                self._requeue(e.remaining)
+                self._failed_flushes += 1
+                print(f"{self.name} counter flush error ({len(e.remaining)} keys kept pending): {e}")
+                written = sum(batch.values()) - sum(e.remaining.values())
+                self._flushed_increments += written
+                return written
+            except Exception as e:
+                self._requeue(batch)
+                self._failed_flushes += 1
+                print(f"{self.name} counter flush error ({len(batch)} keys kept pending): {e}")
+                return 0
+
+            written = sum(batch.values())
+            self._flushed_increments += written
+            self._flush_count += 1
+            self._last_flush_at = time.time()
+            return written
+
+    def close(self):
+        """Stop the background thread and flush whatever is still pending"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self._flush_interval + 1.0)
+        self.flush()
+
+    @property
+    def pending(self) -> Dict[Hashable, int]:
+        with self._lock:
+            return dict(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending_keys = len(self._pending)
+            pending_increments = sum(self._pending.values())
+
+        return {
+            'name': self.name,
+            'pending_keys': pending_keys,
+            'pending_increments': pending_increments,
+            'flushed_increments': self._flushed_increments,
+            'flush_count': self._flush_count,
+            'failed_flushes': self._failed_flushes,
+            'dropped_increments': self._dropped_increments,
+            'last_flush_at': self._last_flush_at,
+        }
+
+    def _requeue(self, batch: Dict[Hashable, int]):
+        """Merge a failed batch back into pending, dropping it if the buffer has grown too large"""
+        with self._lock:
+            if len(self._pending) + len(batch) > self._max_pending * 4:
+                self._dropped_increments += sum(batch.values())
+                print(f"{self.name} counter buffer full, dropped {len(batch)} keys")
+                return
+            for key, amount in batch.items():
+                self._pending[key] = self._pending.get(key, 0) + amount
+
+    def _ensure_started(self):
+        """Start the background flush thread on first use"""
+        if self._thread is not None or self._closed:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"{self.name}-counter-flush",
+                daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self._flush_interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            self.flush()
@@ -0,0 +1,94 @@
+"""
+Per-field agreement between rule-based extraction and Claude on a recorded corpus.
+
+Record a corpus by running the server with EXTRACTION_CORPUS_PATH set; every
+Claude-parsed request appends {"source_text": ..., "claude": {...}} as one JSON line.
+
+Usage:
+    python eval_rule_extraction.py corpus.jsonl
+
+Reports, per field, how often the rules populate it and how often they agree with
+Claude, both over all samples and over the samples the rules would bypass Claude
+for. Use it to decide whether RULE_EXTRACTION_ENABLED is safe to turn on.
+"""
+
+import argparse
+import json
+import re
+import sys
+
+from artwork_server import _normalize_analysis_result, _rule_based_extract
+
+FIELDS = (
+    "identified_artist",
+    "artwork_title",
+    "year_estimate",
+    "estimated_value_range",
+    "medium_guess",
+    "style",
+    "is_original_or_print",
+)
+
+
+def _comparable(field: str, value: object) -> str | None:
+    if value is None:
+        return None
+    text = str(value).casefold()
+    if field == "year_estimate":
+        years = re.findall(r"\d{4}", text)
+        return years[0] if years else text.strip()
+    return re.sub(r"[^0-9a-z$€£¥]+", "", text) or None
+
+
+def evaluate(samples: list[dict]) -> dict:
+    totals = {field: {"populated": 0, "agreed": 0} for field in FIELDS}
+    bypass_totals = {field: {"agreed": 0} for field in FIELDS}
+    bypassed = 0
+
+    for sample in samples:
+        rule_result, confident = _rule_based_extract(sample["source_text"])
+        rule_result = _normalize_analysis_result(rule_result)
+        claude = sample["claude"]
+        bypassed += confident
+
+        for field in FIELDS:
+            ours = _comparable(field, rule_result.get(field))
+            theirs = _comparable(field, claude.get(field))
+            if ours is None:
+                continue
+            totals[field]["populated"] += 1
+            if ours == theirs:
+                totals[field]["agreed"] += 1
+                if confident:
+                    bypass_totals[field]["agreed"] += 1
+
+    report = {
+        "samples": len(samples),
+        "bypassed": bypassed,
+        "bypass_rate": bypassed / len(samples) if samples else None,
+        "fields": {},
+    }
+    for field in FIELDS:
+        populated = totals[field]["populated"]
+        report["fields"][field] = {
+            "populated": populated,
+            "agreement_when_populated": totals[field]["agreed"] / populated if populated else None,
+            "agreement_when_bypassed": bypass_totals[field]["agreed"] / bypassed if bypassed else None,
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus", help="JSONL file recorded via EXTRACTION_CORPUS_PATH")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as corpus:
+        samples = [json.loads(line) for line in corpus if line.strip()]
+
+    json.dump(evaluate(samples), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+In-process cache of each user's favorites for Worthify backend.
+The first favorites check for a user loads all of their user_favorites rows;
+later checks (check_favorited_products, get_existing_favorite) are answered
+from memory. add/remove operations update the cached set synchronously after
+the database write, so a user's own changes are visible immediately.
+
+The cache is bounded by the total number of favorites held across all users,
+evicting the least recently used users first, and each user's set is reloaded
+after ttl seconds. Other processes do not see this process's writes, so with
+several workers a change made elsewhere can take up to ttl seconds to show.
+
+A load that was running while a write for the same user landed is discarded
+instead of cached, since it may have read the database before the write.
+
+Users with more than max_per_user favorites are remembered as oversized for ttl
+seconds (or until one of their favorites is removed), so their checks go
+straight to the database instead of paging through their rows on every call.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class FavoritesCache:
+    """LRU across users of {product_id: favorite row}, bounded by total rows"""
+
+    def __init__(self, max_entries: int = 50000, ttl: float = 300.0, max_per_user: Optional[int] = None):
+        """
+        Args:
+            max_entries: Favorites held across all users before least recently used users are evicted
+            ttl: Seconds before a user's set is reloaded from the database
+            max_per_user: Users with more favorites than this are not cached (default: max_entries // 10)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_per_user = max_per_user if max_per_user is not None else max(1, max_entries // 10)
+
+        self._lock = threading.Lock()
+        # user_id -> (loaded_at, {product_id: row})
+        self._users: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._size = 0
+        # user_id -> [loads in flight, written since the first of them started]
+        self._loads: Dict[str, list] = {}
+        # user_id -> when a load found more than max_per_user rows
+        self._oversized: 'OrderedDict[str, float]' = OrderedDict()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._discarded_loads = 0
+        self._oversized_skips = 0
+
+    def get(self, user_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """The user's favorites by product_id, or None when they are not cached"""
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is None or time.monotonic() - cached[0] > self.ttl:
+                if cached is not None:
+                    self._drop(user_id)
+                self._misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self._hits += 1
+            return cached[1]
+
+    def is_oversized(self, user_id: str) -> bool:
+        """True if a recent load found too many favorites to cache; skip loading them again"""
+        with self._lock:
+            marked_at = self._oversized.get(user_id)
+            if marked_at is None:
+                return False
+            if time.monotonic() - marked_at > self.ttl:
+                del self._oversized[user_id]
+                return False
+            self._oversized_skips += 1
+            return True
+
+    def begin_load(self, user_id: str):
+        """Call before reading the user's rows from the database"""
+        with self._lock:
+            load = self._loads.setdefault(user_id, [0, False])
+            load[0] += 1
+
+    def finish_load(self, user_id: str, rows: Optional[List[Dict[str, Any]]]) -> bool:
+        """Cache rows read since begin_load (None for a failed read). Returns whether they were cached."""
+        with self._lock:
+            load = self._loads[user_id]
+            load[0] -= 1
+            written = load[1]
+            if load[0] == 0:
+                del self._loads[user_id]
+
+            if rows is None:
+                return False
+            if len(rows) > self.max_per_user:
+                self._drop(user_id)
+                self._oversized[user_id] = time.monotonic()
+                self._oversized.move_to_end(user_id)
+                # One marker per user; bounded like the cached users themselves
+                while len(self._oversized) > self.max_entries:
+                    self._oversized.popitem(last=False)
+                return False
+            if written:
+                self._discarded_loads += 1
+                return False
+
+            self._drop(user_id)
+            self._users[user_id] = (time.monotonic(), {row['product_id']: row for row in rows})
+            self._size += len(rows)
+            self._evict()
+            return True
+
+    def add(self, user_id: str, rows: Iterable[Dict[str, Any]]):
+        """Record newly inserted favorite rows"""
+        with self._lock:
+            self._mark_written(user_id)
+            cached = self._users.get(user_id)
+            if cached is None:
+                return
+            favorites = cached[1]
+            for row in rows:
+                if row['product_id'] not in favorites:
+                    self._size += 1
+                favorites[row['product_id']] = row
+            self._evict()
+
+    def remove_ids(self, user_id: str, favorite_ids: Iterable[str]):
+        """Forget deleted favorites by their row id"""
+        favorite_ids = set(favorite_ids)
+        with self._lock:
+            self._mark_written(user_id)
+            self._oversized.pop(user_id, None)
+            cached = self._users.get(user_id)
+            if cached is None:
+                return
+            favorites = cached[1]
+            for product_id in [pid for pid, row in favorites.items() if row.get('id') in favorite_ids]:
+                del favorites[product_id]
+                self._size -= 1
+
+    def invalidate(self, user_id: str):
+        """Drop the user's set, e.g. after a write whose outcome is unknown"""
+        with self._lock:
+            self._mark_written(user_id)
+            self._drop(user_id)
+            self._oversized.pop(user_id, None)
+
+    def _mark_written(self, user_id: str):
+        if user_id in self._loads:
+            self._loads[user_id][1] = True
+
+    def _drop(self, user_id: str):
+        cached = self._users.pop(user_id, None)
+        if cached is not None:
+            self._size -= len(cached[1])
+
+    def _evict(self):
+        while self._size > self.max_entries and self._users:
+            _, (_, favorites) = self._users.popitem(last=False)
+            self._size -= len(favorites)
+            self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'users': len(self._users),
+                'entries': self._size,
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else None,
+                'evictions': self._evictions,
+                'discarded_loads': self._discarded_loads,
+                'oversized_users': len(self._oversized),
+                'oversized_skips': self._oversized_skips,
+            }
@@ -0,0 +1,190 @@
+"""
+Latency-triggered hedged requests.
+A call runs normally; if it is still running after the configured percentile of
+recently observed latencies, an identical second call is fired and whichever
+finishes first (successfully) wins. The loser is abandoned: its result is
+discarded when it completes (a blocking HTTP call in a thread cannot be
+interrupted, so "cancel" means it no longer holds up the caller).
+
+Hedges are capped at max_hedge_rate of recent calls so a slow upstream does
+not turn into double the load. No hedging happens until min_samples latencies
+have been observed.
+
+Latencies are measured from when an attempt starts running, not from when it
+was queued for a thread, so a busy pool does not look like a slow upstream.
+When every thread is already taken (abandoned losers keep theirs until the
+HTTP call returns) no hedge is fired: it would only queue behind the same
+backlog.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from latency_stats import percentile
+
+
+class HedgedCaller:
+    """Runs calls with at most one latency-triggered hedge each"""
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95.0,
+        max_hedge_rate: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+        max_workers: int = 64
+    ):
+        """
+        Args:
+            name: Label for logs and stats
+            percentile: Hedge once a call has run longer than this percentile of recent latencies
+            max_hedge_rate: Maximum fraction of the last `window` calls that may be hedged
+            min_samples: Latencies to observe before hedging starts
+            window: Number of recent calls used for the latency percentile and the hedge rate
+            max_workers: Threads available to run attempts; size well above the worker's request concurrency
+        """
+        self.name = name
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{name}")
+        self._lock = threading.Lock()
+        # Durations of individual attempts; the unhedged latency distribution
+        self._attempt_latencies: deque = deque(maxlen=window)
+        # Latencies callers actually saw
+        self._call_latencies: deque = deque(maxlen=window)
+        self._recent_hedged: deque = deque(maxlen=window)
+
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._rate_limited = 0
+        self._errors = 0
+        self._saturated = 0
+        # Attempts submitted and not yet finished, queued or running
+        self._in_flight = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples"""
+        with self._lock:
+            if len(self._attempt_latencies) < self.min_samples:
+                return None
+            return percentile(list(self._attempt_latencies), self.percentile)
+
+    def _hedge_allowed(self) -> bool:
+        with self._lock:
+            if self._in_flight >= self.max_workers:
+                self._saturated += 1
+                return False
+            hedged = sum(self._recent_hedged) + 1
+            if hedged / (len(self._recent_hedged) + 1) > self.max_hedge_rate:
+                self._rate_limited += 1
+                return False
+            return True
+
+    def _submit(self, fn: Callable[[], Any]) -> Tuple[Future, threading.Event, Dict[str, float]]:
+        running = threading.Event()
+        timing: Dict[str, float] = {}
+
+        def run():
+            timing['started'] = time.perf_counter()
+            running.set()
+            return fn()
+
+        with self._lock:
+            self._in_flight += 1
+        future = self._executor.submit(run)
+
+        def record(done: Future):
+            with self._lock:
+                self._in_flight -= 1
+                if done.cancelled() or done.exception() is not None or 'started' not in timing:
+                    return
+                self._attempt_latencies.append(time.perf_counter() - timing['started'])
+
+        future.add_done_callback(record)
+        return future, running, timing
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run fn, hedging it once if it is slow. Returns the first successful result."""
+        started = time.perf_counter()
+        primary, running, timing = self._submit(fn)
+        attempts = [primary]
+        hedged = False
+
+        delay = self.hedge_delay()
+        if delay is not None:
+            # Time queued for a thread is not upstream latency; start the clock when the primary runs
+            running.wait()
+            remaining = delay - (time.perf_counter() - timing['started'])
+            done, _ = wait([primary], timeout=max(0.0, remaining))
+            if not done and self._hedge_allowed():
+                hedged = True
+                attempts.append(self._submit(fn)[0])
+
+        winner, error = None, None
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = future
+                    break
+                error = error or future.exception()
+            if winner is not None:
+                break
+
+        for future in pending:
+            future.cancel()
+
+        with self._lock:
+            self._calls += 1
+            self._recent_hedged.append(hedged)
+            if hedged:
+                self._hedges += 1
+                if winner is not None and winner is not primary:
+                    self._hedge_wins += 1
+            if winner is None:
+                self._errors += 1
+            else:
+                self._call_latencies.append(time.perf_counter() - started)
+
+        if winner is None:
+            raise error
+        return winner.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = list(self._attempt_latencies)
+            calls = list(self._call_latencies)
+            hedges, total = self._hedges, self._calls
+            stats = {
+                'name': self.name,
+                'calls': total,
+                'hedges': hedges,
+                'hedge_wins': self._hedge_wins,
+                'hedge_rate': hedges / total if total else None,
+                'rate_limited': self._rate_limited,
+                'errors': self._errors,
+                'saturated': self._saturated,
+                'in_flight': self._in_flight,
+                'max_workers': self.max_workers,
+                'percentile': self.percentile,
+                'max_hedge_rate': self.max_hedge_rate,
+            }
+
+        # Attempt latencies approximate what callers would see without hedging
+        for label, value in (('p50', 50), ('p95', 95), ('p99', 99)):
+            unhedged = percentile(attempts, value)
+            observed = percentile(calls, value)
+            stats[f'unhedged_{label}_ms'] = unhedged * 1000 if unhedged is not None else None
+            stats[f'observed_{label}_ms'] = observed * 1000 if observed is not None else None
+        if stats['unhedged_p99_ms'] is not None and stats['observed_p99_ms'] is not None:
+            stats['p99_reduction_ms'] = stats['unhedged_p99_ms'] - stats['observed_p99_ms']
+        return stats
@@ -0,0 +1,15 @@
+"""
+Small statistics helpers shared by the latency-tracking modules
+(hedging, priority scheduling, the write queue and the replay benchmark).
+"""
+
+from typing import List, Optional
+
+
+def percentile(values: List[float], value: float) -> Optional[float]:
+    """Nearest-rank percentile of values, or None when there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(value / 100 * (len(ordered) - 1))))
+    return ordered[index]
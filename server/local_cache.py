@@ -0,0 +1,224 @@
+"""
+Node-local result cache shared by every worker process on a host.
+Backed by SQLite in WAL mode: readers never block each other or the writer,
+so a result one gunicorn worker computed is a sub-millisecond hit for the
+others, with no network hop. Entries expire after a TTL and the table is kept
+under max_entries by evicting the least recently used rows.
+
+The cache is best effort: any SQLite error is logged and treated as a miss.
+
+Benchmark hit latency on this host with:
+    python local_cache.py bench [--path /tmp/bench.sqlite3] [--entries 1000]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+RESULT_CACHE_PATH = os.getenv(
+    "RESULT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "worthify_result_cache.sqlite3")
+)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access);
+"""
+
+
+class LocalResultCache:
+    """SQLite-backed LRU + TTL cache shared across processes"""
+
+    def __init__(
+        self,
+        path: str = RESULT_CACHE_PATH,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        ttl: float = RESULT_CACHE_TTL,
+        evict_every: int = 100
+    ):
+        """
+        Args:
+            path: SQLite file; every process using the same path shares entries
+            max_entries: Rows kept after eviction
+            ttl: Default seconds an entry stays valid
+            evict_every: Check the size bound once per this many writes in this process
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+        self._errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL only fsyncs at checkpoints; losing recent entries on power loss is fine for a cache
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing, expired, or unreadable"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT value FROM entries WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"Local cache read error: {e}")
+            return None
+
+        if row is None:
+            self._count('_misses')
+            return None
+
+        self._count('_hits')
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO entries (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False, separators=(',', ':')), expires_at, now)
+            )
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"Local cache write error: {e}")
+            return
+
+        with self._stats_lock:
+            self._writes += 1
+            self._writes_since_evict += 1
+            due = self._writes_since_evict >= self.evict_every
+            if due:
+                self._writes_since_evict = 0
+        if due:
+            self.evict()
+
+    def delete(self, key: str):
+        try:
+            self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"Local cache delete error: {e}")
+
+    def evict(self) -> int:
+        """Drop expired rows, then least recently used rows beyond max_entries. Returns rows removed."""
+        try:
+            conn = self._connection()
+            removed = conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),)).rowcount
+            overflow = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                removed += conn.execute(
+                    'DELETE FROM entries WHERE key IN '
+                    '(SELECT key FROM entries ORDER BY last_access LIMIT ?)',
+                    (overflow,)
+                ).rowcount
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"Local cache eviction error: {e}")
+            return 0
+
+        with self._stats_lock:
+            self._evictions += removed
+        return removed
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-process counters; the entry count is shared by all processes"""
+        try:
+            entries = self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                'path': self.path,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else None,
+                'writes': self._writes,
+                'evictions': self._evictions,
+                'errors': self._errors,
+            }
+
+
+def benchmark(path: str, entries: int) -> Dict[str, float]:
+    """Write entries from this process, read them back from a second process, report latency"""
+    import multiprocessing
+
+    cache = LocalResultCache(path, max_entries=entries * 2)
+    value = {'identified_artist': 'Example Artist', 'artwork_title': 'Example', 'notes': 'x' * 500}
+    started = time.perf_counter()
+    for i in range(entries):
+        cache.set(f'bench:{i}', value)
+    write_ms = (time.perf_counter() - started) * 1000 / entries
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        read_ms = pool.apply(_bench_reads, (path, entries))
+
+    return {'entries': entries, 'write_ms_per_entry': write_ms, 'cross_process_hit_ms': read_ms}
+
+
+def _bench_reads(path: str, entries: int) -> float:
+    cache = LocalResultCache(path, max_entries=entries * 2)
+    started = time.perf_counter()
+    for i in range(entries):
+        if cache.get(f'bench:{i}') is None:
+            raise RuntimeError(f"bench:{i} missing in second process")
+    return (time.perf_counter() - started) * 1000 / entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Node-local result cache tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench = subparsers.add_parser('bench', help='Measure cross-process hit latency')
+    bench.add_argument('--path', default=os.path.join(tempfile.gettempdir(), 'worthify_cache_bench.sqlite3'))
+    bench.add_argument('--entries', type=int, default=1000)
+    args = parser.parse_args()
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)
+    print(json.dumps(benchmark(args.path, args.entries), indent=2))
+
+
+if __name__ == "__main__":
+    main()
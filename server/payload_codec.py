@@ -0,0 +1,356 @@
+"""
+Compressed, versioned encoding for cached result payloads.
+image_cache rows can store detected_garments/search_results as one compressed
+blob in the payload column instead of two raw JSON columns. payload_format
+records how the blob was written so old rows keep decoding after the default
+changes.
+
+Formats:
+    0  raw JSON columns (no blob)
+    1  zlib
+    2  zstd
+    3  zstd with a shared dictionary, prefixed with the 4-byte id of that dictionary
+
+New dictionary writes use PAYLOAD_ZSTD_DICT. After retraining, list the previous
+dictionary files in PAYLOAD_ZSTD_DICTS so rows written with them keep decoding;
+each row is decoded with the dictionary whose id it carries.
+
+zstd needs the optional zstandard package; without it the codec falls back to zlib.
+
+Usage:
+    python payload_codec.py train --out payload.dict [--samples 2000]
+    python payload_codec.py bench [--input payloads.jsonl] [--samples 500]
+    python payload_codec.py migrate [--batch-size 200] [--max-rows 10000]
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+FORMAT_ZSTD = 2
+FORMAT_ZSTD_DICT = 3
+FORMAT_NAMES = {
+    FORMAT_RAW: 'raw',
+    FORMAT_ZLIB: 'zlib',
+    FORMAT_ZSTD: 'zstd',
+    FORMAT_ZSTD_DICT: 'zstd_dict',
+}
+
+PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION", "none").lower()
+# Dictionary used for new writes
+PAYLOAD_ZSTD_DICT = os.getenv("PAYLOAD_ZSTD_DICT")
+# Earlier dictionaries, comma-separated, kept only to decode rows written with them
+PAYLOAD_ZSTD_DICTS = [path.strip() for path in os.getenv("PAYLOAD_ZSTD_DICTS", "").split(",") if path.strip()]
+PAYLOAD_ZSTD_LEVEL = int(os.getenv("PAYLOAD_ZSTD_LEVEL", "9"))
+
+_DICT_ID_BYTES = 4
+
+_dictionary: Optional[Any] = None
+_dictionaries: Dict[int, Any] = {}
+_dictionary_loaded = False
+
+
+class PayloadDecodeError(Exception):
+    pass
+
+
+def _read_dictionary(path: str):
+    try:
+        with open(path, 'rb') as f:
+            dictionary = zstandard.ZstdCompressionDict(f.read())
+        print(f"Loaded zstd payload dictionary {dictionary.dict_id()} from {path}")
+        return dictionary
+    except Exception as e:
+        print(f"Could not load zstd payload dictionary {path}: {e}")
+        return None
+
+
+def _load_dictionary():
+    """Load the configured zstd dictionaries once; returns the one used for new writes"""
+    global _dictionary, _dictionary_loaded
+    if _dictionary_loaded:
+        return _dictionary
+
+    _dictionary_loaded = True
+    if zstandard is None:
+        return None
+
+    for path in PAYLOAD_ZSTD_DICTS:
+        dictionary = _read_dictionary(path)
+        if dictionary is not None:
+            _dictionaries[dictionary.dict_id()] = dictionary
+
+    if PAYLOAD_ZSTD_DICT:
+        _dictionary = _read_dictionary(PAYLOAD_ZSTD_DICT)
+        if _dictionary is not None:
+            _dictionary.precompute_compress(level=PAYLOAD_ZSTD_LEVEL)
+            _dictionaries[_dictionary.dict_id()] = _dictionary
+
+    return _dictionary
+
+
+def _dictionary_by_id(dict_id: int):
+    _load_dictionary()
+    dictionary = _dictionaries.get(dict_id)
+    if dictionary is None:
+        raise PayloadDecodeError(f"payload needs zstd dictionary {dict_id} but it is not loaded")
+    return dictionary
+
+
+def default_format() -> int:
+    """Payload format selected by PAYLOAD_COMPRESSION for new writes"""
+    if PAYLOAD_COMPRESSION == 'zstd' and zstandard is not None:
+        return FORMAT_ZSTD_DICT if _load_dictionary() is not None else FORMAT_ZSTD
+    if PAYLOAD_COMPRESSION in {'zlib', 'zstd'}:
+        return FORMAT_ZLIB
+    return FORMAT_RAW
+
+
+def _serialize(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def encode_payload(payload: Dict[str, Any], payload_format: Optional[int] = None) -> Tuple[int, Optional[str]]:
+    """
+    Encode a payload dict. Returns (payload_format, base64 blob).
+    FORMAT_RAW returns (0, None); the caller keeps the data in the JSON columns.
+    """
+    if payload_format is None:
+        payload_format = default_format()
+
+    if payload_format == FORMAT_RAW:
+        return FORMAT_RAW, None
+
+    raw = _serialize(payload)
+    if payload_format == FORMAT_ZLIB:
+        compressed = zlib.compress(raw, 9)
+    elif payload_format == FORMAT_ZSTD:
+        compressed = zstandard.ZstdCompressor(level=PAYLOAD_ZSTD_LEVEL).compress(raw)
+    elif payload_format == FORMAT_ZSTD_DICT:
+        dictionary = _load_dictionary()
+        if dictionary is None:
+            raise ValueError("zstd dictionary format needs PAYLOAD_ZSTD_DICT")
+        compressed = dictionary.dict_id().to_bytes(_DICT_ID_BYTES, 'big') + zstandard.ZstdCompressor(
+            level=PAYLOAD_ZSTD_LEVEL,
+            dict_data=dictionary
+        ).compress(raw)
+    else:
+        raise ValueError(f"Unknown payload format: {payload_format}")
+
+    return payload_format, base64.b64encode(compressed).decode('ascii')
+
+
+def decode_payload(payload_format: int, blob: str) -> Dict[str, Any]:
+    """Decode a blob written by encode_payload"""
+    try:
+        compressed = base64.b64decode(blob)
+        if payload_format == FORMAT_ZLIB:
+            raw = zlib.decompress(compressed)
+        elif payload_format in {FORMAT_ZSTD, FORMAT_ZSTD_DICT}:
+            if zstandard is None:
+                raise PayloadDecodeError("zstandard is not installed")
+            dictionary = None
+            if payload_format == FORMAT_ZSTD_DICT:
+                dict_id = int.from_bytes(compressed[:_DICT_ID_BYTES], 'big')
+                compressed = compressed[_DICT_ID_BYTES:]
+                dictionary = _dictionary_by_id(dict_id)
+            decompressor = zstandard.ZstdDecompressor(dict_data=dictionary) if dictionary else zstandard.ZstdDecompressor()
+            raw = decompressor.decompress(compressed)
+        else:
+            raise PayloadDecodeError(f"Unknown payload format: {payload_format}")
+
+        return json.loads(raw)
+
+    except PayloadDecodeError:
+        raise
+    except Exception as e:
+        raise PayloadDecodeError(str(e)) from e
+
+
+def summary_title(search_results: List[Dict[str, Any]]) -> Optional[str]:
+    """Title shown in history lists, kept outside the compressed blob"""
+    if search_results and isinstance(search_results[0], dict):
+        return search_results[0].get('title')
+    return None
+
+
+def decode_cache_entry(entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Fill detected_garments/search_results of an image_cache row from its payload blob, if it has one"""
+    if not entry:
+        return entry
+
+    payload_format = entry.get('payload_format') or FORMAT_RAW
+    blob = entry.pop('payload', None)
+    if payload_format == FORMAT_RAW or not blob:
+        return entry
+
+    payload = decode_payload(payload_format, blob)
+    entry['detected_garments'] = payload.get('detected_garments', [])
+    entry['search_results'] = payload.get('search_results', [])
+    return entry
+
+
+# ============================================
+# TOOLING: dictionary training, benchmarks, backfill
+# ============================================
+
+def _iter_raw_payloads(limit: int) -> Iterable[Dict[str, Any]]:
+    """Yield raw payloads from image_cache rows that have not been compressed yet"""
+    from supabase_client import supabase_manager
+
+    if not supabase_manager.enabled:
+        raise SystemExit("Supabase is not configured; set SUPABASE_URL and SUPABASE_SERVICE_KEY")
+
+    fetched = 0
+    last_id = None
+    while fetched < limit:
+        query = supabase_manager.client.table('image_cache')\
+            .select('id, detected_garments, search_results')\
+            .or_('payload_format.is.null,payload_format.eq.0')
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.order('id').limit(min(500, limit - fetched)).execute().data or []
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        fetched += len(rows)
+        last_id = rows[-1]['id']
+
+
+def _load_samples(input_path: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    if input_path:
+        with open(input_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()][:limit]
+    return [
+        {'detected_garments': row.get('detected_garments') or [], 'search_results': row.get('search_results') or []}
+        for row in _iter_raw_payloads(limit)
+    ]
+
+
+def train_dictionary(samples: List[Dict[str, Any]], out_path: str, dict_size: int = 112640):
+    if zstandard is None:
+        raise SystemExit("zstandard is required to train a dictionary (pip install zstandard)")
+
+    dictionary = zstandard.train_dictionary(dict_size, [_serialize(sample) for sample in samples])
+    with open(out_path, 'wb') as f:
+        f.write(dictionary.as_bytes())
+    print(f"Trained dictionary {dictionary.dict_id()} ({len(dictionary.as_bytes())} bytes) "
+          f"from {len(samples)} payloads -> {out_path}")
+
+
+def benchmark(samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Compression ratio and per-payload encode/decode time for every available format"""
+    formats = [FORMAT_ZLIB]
+    if zstandard is not None:
+        formats.append(FORMAT_ZSTD)
+        if _load_dictionary() is not None:
+            formats.append(FORMAT_ZSTD_DICT)
+
+    raw_bytes = sum(len(_serialize(sample)) for sample in samples)
+    report = {}
+    for payload_format in formats:
+        started = time.perf_counter()
+        encoded = [encode_payload(sample, payload_format)[1] for sample in samples]
+        encode_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for blob in encoded:
+            decode_payload(payload_format, blob)
+        decode_seconds = time.perf_counter() - started
+
+        compressed_bytes = sum(len(base64.b64decode(blob)) for blob in encoded)
+        report[FORMAT_NAMES[payload_format]] = {
+            'raw_bytes': raw_bytes,
+            'compressed_bytes': compressed_bytes,
+            'wire_bytes': sum(len(blob) for blob in encoded),
+            'ratio': raw_bytes / compressed_bytes if compressed_bytes else 0.0,
+            'encode_ms_per_payload': encode_seconds * 1000 / len(samples),
+            'decode_ms_per_payload': decode_seconds * 1000 / len(samples),
+        }
+    return report
+
+
+def migrate_rows(batch_size: int, max_rows: int) -> int:
+    """Re-encode existing raw rows with the configured format. Returns rows migrated."""
+    from supabase_client import supabase_manager
+
+    payload_format = default_format()
+    if payload_format == FORMAT_RAW:
+        raise SystemExit("Set PAYLOAD_COMPRESSION=zlib or zstd before migrating")
+
+    migrated = 0
+    batch = []
+    for row in _iter_raw_payloads(max_rows):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            migrated += _migrate_batch(supabase_manager, batch, payload_format)
+            batch = []
+    if batch:
+        migrated += _migrate_batch(supabase_manager, batch, payload_format)
+
+    print(f"Migrated {migrated} image_cache rows to payload format {payload_format}")
+    return migrated
+
+
+def _migrate_batch(manager, rows: List[Dict[str, Any]], payload_format: int) -> int:
+    migrated = 0
+    for row in rows:
+        search_results = row.get('search_results') or []
+        _, blob = encode_payload({
+            'detected_garments': row.get('detected_garments') or [],
+            'search_results': search_results,
+        }, payload_format)
+        manager.client.table('image_cache')\
+            .update({
+                'payload_format': payload_format,
+                'payload': blob,
+                'summary_title': summary_title(search_results),
+                'detected_garments': [],
+                'search_results': []
+            })\
+            .eq('id', row['id'])\
+            .execute()
+        migrated += 1
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached payload compression tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train = subparsers.add_parser('train', help='Train a shared zstd dictionary')
+    train.add_argument('--out', required=True)
+    train.add_argument('--input', help='JSONL file of payloads (defaults to image_cache rows)')
+    train.add_argument('--samples', type=int, default=2000)
+
+    bench = subparsers.add_parser('bench', help='Report compression ratio and encode/decode cost')
+    bench.add_argument('--input', help='JSONL file of payloads (defaults to image_cache rows)')
+    bench.add_argument('--samples', type=int, default=500)
+
+    migrate = subparsers.add_parser('migrate', help='Compress existing raw image_cache rows')
+    migrate.add_argument('--batch-size', type=int, default=200)
+    migrate.add_argument('--max-rows', type=int, default=10000)
+
+    args = parser.parse_args()
+    if args.command == 'train':
+        train_dictionary(_load_samples(args.input, args.samples), args.out)
+    elif args.command == 'bench':
+        print(json.dumps(benchmark(_load_samples(args.input, args.samples)), indent=2))
+    elif args.command == 'migrate':
+        migrate_rows(args.batch_size, args.max_rows)
+
+
+if __name__ == "__main__":
+    main()
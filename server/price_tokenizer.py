@@ -0,0 +1,270 @@
+"""
+Single-pass price tokenizer for estimated value ranges.
+Finds currency amounts ("$1,200", "USD 5k", "30 million EUR") and ranges
+between them in text written by Claude or scraped from search results.
+
+It matches exactly what the earlier regular expressions matched (see
+_legacy_patterns), but runs in time linear in the input. The regexes
+backtracked through every digit of every start position, so long digit-heavy
+strings took quadratic time (8,000 digits took ~40 s). Here digit runs,
+whitespace runs and thousands-separator chains are precomputed once from the
+right, and every start position then resolves in constant time.
+
+Benchmark worst-case inputs against the old regexes with:
+    python price_tokenizer.py bench [--sizes 1000 4000 16000] [--skip-legacy]
+"""
+
+import argparse
+import json
+import re
+import time
+from typing import Iterator, List, NamedTuple, Optional
+
+CURRENCY_CODES = (
+    "USD",
+    "EUR",
+    "GBP",
+    "NOK",
+    "SEK",
+    "DKK",
+    "CAD",
+    "AUD",
+    "CHF",
+    "JPY",
+    "CNY",
+    "HKD",
+    "SGD",
+    "NZD",
+)
+CURRENCY_SYMBOLS = "$€£¥"
+RANGE_DASHES = "-–—"
+MAGNITUDE_WORDS = ("million", "billion")
+_FOLDED_CODES = frozenset(code.lower() for code in CURRENCY_CODES)
+
+# Characters re.IGNORECASE also folds onto ASCII letters besides those whose lower() is one
+_EXTRA_CASE_FOLDS = {"İ": "i", "ı": "i", "ſ": "s"}
+
+
+class PriceRange(NamedTuple):
+    text: str
+    lower: str
+    upper: str
+
+
+def _fold(char: str) -> str:
+    """Case-fold one character the way re.IGNORECASE compares it against ASCII letters"""
+    if char in _EXTRA_CASE_FOLDS:
+        return _EXTRA_CASE_FOLDS[char]
+    lowered = char.lower()
+    return lowered if len(lowered) == 1 else char
+
+
+class _Scanner:
+    """Precomputed lookups over one string; every method below is O(1) per call"""
+
+    def __init__(self, text: str):
+        self.text = text
+        n = self.n = len(text)
+        self.folded = "".join(map(_fold, text))
+        self.digit = [char.isdecimal() for char in text]
+        self.space = [char.isspace() for char in text]
+
+        # run_end[i]: end of the digit run starting at i (i itself when text[i] is not a digit)
+        self.run_end = [n] * (n + 1)
+        # space_end[i]: first non-whitespace position at or after i
+        self.space_end = [n] * (n + 1)
+        # chain[i]: how many ",ddd" / " ddd" thousands groups follow each other from i
+        self.chain = [0] * (n + 5)
+        for i in range(n - 1, -1, -1):
+            self.run_end[i] = self.run_end[i + 1] if self.digit[i] else i
+            self.space_end[i] = self.space_end[i + 1] if self.space[i] else i
+            if (
+                (text[i] == "," or self.space[i])
+                and i + 3 < n
+                and self.digit[i + 1] and self.digit[i + 2] and self.digit[i + 3]
+            ):
+                self.chain[i] = 1 + self.chain[i + 4]
+
+    def _word_at(self, position: int, word: str, ignore_case: bool = True) -> bool:
+        """word must be lowercase ASCII"""
+        source = self.folded if ignore_case else self.text
+        return source.startswith(word, position)
+
+    def _boundary_after_letter(self, position: int) -> bool:
+        if position >= self.n:
+            return True
+        char = self.text[position]
+        return not (char.isalnum() or char == "_")
+
+    def currency_code_end(self, position: int) -> Optional[int]:
+        if self.folded[position:position + 3] in _FOLDED_CODES:
+            return position + 3
+        return None
+
+    def number_end(self, start: int) -> int:
+        """
+        End of the number starting at the digit at start: grouped thousands
+        ("1,234,567" when the first group has at most three digits), otherwise the
+        whole digit run, then an optional decimal part.
+        """
+        end = self.run_end[start]
+        if end - start <= 3 and self.chain[end]:
+            end += 4 * self.chain[end]
+        if end + 1 < self.n and self.text[end] == "." and self.digit[end + 1]:
+            end = self.run_end[end + 1]
+        return end
+
+    def magnitude_end(self, position: int) -> int:
+        """End of an optional "k"/"m"/"b"/"million"/"billion" suffix, allowing one space before it"""
+        start = position + 1 if position < self.n and self.space[position] else position
+        if start < self.n:
+            if self.folded[start] in "kmb" and self._boundary_after_letter(start + 1):
+                return start + 1
+            for word in MAGNITUDE_WORDS:
+                if self._word_at(start, word) and self._boundary_after_letter(start + len(word)):
+                    return start + len(word)
+        return position
+
+    def amount_end(self, start: int) -> Optional[int]:
+        """End of a currency amount starting at start: "$ 5k", "USD 5k" or "5k USD"; None if there is none"""
+        if start >= self.n:
+            return None
+
+        char = self.text[start]
+        if char in CURRENCY_SYMBOLS:
+            number_start = self.space_end[start + 1]
+        else:
+            code_end = self.currency_code_end(start)
+            if code_end is not None:
+                number_start = self.space_end[code_end]
+            elif self.digit[start]:
+                return self.currency_code_end(self.space_end[self.magnitude_end(self.number_end(start))])
+            else:
+                return None
+
+        if number_start < self.n and self.digit[number_start]:
+            return self.magnitude_end(self.number_end(number_start))
+        return None
+
+    def range_separator_end(self, position: int, ignore_case: bool = True) -> Optional[int]:
+        """End of the "to" or dash between two amounts, skipping whitespace on both sides"""
+        position = self.space_end[position]
+        if self._word_at(position, "to", ignore_case):
+            return self.space_end[position + 2]
+        if position < self.n and self.text[position] in RANGE_DASHES:
+            return self.space_end[position + 1]
+        return None
+
+
+def find_price_range(text: str) -> Optional[PriceRange]:
+    """The first "<amount> to <amount>" or "<amount> - <amount>" in text"""
+    scanner = _Scanner(text)
+    for start in range(scanner.n):
+        lower_end = scanner.amount_end(start)
+        if lower_end is None:
+            continue
+        upper_start = scanner.range_separator_end(lower_end)
+        if upper_start is None:
+            continue
+        upper_end = scanner.amount_end(upper_start)
+        if upper_end is not None:
+            return PriceRange(text[start:upper_end], text[start:lower_end], text[upper_start:upper_end])
+    return None
+
+
+def iter_price_amounts(text: str) -> Iterator[str]:
+    """Every non-overlapping currency amount in text, left to right"""
+    scanner = _Scanner(text)
+    start = 0
+    while start < scanner.n:
+        end = scanner.amount_end(start)
+        if end is None:
+            start += 1
+            continue
+        yield text[start:end]
+        start = end
+
+
+def find_plain_numeric_range(text: str) -> Optional[PriceRange]:
+    """The first "<number> to <number>" without currency markers; "to" is case sensitive here"""
+    scanner = _Scanner(text)
+    for start in range(scanner.n):
+        if not scanner.digit[start]:
+            continue
+        lower_end = scanner.number_end(start)
+        upper_start = scanner.range_separator_end(lower_end, ignore_case=False)
+        if upper_start is None or upper_start >= scanner.n or not scanner.digit[upper_start]:
+            continue
+        upper_end = scanner.number_end(upper_start)
+        return PriceRange(text[start:upper_end], text[start:lower_end], text[upper_start:upper_end])
+    return None
+
+
+# ============================================
+# TOOLING: reference regexes and worst-case benchmark
+# ============================================
+
+def _legacy_patterns() -> dict:
+    """The regexes this tokenizer replaced; kept as the reference for equivalence tests and benchmarks"""
+    code_pattern = "|".join(CURRENCY_CODES)
+    number = r"(?:\d{1,3}(?:[,\s]\d{3})+|\d+)(?:\.\d+)?"
+    magnitude = r"(?:\s?(?:[kmb]\b|million\b|billion\b))?"
+    amount = (
+        rf"(?:[{re.escape(CURRENCY_SYMBOLS)}]\s*{number}{magnitude}"
+        rf"|(?:{code_pattern})\s*{number}{magnitude}"
+        rf"|{number}{magnitude}\s*(?:{code_pattern}))"
+    )
+    return {
+        "range": re.compile(rf"({amount})\s*(?:to|[-–—])\s*({amount})", re.IGNORECASE),
+        "amount": re.compile(amount, re.IGNORECASE),
+        "plain_range": re.compile(rf"({number})\s*(?:to|[-–—])\s*({number})"),
+    }
+
+
+def worst_case_inputs(size: int) -> dict:
+    """Digit-heavy strings that made the regexes backtrack at every start position"""
+    return {
+        "digits": "9" * size,
+        "space_groups": "1" + " 234" * (size // 4),
+        "comma_groups_after_symbol": "$1" + ",234" * (size // 4) + " x",
+        "decimals": "1." * (size // 2),
+        "near_ranges": "$1 to " * (size // 6),
+    }
+
+
+def benchmark(sizes: List[int], include_legacy: bool = True) -> dict:
+    """Seconds to find a range, all amounts and a plain range in each worst-case input"""
+    legacy = _legacy_patterns() if include_legacy else None
+    report = {}
+    for size in sizes:
+        for name, text in worst_case_inputs(size).items():
+            started = time.perf_counter()
+            find_price_range(text)
+            list(iter_price_amounts(text))
+            find_plain_numeric_range(text)
+            row = {"tokenizer_seconds": round(time.perf_counter() - started, 4)}
+
+            if legacy:
+                started = time.perf_counter()
+                legacy["range"].search(text)
+                list(legacy["amount"].finditer(text))
+                legacy["plain_range"].search(text)
+                row["regex_seconds"] = round(time.perf_counter() - started, 4)
+
+            report[f"{name}/{size}"] = row
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price tokenizer tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench = subparsers.add_parser("bench", help="Time worst-case inputs against the old regexes")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000])
+    bench.add_argument("--skip-legacy", action="store_true", help="Only time the tokenizer (for large sizes)")
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.sizes, include_legacy=not args.skip_legacy), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Weighted priority admission for /identify.
+Requests wait in one queue per user tier; whenever a pipeline slot frees up
+the next request is taken from the tier with the lowest virtual time (stride
+scheduling), so a tier with weight 6 is admitted six times as often as a tier
+with weight 1 while both have requests waiting. Each tier also has its own
+concurrency cap, so trial traffic can never hold every slot.
+
+Starvation protection: a request that has waited longer than
+starvation_seconds goes ahead of the weighted order (oldest first) as soon as
+its tier is under its cap.
+
+Waiting happens on the event loop, not in a worker thread, so queued requests
+do not use up the threadpool that admitted ones run on.
+
+Compare FIFO and weighted wait times under a synthetic spike with:
+    python priority_scheduler.py simulate [--requests 300] [--service-ms 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from latency_stats import percentile
+
+# name:weight:max_concurrency, highest priority first
+SCHEDULER_CLASSES = os.getenv("SCHEDULER_CLASSES", "premium:6:8,trial:2:4,free:1:2")
+SCHEDULER_DEFAULT_TIER = os.getenv("SCHEDULER_DEFAULT_TIER", "free")
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "100"))
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "60"))
+SCHEDULER_STARVATION_SECONDS = float(os.getenv("SCHEDULER_STARVATION_SECONDS", "10"))
+
+
+class PriorityClass(NamedTuple):
+    name: str
+    weight: float
+    max_concurrency: int
+
+
+class SchedulerFull(Exception):
+    """The tier's queue is full, or the request waited longer than queue_timeout"""
+
+    def __init__(self, tier: str, reason: str):
+        super().__init__(f"{tier} queue {reason}")
+        self.tier = tier
+        self.reason = reason
+
+
+def parse_classes(spec: str) -> List[PriorityClass]:
+    """Parse "premium:6:8,trial:2:4,free:1:2" into PriorityClass tuples"""
+    classes = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, weight, max_concurrency = item.split(':')
+        classes.append(PriorityClass(name.strip(), float(weight), int(max_concurrency)))
+    if not classes:
+        raise ValueError("at least one scheduler class is required")
+    return classes
+
+
+class _Waiter(NamedTuple):
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class _ClassState:
+    def __init__(self, config: PriorityClass, window: int):
+        self.config = config
+        self.queue: Deque[_Waiter] = deque()
+        self.running = 0
+        self.virtual_time = 0.0
+        self.waits: Deque[float] = deque(maxlen=window)
+        self.admitted = 0
+        self.promoted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+
+class PriorityScheduler:
+    """Admits at most `concurrency` requests at once, choosing by tier weight"""
+
+    def __init__(
+        self,
+        classes: Optional[List[PriorityClass]] = None,
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        default_tier: str = SCHEDULER_DEFAULT_TIER,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        queue_timeout: Optional[float] = SCHEDULER_QUEUE_TIMEOUT,
+        starvation_seconds: float = SCHEDULER_STARVATION_SECONDS,
+        window: int = 1000
+    ):
+        """
+        Args:
+            classes: Tiers with weight and concurrency cap (default: SCHEDULER_CLASSES)
+            concurrency: Requests running the pipeline at once across all tiers
+            default_tier: Tier for requests with a missing or unknown tier
+            max_queue: Waiting requests per tier before new ones are rejected
+            queue_timeout: Seconds a request may wait before it is rejected (None waits forever)
+            starvation_seconds: Wait after which a request skips the weighted order
+            window: Recent queue waits kept per tier for percentiles
+        """
+        classes = classes or parse_classes(SCHEDULER_CLASSES)
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.starvation_seconds = starvation_seconds
+        self._classes: Dict[str, _ClassState] = {c.name: _ClassState(c, window) for c in classes}
+        self.default_tier = default_tier if default_tier in self._classes else classes[-1].name
+
+        # Queue state is only touched on the event loop; the lock keeps stats() consistent from other threads
+        self._lock = threading.Lock()
+        self._running = 0
+        self._virtual_time = 0.0
+
+    def resolve_tier(self, tier: Optional[str]) -> str:
+        tier = (tier or '').strip().lower()
+        return tier if tier in self._classes else self.default_tier
+
+    def _pick(self, now: float) -> Optional[_ClassState]:
+        eligible = [
+            state for state in self._classes.values()
+            if state.queue and state.running < state.config.max_concurrency
+        ]
+        if not eligible:
+            return None
+
+        oldest = min(eligible, key=lambda state: state.queue[0].enqueued_at)
+        if now - oldest.queue[0].enqueued_at >= self.starvation_seconds:
+            oldest.promoted += 1
+            return oldest
+        return min(eligible, key=lambda state: state.virtual_time)
+
+    def _dispatch(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._running < self.concurrency:
+                state = self._pick(now)
+                if state is None:
+                    return
+                waiter = state.queue.popleft()
+                if waiter.future.done():
+                    # Cancelled while queued; its slot was never taken
+                    continue
+
+                self._virtual_time = state.virtual_time
+                state.virtual_time += 1.0 / state.config.weight
+                state.running += 1
+                state.admitted += 1
+                state.waits.append(now - waiter.enqueued_at)
+                self._running += 1
+                waiter.future.set_result(None)
+
+    async def acquire(self, tier: Optional[str]) -> str:
+        """Wait for a pipeline slot. Returns the resolved tier, which must be passed to release()."""
+        name = self.resolve_tier(tier)
+        state = self._classes[name]
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), time.monotonic())
+
+        with self._lock:
+            if len(state.queue) >= self.max_queue:
+                state.rejected += 1
+                raise SchedulerFull(name, "is full")
+            if not state.queue and not state.running:
+                # An idle tier resumes at the current virtual time instead of spending credit it saved up
+                state.virtual_time = max(state.virtual_time, self._virtual_time)
+            state.queue.append(waiter)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except BaseException as exc:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the caller gave up
+                self.release(name)
+            else:
+                with self._lock:
+                    if waiter in state.queue:
+                        state.queue.remove(waiter)
+                    if isinstance(exc, asyncio.TimeoutError):
+                        state.timed_out += 1
+            if isinstance(exc, asyncio.TimeoutError):
+                raise SchedulerFull(name, f"wait exceeded {self.queue_timeout}s") from exc
+            raise
+        return name
+
+    def release(self, tier: str):
+        with self._lock:
+            self._classes[tier].running -= 1
+            self._running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tier: Optional[str]):
+        name = await self.acquire(tier)
+        try:
+            yield name
+        finally:
+            self.release(name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            classes = {}
+            for name, state in self._classes.items():
+                waits = list(state.waits)
+                row = {
+                    'weight': state.config.weight,
+                    'max_concurrency': state.config.max_concurrency,
+                    'queued': len(state.queue),
+                    'running': state.running,
+                    'admitted': state.admitted,
+                    'starvation_promotions': state.promoted,
+                    'rejected': state.rejected,
+                    'timed_out': state.timed_out,
+                }
+                for label, value in (('p50', 50), ('p95', 95), ('p99', 99)):
+                    wait = percentile(waits, value)
+                    row[f'queue_wait_{label}_ms'] = wait * 1000 if wait is not None else None
+                classes[name] = row
+            return {
+                'concurrency': self.concurrency,
+                'running': self._running,
+                'default_tier': self.default_tier,
+                'classes': classes,
+            }
+
+
+# ============================================
+# TOOLING: synthetic spike simulation
+# ============================================
+
+async def _run_spike(scheduler: PriorityScheduler, tiers: List[str], fifo: bool, service_seconds: float, seed: int):
+    """Send every request at once and return the queue waits seen by each tier"""
+    rng = random.Random(seed)
+    waits: Dict[str, List[float]] = {tier: [] for tier in tiers}
+
+    async def request(tier: str):
+        enqueued = time.monotonic()
+        async with scheduler.slot('all' if fifo else tier):
+            waits[tier].append(time.monotonic() - enqueued)
+            await asyncio.sleep(service_seconds * rng.uniform(0.5, 1.5))
+
+    await asyncio.gather(*(request(tier) for tier in tiers))
+    return waits
+
+
+def simulate(requests: int, service_ms: float, concurrency: int, premium_share: float, seed: int = 0) -> dict:
+    """Queue-wait p95 per tier for the same spike under one FIFO queue and under weighted scheduling"""
+    rng = random.Random(seed)
+    classes = parse_classes(SCHEDULER_CLASSES)
+    premium, others = classes[0].name, [c.name for c in classes[1:]] or [classes[0].name]
+    tiers = [premium if rng.random() < premium_share else rng.choice(others) for _ in range(requests)]
+
+    schedulers = {
+        'fifo': PriorityScheduler([PriorityClass('all', 1.0, concurrency)], concurrency=concurrency),
+        'weighted': PriorityScheduler(classes, concurrency=concurrency),
+    }
+    report = {}
+    for label, scheduler in schedulers.items():
+        scheduler.max_queue = requests
+        scheduler.queue_timeout = None
+        waits = asyncio.run(_run_spike(scheduler, tiers, label == 'fifo', service_ms / 1000, seed))
+        report[label] = {
+            tier: {
+                'requests': len(values),
+                'queue_wait_p50_ms': _ms(percentile(values, 50)),
+                'queue_wait_p95_ms': _ms(percentile(values, 95)),
+            }
+            for tier, values in sorted(waits.items())
+        }
+    return report
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Priority scheduler tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sim = subparsers.add_parser("simulate", help="Compare FIFO and weighted queue waits under a spike")
+    sim.add_argument("--requests", type=int, default=300)
+    sim.add_argument("--service-ms", type=float, default=50)
+    sim.add_argument("--concurrency", type=int, default=SCHEDULER_CONCURRENCY)
+    sim.add_argument("--premium-share", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(json.dumps(simulate(args.requests, args.service_ms, args.concurrency, args.premium_share), indent=2))
+
+
+if __name__ == "__main__":
+    main()
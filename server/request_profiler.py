@@ -0,0 +1,194 @@
+"""
+On-demand sampling profiles of single /identify requests.
+While a profiled request runs, a background thread reads the request thread's
+Python stack every interval_ms and counts identical stacks. The result is
+written as collapsed stacks ("frame;frame;frame count" per line), which
+flamegraph.pl, inferno and speedscope all read directly:
+
+    flamegraph.pl /tmp/worthify_profiles/<file>.collapsed > profile.svg
+
+Sampling only looks at the stack from outside, so the profiled code runs
+unmodified; requests that are not profiled pay nothing beyond the check that
+decides whether to profile them.
+
+Work the request thread hands off to other threads (hedged Claude attempts,
+concurrent searches) shows up as the frame that waits for it.
+"""
+
+import hmac
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "worthify_profiles"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts the stacks one thread is in, sampled from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+class RequestProfiler:
+    """Decides which requests to profile and writes their collapsed stacks to a directory"""
+
+    def __init__(
+        self,
+        directory: str = PROFILE_DIR,
+        token: Optional[str] = PROFILE_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+        max_files: int = PROFILE_MAX_FILES
+    ):
+        """
+        Args:
+            directory: Where profiles are written
+            token: Secret a caller sends in X-Profile-Token to profile its request (None disables the header)
+            sample_rate: Fraction of other requests to profile
+            interval_ms: Milliseconds between stack samples
+            max_files: Oldest profiles beyond this many are deleted
+        """
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+
+        self._lock = threading.Lock()
+        self._requested = 0
+        self._sampled = 0
+        self._written = 0
+        self._errors = 0
+        self._prune_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def should_profile(self, header_token: Optional[str]) -> bool:
+        """True for requests carrying the profile token, and for a sample_rate share of the rest"""
+        if header_token and self.token and hmac.compare_digest(header_token.encode(), self.token.encode()):
+            with self._lock:
+                self._requested += 1
+            return True
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            with self._lock:
+                self._sampled += 1
+            return True
+        return False
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Sample the calling thread until the block exits, then write <name>.collapsed.
+        Yields a dict whose 'path' is set once the profile is written.
+        """
+        info: Dict[str, Any] = {'path': None}
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield info
+        finally:
+            sampler.stop()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            info['path'] = self._write(name, sampler, elapsed_ms)
+
+    def _write(self, name: str, sampler: StackSampler, elapsed_ms: float) -> Optional[str]:
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{int(elapsed_ms)}ms-{name}.collapsed")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+        except OSError as e:
+            print(f"Profile write error for {path}: {e}")
+            with self._lock:
+                self._errors += 1
+            return None
+
+        with self._lock:
+            self._written += 1
+
+        try:
+            self._prune()
+        except OSError as e:
+            print(f"Profile prune error in {self.directory}: {e}")
+            with self._lock:
+                self._prune_errors += 1
+        return path
+
+    def _prune(self):
+        # Other workers prune the same directory, so files may vanish between listing and removal
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.collapsed'):
+                continue
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'sample_rate': self.sample_rate,
+                'token_enabled': bool(self.token),
+                'requested': self._requested,
+                'sampled': self._sampled,
+                'written': self._written,
+                'errors': self._errors,
+                'prune_errors': self._prune_errors,
+            }
@@ -4,22 +4,131 @@ Handles all database operations including caching, user history, and favorites.
 
 IMPORTANT: Users MUST be authenticated via Supabase Auth before using these APIs.
 The iOS app handles authentication and sends the auth user ID.
+
+The Supabase client is created on first use, not at import, so importing this
+module is cheap and works without credentials.
 """
 
+import base64
+import json
 import os
-from typing import Optional, Dict, Any, List
-from supabase import create_client, Client
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional, Dict, Any, List
 from datetime import datetime, timedelta, timezone
 
-# Get Supabase credentials from environment
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Service role key for server
+from bloom_filter import CacheKeyFilter
+from cache_refresher import CacheRefresher, Revalidate
+from counter_buffer import CounterBuffer, PartialFlush
+from favorites_cache import FavoritesCache
+from payload_codec import FORMAT_RAW, PayloadDecodeError, decode_cache_entry, encode_payload, summary_title
+from url_canonicalizer import canonicalize_url, legacy_normalize_url
+from write_queue import WriteQueue
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Hit/access counters are buffered in process and written in bulk
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "5"))
+COUNTER_MAX_PENDING = int(os.getenv("COUNTER_MAX_PENDING", "500"))
+
+# Opt-in Bloom filter that lets definite cache misses skip the database
+CACHE_FILTER_ENABLED = os.getenv("CACHE_FILTER_ENABLED", "false").lower() in {"1", "true", "yes"}
+CACHE_FILTER_CAPACITY = int(os.getenv("CACHE_FILTER_CAPACITY", "1000000"))
+CACHE_FILTER_ERROR_RATE = float(os.getenv("CACHE_FILTER_ERROR_RATE", "0.01"))
+CACHE_FILTER_REBUILD_INTERVAL = float(os.getenv("CACHE_FILTER_REBUILD_INTERVAL", "300"))
+CACHE_FILTER_PAGE_SIZE = 1000
+
+# Opt-in refresh-ahead / stale-while-revalidate. The process that stores identify
+# results starts it with start_cache_refresher(revalidate); the sweeper reads the
+# same flag so it keeps the stale window even though it runs without a refresher.
+CACHE_REFRESH_ENABLED = os.getenv("CACHE_REFRESH_ENABLED", "false").lower() in {"1", "true", "yes"}
+
+# Expired entries up to this many seconds old may be served stale while they are
+# revalidated in the background; 0 disables it. Only takes effect once a handler is
+# registered (start_cache_refresher()); without one expired entries stay misses.
+CACHE_STALE_MAX_SECONDS = int(os.getenv("CACHE_STALE_MAX_SECONDS", "0"))
+
+# Column projections for list screens; the JSON result blobs are fetched by ID on demand
+IMAGE_CACHE_SUMMARY_COLUMNS = 'id, image_url, image_hash, cloudinary_url, total_results, country, expires_at, cache_hits'
+USER_SEARCH_SUMMARY_COLUMNS = (
+    'id, user_id, created_at, search_type, source_url, source_username, '
+    'image_cache_id, cloudinary_url, image_url, total_results, title'
+)
+
+# Bulk favorites operations split IDs into chunks that keep PostgREST URLs short
+FAVORITES_CHUNK_SIZE = int(os.getenv("FAVORITES_CHUNK_SIZE", "100"))
+FAVORITES_MAX_CONCURRENCY = int(os.getenv("FAVORITES_MAX_CONCURRENCY", "4"))
+
+# Opt-in per-user favorites cache; favorite checks are answered in process after the first load
+FAVORITES_CACHE_ENABLED = os.getenv("FAVORITES_CACHE_ENABLED", "false").lower() in {"1", "true", "yes"}
+FAVORITES_CACHE_MAX_ENTRIES = int(os.getenv("FAVORITES_CACHE_MAX_ENTRIES", "50000"))
+FAVORITES_CACHE_TTL = float(os.getenv("FAVORITES_CACHE_TTL", "300"))
+
+# Opt-in durable queue for result/history writes; enqueue_* return before the database is written.
+# Queued writes outlive a deploy only if WRITE_QUEUE_PATH is on a persistent disk (see write_queue.py)
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "false").lower() in {"1", "true", "yes"}
+
+# What created_at and id look like in PostgREST responses
+_CURSOR_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}(?::?\d{2})?)?$')
+_CURSOR_ID = re.compile(r'^[\w-]+$')
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    """Build an opaque keyset cursor from the last row of a page"""
+    payload = json.dumps({'c': row['created_at'], 'i': row['id']}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _chunked(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _quote_filter_value(value: str) -> str:
+    """Quote a value for a PostgREST or_() filter; URLs can contain commas and parentheses"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _url_lookup_keys(url: str) -> List[str]:
+    """The URL as received, its canonical key, and the legacy normalized form older rows were stored under"""
+    keys = []
+    for key in (url, canonicalize_url(url), legacy_normalize_url(url)):
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor from _encode_cursor into (created_at, id); raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at, row_id = str(payload['c']), str(payload['i'])
+        # Both values end up inside a PostgREST filter, so only accept what _encode_cursor produces
+        if not _CURSOR_TIMESTAMP.match(created_at) or not _CURSOR_ID.match(row_id):
+            raise ValueError(f"unexpected cursor values {created_at!r}, {row_id!r}")
+        return created_at, row_id
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor}") from e
+
 
 class SupabaseManager:
     """Singleton manager for Supabase operations"""
 
     _instance: Optional['SupabaseManager'] = None
-    _client: Optional[Client] = None
+    _client: Optional['Client'] = None
+    _credentials_missing = False
+    _connect_lock = threading.Lock()
+    _cache_hit_counter: Optional[CounterBuffer] = None
+    _instagram_access_counter: Optional[CounterBuffer] = None
+    _key_filter: Optional[CacheKeyFilter] = None
+    _favorites_cache: Optional[FavoritesCache] = None
+    _write_queue: Optional[WriteQueue] = None
+    _stale_handler: Optional[Callable[[Dict[str, Any]], None]] = None
+    _cache_refresher: Optional[CacheRefresher] = None
+    _warned_no_stale_handler = False
 
     def __new__(cls):
         if cls._instance is None:
@@ -27,66 +136,118 @@ class SupabaseManager:
         return cls._instance
 
     def __init__(self):
-        if self._client is None:
-            if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        if self._cache_hit_counter is None:
+            self._cache_hit_counter = CounterBuffer(
+                'image_cache_hits',
+                self._flush_cache_hits,
+                flush_interval=COUNTER_FLUSH_INTERVAL,
+                max_pending=COUNTER_MAX_PENDING
+            )
+            self._instagram_access_counter = CounterBuffer(
+                'instagram_cache_access',
+                self._flush_instagram_cache_access,
+                flush_interval=COUNTER_FLUSH_INTERVAL,
+                max_pending=COUNTER_MAX_PENDING
+            )
+
+        if self._key_filter is None and CACHE_FILTER_ENABLED:
+            self._key_filter = CacheKeyFilter(
+                self._load_cache_keys,
+                capacity=CACHE_FILTER_CAPACITY,
+                error_rate=CACHE_FILTER_ERROR_RATE,
+                rebuild_interval=CACHE_FILTER_REBUILD_INTERVAL
+            )
+
+        if self._favorites_cache is None and FAVORITES_CACHE_ENABLED:
+            self._favorites_cache = FavoritesCache(
+                max_entries=FAVORITES_CACHE_MAX_ENTRIES,
+                ttl=FAVORITES_CACHE_TTL
+            )
+
+        if self._write_queue is None and WRITE_QUEUE_ENABLED:
+            self._write_queue = WriteQueue('supabase', {
+                'image_cache': self._write_cache_entries,
+                'user_search': self._write_user_searches,
+                'instagram_url_cache': self._write_instagram_url_cache,
+            })
+
+    def _connect(self):
+        """Create the Supabase client from the environment (first use only)"""
+        with self._connect_lock:
+            if self._client is not None or self._credentials_missing:
+                return
+
+            # Get Supabase credentials from environment
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_service_key = os.getenv("SUPABASE_SERVICE_KEY")  # Service role key for server
+
+            if not supabase_url or not supabase_service_key:
                 print("WARNING: Supabase credentials not found in environment")
                 print("Set SUPABASE_URL and SUPABASE_SERVICE_KEY to enable caching")
-                self._client = None
-            else:
-                self._client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-                print("Supabase client initialized")
+                SupabaseManager._credentials_missing = True
+                return
+
+            from supabase import create_client
+
+            self._client = create_client(supabase_url, supabase_service_key)
+            print("Supabase client initialized")
 
     @property
-    def client(self) -> Optional[Client]:
+    def client(self) -> Optional['Client']:
+        if self._client is None and not self._credentials_missing:
+            self._connect()
         return self._client
 
     @property
     def enabled(self) -> bool:
-        return self._client is not None
+        return self.client is not None
 
     # ============================================
     # IMAGE CACHE OPERATIONS
     # ============================================
 
-    def check_cache_by_source(self, source_url: str) -> Optional[Dict[str, Any]]:
+    def check_cache_by_source(self, source_url: str, summary_only: bool = False) -> Optional[Dict[str, Any]]:
         """
         Check if we've already analyzed this Instagram/source URL.
         Returns cache entry if found and not expired, None otherwise.
+
+        Args:
+            source_url: Instagram/source URL the image came from
+            summary_only: Skip detected_garments/search_results; load them later with get_cache_entry
         """
         if not self.enabled:
             return None
 
         try:
-            # Normalize Instagram URLs to handle query parameters like ?igsh=
-            normalized_url = self._normalize_instagram_url(source_url)
+            # Match the canonical key as well as forms stored before canonicalization
+            lookup_urls = _url_lookup_keys(source_url)
+            normalized_url = lookup_urls[1] if len(lookup_urls) > 1 else source_url
 
-            # Find a user_search with this source_url
-            # Check both original and normalized URLs for Instagram
-            query_filter = f'source_url.eq.{source_url}'
-            if normalized_url != source_url:
-                # If URL was normalized (has query params), check both versions
-                query_filter = f'source_url.eq.{source_url},source_url.eq.{normalized_url}'
+            if not self._filter_might_contain([f'source:{url}' for url in lookup_urls]):
+                print(f"Instagram cache MISS (filtered) for URL: {source_url}")
+                return None
 
-            response = self.client.table('user_searches')\
-                .select('image_cache_id, image_cache(*)')\
-                .or_(query_filter)\
-                .order('created_at', desc=True)\
+            # Point read on the unique source_url_key index (one probe per lookup form)
+            cache_columns = IMAGE_CACHE_SUMMARY_COLUMNS if summary_only else '*'
+            response = self.client.table('image_cache_sources')\
+                .select(f'image_cache_id, image_cache({cache_columns})')\
+                .in_('source_url_key', lookup_urls)\
+                .order('updated_at', desc=True)\
                 .limit(1)\
                 .execute()
 
             if response.data and len(response.data) > 0:
-                search = response.data[0]
-                cache_data = search.get('image_cache')
+                source = response.data[0]
+                cache_data = source.get('image_cache')
 
                 if cache_data:
-                    # Check if cache is still valid
-                    expires_at_str = cache_data.get('expires_at')
-                    if expires_at_str:
-                        expires_at = datetime.fromisoformat(expires_at_str.replace('Z', '+00:00'))
-                        if expires_at > datetime.now(expires_at.tzinfo):
-                            print(f"Cache HIT for Instagram URL: {source_url[:50]}... (normalized: {normalized_url[:50]}...)")
-                            return cache_data
+                    # Check if cache is still valid (or servable stale while it is revalidated)
+                    staleness = self._staleness(cache_data)
+                    if staleness is not None and self._serve_if_fresh_or_stale(cache_data, staleness):
+                        print(f"Cache HIT for Instagram URL: {source_url[:50]}... (normalized: {normalized_url[:50]}...)")
+                        return cache_data if summary_only else decode_cache_entry(cache_data)
 
+            self._record_filter_false_positive()
             print(f"Instagram cache MISS for URL: {source_url} (normalized: {normalized_url})")
             return None
 
@@ -109,32 +270,40 @@ class SupabaseManager:
 
         try:
             # Try to find by URL first (fastest) - must match country
-            if image_url:
+            # Rows written before image_url_key existed only match on the raw URL
+            url_key = canonicalize_url(image_url)
+            if image_url and self._filter_might_contain([f'image_url:{country}:{url_key}', f'image_url:{country}:{image_url}']):
                 response = self.client.table('image_cache')\
                     .select('*')\
-                    .eq('image_url', image_url)\
+                    .or_(f'image_url_key.eq.{_quote_filter_value(url_key)},image_url.eq.{_quote_filter_value(image_url)}')\
                     .eq('country', country)\
-                    .gt('expires_at', datetime.now().isoformat())\
+                    .gt('expires_at', self._servable_expiry_cutoff())\
+                    .order('expires_at', desc=True)\
                     .limit(1)\
                     .execute()
 
-                if response.data and len(response.data) > 0:
+                if response.data and self._serve_if_fresh_or_stale(response.data[0]):
                     print(f"Cache HIT for URL in {country}: {image_url[:50]}...")
-                    return response.data[0]
+                    return decode_cache_entry(response.data[0])
+
+                self._record_filter_false_positive()
 
             # Try by hash if URL miss - must match country
-            if image_hash:
+            if image_hash and self._filter_might_contain([f'image_hash:{country}:{image_hash}']):
                 response = self.client.table('image_cache')\
                     .select('*')\
                     .eq('image_hash', image_hash)\
                     .eq('country', country)\
-                    .gt('expires_at', datetime.now().isoformat())\
+                    .gt('expires_at', self._servable_expiry_cutoff())\
+                    .order('expires_at', desc=True)\
                     .limit(1)\
                     .execute()
 
-                if response.data and len(response.data) > 0:
+                if response.data and self._serve_if_fresh_or_stale(response.data[0]):
                     print(f"Cache HIT for hash in {country}: {image_hash[:16]}...")
-                    return response.data[0]
+                    return decode_cache_entry(response.data[0])
+
+                self._record_filter_false_positive()
 
             print(f"Cache MISS for image in {country}")
             return None
@@ -143,6 +312,27 @@ class SupabaseManager:
             print(f"Cache check error: {e}")
             return None
 
+    def get_cache_entry(self, cache_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a full cache entry (including result payloads) by ID"""
+        if not self.enabled:
+            return None
+
+        try:
+            response = self.client.table('image_cache')\
+                .select('*')\
+                .eq('id', cache_id)\
+                .limit(1)\
+                .execute()
+
+            if response.data and len(response.data) > 0:
+                return decode_cache_entry(response.data[0])
+
+            return None
+
+        except Exception as e:
+            print(f"Get cache entry error: {e}")
+            return None
+
     def store_cache(
         self,
         image_url: Optional[str],
@@ -151,7 +341,8 @@ class SupabaseManager:
         detected_garments: List[Dict],
         search_results: List[Dict],
         country: str = 'US',
-        expires_in_days: int = 30
+        expires_in_days: int = 30,
+        source_url: Optional[str] = None
     ) -> Optional[str]:
         """
         Store analysis results in cache for a specific country.
@@ -165,24 +356,15 @@ class SupabaseManager:
             search_results: List of search results
             country: Country code (e.g., 'US', 'GB', 'FR') - results are country-specific
             expires_in_days: Number of days before cache expires
+            source_url: Instagram/source URL the image came from; check_cache_by_source will find this entry
         """
         if not self.enabled:
             return None
 
         try:
-            expires_at = datetime.now() + timedelta(days=expires_in_days)
-
-            cache_entry = {
-                'image_url': image_url,
-                'image_hash': image_hash,
-                'cloudinary_url': cloudinary_url,
-                'detected_garments': detected_garments,
-                'search_results': search_results,
-                'total_results': len(search_results),
-                'country': country,
-                'expires_at': expires_at.isoformat(),
-                'cache_hits': 0
-            }
+            cache_entry = self._cache_entry(
+                image_url, image_hash, cloudinary_url, detected_garments, search_results, country, expires_in_days
+            )
 
             response = self.client.table('image_cache')\
                 .insert(cache_entry)\
@@ -190,6 +372,7 @@ class SupabaseManager:
 
             if response.data:
                 cache_id = response.data[0]['id']
+                self._cache_entry_stored(cache_entry, source_url, cache_id)
                 print(f"Stored in cache for {country}: {cache_id}")
                 return cache_id
 
@@ -199,15 +382,267 @@ class SupabaseManager:
             print(f"Cache store error: {e}")
             return None
 
+    def _cache_entry(
+        self,
+        image_url: Optional[str],
+        image_hash: str,
+        cloudinary_url: str,
+        detected_garments: List[Dict],
+        search_results: List[Dict],
+        country: str,
+        expires_in_days: int
+    ) -> Dict[str, Any]:
+        expires_at = datetime.now() + timedelta(days=expires_in_days)
+
+        cache_entry = {
+            'image_url': image_url,
+            'image_url_key': canonicalize_url(image_url),
+            'image_hash': image_hash,
+            'cloudinary_url': cloudinary_url,
+            'detected_garments': detected_garments,
+            'search_results': search_results,
+            'total_results': len(search_results),
+            'country': country,
+            'expires_at': expires_at.isoformat(),
+            'cache_hits': 0
+        }
+
+        cache_entry.update(self._payload_fields(detected_garments, search_results))
+        return cache_entry
+
+    def _cache_entry_stored(self, cache_entry: Dict[str, Any], source_url: Optional[str], cache_id: str):
+        """Make a newly written image_cache row findable through the key filter and its source URL"""
+        country = cache_entry['country']
+        if cache_entry['image_url']:
+            self._filter_add(f"image_url:{country}:{cache_entry['image_url_key']}")
+        self._filter_add(f"image_hash:{country}:{cache_entry['image_hash']}")
+        if source_url:
+            self._record_cache_source(source_url, cache_id)
+
+    def _record_cache_source(self, source_url: str, cache_id: str):
+        """Point the source URL's canonical key at cache_id; the latest write wins"""
+        source_url_key = canonicalize_url(source_url)
+        try:
+            self.client.table('image_cache_sources')\
+                .upsert({
+                    'source_url_key': source_url_key,
+                    'image_cache_id': cache_id,
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                }, on_conflict='source_url_key')\
+                .execute()
+            self._filter_add(f'source:{source_url_key}')
+        except Exception as e:
+            print(f"Cache source mapping error: {e}")
+
+    def _payload_fields(self, detected_garments: List[Dict], search_results: List[Dict]) -> Dict[str, Any]:
+        """Result payload columns, optionally as one compressed blob"""
+        payload_format, payload = encode_payload({
+            'detected_garments': detected_garments,
+            'search_results': search_results
+        })
+        if payload_format == FORMAT_RAW:
+            return {'detected_garments': detected_garments, 'search_results': search_results}
+        return {
+            'detected_garments': [],
+            'search_results': [],
+            'payload_format': payload_format,
+            'payload': payload,
+            'summary_title': summary_title(search_results)
+        }
+
+    # ============================================
+    # STALE-WHILE-REVALIDATE / REFRESH-AHEAD
+    # ============================================
+
+    def set_stale_handler(self, handler: Optional[Callable[[Dict[str, Any]], None]]):
+        """
+        Register the callback that revalidates an expired entry in the background.
+        While one is set and CACHE_STALE_MAX_SECONDS > 0, entries up to that many seconds
+        past expires_at are returned (with 'stale': True) instead of being treated as misses.
+        """
+        self._stale_handler = handler
+
+    def start_cache_refresher(self, revalidate: Revalidate) -> bool:
+        """
+        Start refresh-ahead and stale serving when CACHE_REFRESH_ENABLED is set.
+        revalidate re-runs the identify pipeline for an image_cache row (see cache_refresher.py).
+        Returns True if a refresher is running.
+        """
+        if not CACHE_REFRESH_ENABLED:
+            return False
+
+        with self._connect_lock:
+            if SupabaseManager._cache_refresher is None:
+                SupabaseManager._cache_refresher = CacheRefresher(self, revalidate)
+                SupabaseManager._cache_refresher.start()
+        return True
+
+    def stop_cache_refresher(self):
+        """Stop serving stale entries and end the refresh-ahead scans"""
+        with self._connect_lock:
+            refresher, SupabaseManager._cache_refresher = SupabaseManager._cache_refresher, None
+        if refresher is not None:
+            refresher.stop()
+
+    def cache_refresher_stats(self) -> Optional[Dict[str, Any]]:
+        """Scheduled/refreshed/failed counters of the cache refresher, None when it is not running"""
+        if self._cache_refresher is None:
+            return None
+        return self._cache_refresher.stats()
+
+    def _stale_serving_enabled(self) -> bool:
+        return self._stale_handler is not None and CACHE_STALE_MAX_SECONDS > 0
+
+    def _sweep_grace_seconds(self) -> int:
+        """Stale window the sweeper must leave alone; the sweeper process has no handler of its own"""
+        if CACHE_REFRESH_ENABLED or self._stale_serving_enabled():
+            return CACHE_STALE_MAX_SECONDS
+        return 0
+
+    def _servable_expiry_cutoff(self) -> str:
+        """Oldest expires_at a lookup may still return"""
+        grace = CACHE_STALE_MAX_SECONDS if self._stale_serving_enabled() else 0
+        return (datetime.now() - timedelta(seconds=grace)).isoformat()
+
+    def _staleness(self, entry: Dict[str, Any]) -> Optional[float]:
+        """Seconds since the entry expired (negative while fresh), or None without expires_at"""
+        expires_at_str = entry.get('expires_at')
+        if not expires_at_str:
+            return None
+        expires_at = datetime.fromisoformat(expires_at_str.replace('Z', '+00:00'))
+        return (datetime.now(expires_at.tzinfo) - expires_at).total_seconds()
+
+    def _serve_if_fresh_or_stale(self, entry: Dict[str, Any], staleness: Optional[float] = None) -> bool:
+        """True if the entry may be returned; stale entries are handed to the revalidation handler"""
+        if staleness is None:
+            staleness = self._staleness(entry)
+        if staleness is None or staleness < 0:
+            return True
+        if not self._stale_serving_enabled():
+            if CACHE_STALE_MAX_SECONDS > 0 and not SupabaseManager._warned_no_stale_handler:
+                SupabaseManager._warned_no_stale_handler = True
+                print("CACHE_STALE_MAX_SECONDS is set but no stale handler is registered "
+                      "(set CACHE_REFRESH_ENABLED and call start_cache_refresher); "
+                      "expired entries are treated as misses")
+            return False
+        if staleness > CACHE_STALE_MAX_SECONDS:
+            return False
+
+        entry['stale'] = True
+        try:
+            self._stale_handler(dict(entry))
+        except Exception as e:
+            print(f"Stale revalidation scheduling error: {e}")
+        print(f"Serving stale cache entry {entry.get('id')} ({staleness:.0f}s past expiry)")
+        return True
+
+    def find_refresh_candidates(self, expiring_within: float, min_hits: int, limit: int) -> List[Dict[str, Any]]:
+        """Popular entries (cache_hits >= min_hits) expiring within the next expiring_within seconds"""
+        if not self.enabled:
+            return []
+
+        now = datetime.now()
+        response = self.client.table('image_cache')\
+            .select(IMAGE_CACHE_SUMMARY_COLUMNS)\
+            .gt('expires_at', now.isoformat())\
+            .lte('expires_at', (now + timedelta(seconds=expiring_within)).isoformat())\
+            .gte('cache_hits', min_hits)\
+            .order('cache_hits', desc=True)\
+            .limit(limit)\
+            .execute()
+
+        return response.data or []
+
+    def refresh_cache_entry(
+        self,
+        cache_id: str,
+        detected_garments: List[Dict],
+        search_results: List[Dict],
+        expires_in_days: int = 30
+    ) -> bool:
+        """Replace an entry's results in place and push its expiry out; keeps id, hits and history links"""
+        if not self.enabled:
+            return False
+
+        update = {
+            'total_results': len(search_results),
+            'expires_at': (datetime.now() + timedelta(days=expires_in_days)).isoformat(),
+            'payload_format': FORMAT_RAW,
+            'payload': None,
+            'summary_title': None,
+        }
+        update.update(self._payload_fields(detected_garments, search_results))
+
+        response = self.client.table('image_cache')\
+            .update(update)\
+            .eq('id', cache_id)\
+            .execute()
+
+        return bool(response.data)
+
     def increment_cache_hit(self, cache_id: str):
-        """Increment cache hit counter"""
+        """Increment cache hit counter (buffered, written in bulk by flush_counters)"""
+        if not self.enabled:
+            return
+
+        self._cache_hit_counter.increment(cache_id)
+
+    def _flush_cache_hits(self, counts: Dict[str, int]):
+        """Write aggregated cache hit increments in one round trip"""
         if not self.enabled:
             return
 
+        cache_ids = list(counts.keys())
         try:
-            self.client.rpc('increment_cache_hit', {'cache_id': cache_id}).execute()
+            self.client.rpc('increment_cache_hits_bulk', {
+                'cache_ids': cache_ids,
+                'increments': [counts[cache_id] for cache_id in cache_ids]
+            }).execute()
         except Exception as e:
-            print(f"Cache hit increment error: {e}")
+            # Fallback to the per-entry function if the bulk one doesn't exist yet
+            print(f"Bulk cache hit increment error, falling back to single increments: {e}")
+            remaining = dict(counts)
+            try:
+                for cache_id in cache_ids:
+                    for _ in range(counts[cache_id]):
+                        self.client.rpc('increment_cache_hit', {'cache_id': cache_id}).execute()
+                        remaining[cache_id] -= 1
+                        if not remaining[cache_id]:
+                            del remaining[cache_id]
+            except Exception as fallback_error:
+                raise PartialFlush(remaining, str(fallback_error)) from fallback_error
+
+    def flush_counters(self):
+        """Write all buffered hit/access counters now (called on graceful shutdown)"""
+        for counter in (self._cache_hit_counter, self._instagram_access_counter):
+            if counter is not None:
+                counter.flush()
+
+    def counter_stats(self) -> List[Dict[str, Any]]:
+        """Pending and flushed totals for the hit/access counter buffers"""
+        return [
+            counter.stats()
+            for counter in (self._cache_hit_counter, self._instagram_access_counter)
+            if counter is not None
+        ]
+
+    def sweep_expired_cache_batch(self, batch_size: int, archive: bool = False) -> int:
+        """
+        Delete (or archive) up to batch_size expired image_cache rows not referenced by search history.
+        Rows still within the stale-serving window (CACHE_STALE_MAX_SECONDS) are kept while
+        CACHE_REFRESH_ENABLED is set or a stale handler is registered.
+        Returns the number of rows removed. Errors are raised to the caller (see cache_sweeper.py).
+        """
+        if not self.enabled:
+            return 0
+
+        response = self.client.rpc('sweep_expired_image_cache', {
+            'p_batch_size': batch_size,
+            'p_archive': archive,
+            'p_grace_seconds': self._sweep_grace_seconds()
+        }).execute()
+
+        return int(response.data or 0)
 
     # ============================================
     # INSTAGRAM URL CACHE OPERATIONS
@@ -222,13 +657,21 @@ class SupabaseManager:
             return None
 
         try:
-            # Normalize the URL (remove query params like ?igsh=...)
+            # Canonical key first, plus the raw URL and the legacy normalized form of older rows
+            lookup_urls = _url_lookup_keys(instagram_url)
             normalized_url = self._normalize_instagram_url(instagram_url)
 
-            # Check both original and normalized URLs
+            if not self._filter_might_contain([f'instagram:{url}' for url in lookup_urls]):
+                print(f"Instagram cache MISS (filtered) for URL: {normalized_url}")
+                return None
+
+            query_filter = ','.join(
+                [f'instagram_url.eq.{_quote_filter_value(instagram_url)}'] +
+                [f'normalized_url.eq.{_quote_filter_value(url)}' for url in lookup_urls[1:]]
+            )
             response = self.client.table('instagram_url_cache')\
                 .select('image_url, id')\
-                .or_(f'instagram_url.eq.{instagram_url},normalized_url.eq.{normalized_url}')\
+                .or_(query_filter)\
                 .limit(1)\
                 .execute()
 
@@ -242,6 +685,7 @@ class SupabaseManager:
 
                 return image_url
 
+            self._record_filter_false_positive()
             print(f"Instagram cache MISS for URL: {normalized_url}")
             return None
 
@@ -264,6 +708,8 @@ class SupabaseManager:
 
         try:
             normalized_url = self._normalize_instagram_url(instagram_url)
+            self._filter_add(f'instagram:{instagram_url}')
+            self._filter_add(f'instagram:{normalized_url}')
 
             cache_entry = {
                 'instagram_url': instagram_url,
@@ -321,34 +767,109 @@ class SupabaseManager:
             return None
 
     def _normalize_instagram_url(self, url: str) -> str:
-        """Normalize Instagram URL by removing query parameters"""
-        try:
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            # Keep only scheme, netloc, and path
-            return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-        except Exception:
-            return url
+        """Canonical cache key for a source URL (see url_canonicalizer)"""
+        return canonicalize_url(url)
 
     def _update_instagram_cache_access(self, cache_id: int):
-        """Update last_accessed_at timestamp for Instagram cache entry"""
+        """Update last_accessed_at timestamp for Instagram cache entry (buffered)"""
         if not self.enabled:
             return
 
+        self._instagram_access_counter.increment(cache_id)
+
+    def _flush_instagram_cache_access(self, counts: Dict[int, int]):
+        """Write aggregated Instagram cache access increments in one round trip"""
+        if not self.enabled:
+            return
+
+        entry_ids = list(counts.keys())
         try:
             # Use PostgreSQL function to increment atomically
-            self.client.rpc('increment_instagram_cache_access', {
-                'cache_entry_id': cache_id
+            self.client.rpc('increment_instagram_cache_access_bulk', {
+                'entry_ids': entry_ids,
+                'increments': [counts[entry_id] for entry_id in entry_ids]
             }).execute()
         except Exception as e:
-            # Fallback to manual update if function doesn't exist
+            # Fallback to plain touches if the bulk function doesn't exist yet: the access
+            # trigger bumps access_count by one per updated row, so touch each row once per
+            # pending access, batching every row that still has accesses left
+            print(f"Bulk Instagram cache access update error, falling back to touches: {e}")
+            remaining = dict(counts)
             try:
-                self.client.table('instagram_url_cache')\
-                    .update({'last_accessed_at': datetime.now().isoformat()})\
-                    .eq('id', cache_id)\
-                    .execute()
+                while remaining:
+                    touched = list(remaining.keys())
+                    self.client.table('instagram_url_cache')\
+                        .update({'last_accessed_at': datetime.now().isoformat()})\
+                        .in_('id', touched)\
+                        .execute()
+                    for entry_id in touched:
+                        remaining[entry_id] -= 1
+                        if not remaining[entry_id]:
+                            del remaining[entry_id]
             except Exception as fallback_error:
-                print(f"Instagram cache access update error: {e}, fallback error: {fallback_error}")
+                raise PartialFlush(remaining, str(fallback_error)) from fallback_error
+
+    # ============================================
+    # NEGATIVE-LOOKUP FILTER
+    # ============================================
+
+    def _filter_might_contain(self, keys: List[str]) -> bool:
+        """False only when the key filter is sure none of the keys are cached"""
+        if self._key_filter is None:
+            return True
+        return self._key_filter.might_contain(*keys)
+
+    def _filter_add(self, key: str):
+        if self._key_filter is not None:
+            self._key_filter.add(key)
+
+    def _record_filter_false_positive(self):
+        if self._key_filter is not None and self._key_filter.ready:
+            self._key_filter.record_false_positive()
+
+    def _load_cache_keys(self):
+        """Yield every key the negative-lookup filter covers, paging each table by id"""
+        # Same cutoff as lookups, so expired entries that may still be served stale stay covered
+        cutoff = self._servable_expiry_cutoff()
+
+        for row in self._iter_table_rows('image_cache', 'id, image_url, image_url_key, image_hash, country',
+                                         lambda query: query.gt('expires_at', cutoff)):
+            if row.get('image_url'):
+                yield f"image_url:{row.get('country')}:{row['image_url']}"
+                yield f"image_url:{row.get('country')}:{row.get('image_url_key') or canonicalize_url(row['image_url'])}"
+            if row.get('image_hash'):
+                yield f"image_hash:{row.get('country')}:{row['image_hash']}"
+
+        for row in self._iter_table_rows('image_cache_sources', 'id, source_url_key'):
+            yield f"source:{row['source_url_key']}"
+
+        for row in self._iter_table_rows('instagram_url_cache', 'id, instagram_url, normalized_url'):
+            yield f"instagram:{row['instagram_url']}"
+            yield f"instagram:{row['normalized_url']}"
+
+    def _iter_table_rows(self, table: str, columns: str, apply_filter=None):
+        """Page through a table in id order using keyset pagination"""
+        last_id = None
+        while True:
+            query = self.client.table(table).select(columns)
+            if apply_filter is not None:
+                query = apply_filter(query)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+
+            response = query.order('id').limit(CACHE_FILTER_PAGE_SIZE).execute()
+            rows = response.data or []
+            yield from rows
+
+            if len(rows) < CACHE_FILTER_PAGE_SIZE:
+                return
+            last_id = rows[-1]['id']
+
+    def cache_filter_stats(self) -> Optional[Dict[str, Any]]:
+        """Size, false-positive rate and skip counts of the negative-lookup filter"""
+        if self._key_filter is None:
+            return None
+        return self._key_filter.stats()
 
     # ============================================
     # USER SEARCH HISTORY
@@ -371,7 +892,7 @@ class SupabaseManager:
             return None
 
         try:
-            # Normalize Instagram URLs to remove query parameters
+            # Store the canonical key so equivalent URLs find this search
             normalized_source_url = self._normalize_instagram_url(source_url) if source_url else None
 
             search_entry = {
@@ -388,6 +909,8 @@ class SupabaseManager:
 
             if response.data:
                 search_id = response.data[0]['id']
+                if normalized_source_url:
+                    self._record_cache_source(normalized_source_url, image_cache_id)
                 print(f"Created user search: {search_id}")
                 return search_id
 
@@ -433,6 +956,8 @@ class SupabaseManager:
                     .eq('id', search_id)\
                     .execute()
                 print(f"Updated existing user search: {search_id} with timestamp {utc_now}")
+                if source_url:
+                    self._record_cache_source(source_url, image_cache_id)
                 return search_id
             else:
                 # Create new entry
@@ -466,12 +991,156 @@ class SupabaseManager:
                 .range(offset, offset + limit - 1)\
                 .execute()
 
-            return response.data or []
+            return self._decode_history_rows(response.data or [])
 
         except Exception as e:
             print(f"Get user searches error: {e}")
             return []
 
+    def _decode_history_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill the result fields of history rows whose cache entry is stored compressed"""
+        # v_user_recent_searches does not expose the payload blob. Compressed entries keep empty
+        # result columns, so rows that already have results never need the extra fetch.
+        missing = [
+            row['image_cache_id'] for row in rows
+            if 'payload' not in row and row.get('image_cache_id') and not row.get('search_results')
+        ]
+        if missing:
+            response = self.client.table('image_cache')\
+                .select('id, payload_format, payload')\
+                .in_('id', list(dict.fromkeys(missing)))\
+                .neq('payload_format', FORMAT_RAW)\
+                .execute()
+            blobs = {entry['id']: entry for entry in response.data or []}
+            for row in rows:
+                blob = blobs.get(row.get('image_cache_id'))
+                if blob is not None:
+                    row['payload_format'] = blob['payload_format']
+                    row['payload'] = blob['payload']
+
+        decoded = []
+        for row in rows:
+            try:
+                decoded.append(decode_cache_entry(row))
+            except PayloadDecodeError as e:
+                # One undecodable entry must not blank the page; list it without results
+                print(f"History payload decode error for cache {row.get('image_cache_id')}: {e}")
+                row.pop('payload', None)
+                row['detected_garments'] = []
+                row['search_results'] = []
+                decoded.append(row)
+        return decoded
+
+    def get_user_searches_page(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get a page of the user's search history using keyset pagination.
+        Returns {'items': [...], 'next_cursor': str or None}.
+        Pass next_cursor back to fetch the following page; None means no more rows.
+        Raises ValueError for a cursor that did not come from a previous page.
+        """
+        if not self.enabled:
+            return {'items': [], 'next_cursor': None}
+        after = _decode_cursor(cursor) if cursor else None
+
+        try:
+            query = self.client.from_('v_user_recent_searches')\
+                .select('*')\
+                .eq('user_id', user_id)
+            page = self._fetch_keyset_page(query, limit, after)
+            page['items'] = self._decode_history_rows(page['items'])
+            return page
+
+        except Exception as e:
+            print(f"Get user searches page error: {e}")
+            return {'items': [], 'next_cursor': None}
+
+    def get_user_search_summaries(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get a page of lightweight history rows for list screens (thumbnail, title, counts).
+        Result payloads are left out; use get_user_search_detail to load one entry.
+        Returns {'items': [...], 'next_cursor': str or None}.
+        Raises ValueError for a cursor that did not come from a previous page.
+        """
+        if not self.enabled:
+            return {'items': [], 'next_cursor': None}
+        after = _decode_cursor(cursor) if cursor else None
+
+        try:
+            query = self.client.from_('v_user_search_summaries')\
+                .select(USER_SEARCH_SUMMARY_COLUMNS)\
+                .eq('user_id', user_id)
+            return self._fetch_keyset_page(query, limit, after)
+
+        except Exception as e:
+            print(f"Get user search summaries error: {e}")
+            return {'items': [], 'next_cursor': None}
+
+    def get_user_search_detail(self, user_id: str, search_id: str) -> Optional[Dict[str, Any]]:
+        """Get one history entry with its full cache data under 'image_cache'"""
+        if not self.enabled:
+            return None
+
+        try:
+            response = self.client.table('user_searches')\
+                .select('*, image_cache(*)')\
+                .eq('user_id', user_id)\
+                .eq('id', search_id)\
+                .limit(1)\
+                .execute()
+
+            if response.data and len(response.data) > 0:
+                search = response.data[0]
+                search['image_cache'] = decode_cache_entry(search.get('image_cache'))
+                return search
+
+            return None
+
+        except Exception as e:
+            print(f"Get user search detail error: {e}")
+            return None
+
+    def _fetch_keyset_page(
+        self,
+        query,
+        limit: int,
+        after: Optional[tuple]
+    ) -> Dict[str, Any]:
+        """
+        Apply (created_at, id) keyset ordering to a query and fetch one page.
+        after is the decoded cursor: only rows before it are read.
+        Reads one extra row to know whether a next page exists.
+        """
+        if after:
+            created_at, row_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+            )
+
+        response = query\
+            .order('created_at', desc=True)\
+            .order('id', desc=True)\
+            .limit(limit + 1)\
+            .execute()
+
+        rows = response.data or []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1])
+
+        return {'items': rows, 'next_cursor': next_cursor}
+
     # ============================================
     # FAVORITES - Using existing 'favorites' table
     # ============================================
@@ -490,40 +1159,81 @@ class SupabaseManager:
         """
         Add a product to favorites table.
         user_id must be a valid auth.users.id
+        Returns the favorite ID, or None if already favorited or on error.
         """
-        if not self.enabled:
-            return None
+        result = self.add_favorites(user_id, [{
+            'product_id': product_id,
+            'product_name': product_name,
+            'brand': brand,
+            'price': price,
+            'image_url': image_url,
+            'purchase_url': purchase_url,
+            'category': category
+        }])
+
+        item = result.get(product_id, {})
+        if item.get('status') == 'duplicate':
+            print(f"Product already favorited by user")
+        return item.get('favorite_id')
+
+    def add_favorites(
+        self,
+        user_id: str,
+        favorites: List[Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Add many products to favorites, chunked and sent concurrently.
+        Each favorite needs product_id, product_name, brand, price, image_url,
+        purchase_url and category.
 
-        try:
-            favorite_entry = {
+        Returns {product_id: {'status': 'added' | 'duplicate' | 'error', 'favorite_id': str or None}}.
+        Conflicts on (user_id, product_id) are skipped by the database and reported as 'duplicate'.
+        """
+        if not self.enabled or not favorites:
+            return {}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        entries = []
+        for favorite in favorites:
+            product_id = favorite['product_id']
+            if product_id in results:
+                continue
+            results[product_id] = {'status': 'duplicate', 'favorite_id': None}
+            entries.append({
                 'user_id': user_id,
                 'product_id': product_id,
-                'product_name': product_name,
-                'brand': brand,
-                'price': price,
-                'image_url': image_url,
-                'purchase_url': purchase_url,
-                'category': category
-            }
-
+                'product_name': favorite.get('product_name'),
+                'brand': favorite.get('brand'),
+                'price': favorite.get('price'),
+                'image_url': favorite.get('image_url'),
+                'purchase_url': favorite.get('purchase_url'),
+                'category': favorite.get('category')
+            })
+
+        def insert_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            # ignore_duplicates returns only the rows that were actually inserted
             response = self.client.table('user_favorites')\
-                .insert(favorite_entry)\
+                .upsert(chunk, on_conflict='user_id,product_id', ignore_duplicates=True)\
                 .execute()
+            return response.data or []
 
-            if response.data:
-                favorite_id = response.data[0]['id']
-                print(f"Added favorite: {favorite_id}")
-                return favorite_id
+        for chunk, inserted, error in self._run_chunked(entries, insert_chunk):
+            if error is not None:
+                print(f"Add favorites error for {len(chunk)} items: {error}")
+                for entry in chunk:
+                    results[entry['product_id']] = {'status': 'error', 'favorite_id': None}
+                # The chunk may have been partly written
+                self._invalidate_favorites(user_id)
+                continue
 
-            return None
+            for row in inserted:
+                results[row['product_id']] = {'status': 'added', 'favorite_id': row['id']}
+            if self._favorites_cache is not None:
+                self._favorites_cache.add(user_id, inserted)
 
-        except Exception as e:
-            # Handle unique constraint violation (already favorited)
-            if 'duplicate key' in str(e):
-                print(f"Product already favorited by user")
-                return None
-            print(f"Add favorite error: {e}")
-            return None
+        added = sum(1 for item in results.values() if item['status'] == 'added')
+        print(f"Added {added}/{len(results)} favorites")
+        return results
 
     def get_existing_favorite(
         self,
@@ -537,6 +1247,11 @@ class SupabaseManager:
         if not self.enabled:
             return None
 
+        favorites = self._cached_favorites(user_id)
+        if favorites is not None:
+            row = favorites.get(product_id)
+            return dict(row) if row is not None else None
+
         try:
             response = self.client.table('user_favorites')\
                 .select('*')\
@@ -566,12 +1281,48 @@ class SupabaseManager:
                 .eq('user_id', user_id)\
                 .execute()
 
+            if self._favorites_cache is not None:
+                self._favorites_cache.remove_ids(user_id, [favorite_id])
             return True
 
         except Exception as e:
             print(f"Remove favorite error: {e}")
+            self._invalidate_favorites(user_id)
             return False
 
+    def remove_favorites(self, user_id: str, favorite_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Remove many favorites, chunked and sent concurrently.
+        Returns {favorite_id: {'status': 'removed' | 'not_found' | 'error'}}; every id of a
+        chunk that failed is reported as 'error' rather than as not found.
+        """
+        if not self.enabled or not favorite_ids:
+            return {}
+
+        results = {favorite_id: {'status': 'not_found'} for favorite_id in favorite_ids}
+
+        def delete_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+            response = self.client.table('user_favorites')\
+                .delete()\
+                .eq('user_id', user_id)\
+                .in_('id', chunk)\
+                .execute()
+            return response.data or []
+
+        for chunk, deleted, error in self._run_chunked(list(results), delete_chunk):
+            if error is not None:
+                print(f"Remove favorites error for {len(chunk)} items: {error}")
+                for favorite_id in chunk:
+                    results[favorite_id] = {'status': 'error'}
+                self._invalidate_favorites(user_id)
+                continue
+            for row in deleted:
+                results[row['id']] = {'status': 'removed'}
+            if self._favorites_cache is not None:
+                self._favorites_cache.remove_ids(user_id, [row['id'] for row in deleted])
+
+        return results
+
     def get_user_favorites(
         self,
         user_id: str,
@@ -596,6 +1347,31 @@ class SupabaseManager:
             print(f"Get user favorites error: {e}")
             return []
 
+    def get_user_favorites_page(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get a page of the user's favorites using keyset pagination.
+        Returns {'items': [...], 'next_cursor': str or None}.
+        Raises ValueError for a cursor that did not come from a previous page.
+        """
+        if not self.enabled:
+            return {'items': [], 'next_cursor': None}
+        after = _decode_cursor(cursor) if cursor else None
+
+        try:
+            query = self.client.table('user_favorites')\
+                .select('*')\
+                .eq('user_id', user_id)
+            return self._fetch_keyset_page(query, limit, after)
+
+        except Exception as e:
+            print(f"Get user favorites page error: {e}")
+            return {'items': [], 'next_cursor': None}
+
     def check_favorited_products(
         self,
         user_id: str,
@@ -604,25 +1380,94 @@ class SupabaseManager:
         """
         Check which product IDs from the list are already favorited by this user.
         Returns a list of product_ids that exist in user_favorites.
+        Large lists are split into chunks that are queried concurrently. If any chunk
+        fails the whole check returns [], as a partial answer would silently mark that
+        chunk's products as not favorited.
         """
         if not self.enabled or not product_ids:
             return []
 
-        try:
+        favorites = self._cached_favorites(user_id)
+        if favorites is not None:
+            return [product_id for product_id in dict.fromkeys(product_ids) if product_id in favorites]
+
+        def check_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
             response = self.client.table('user_favorites')\
                 .select('product_id')\
                 .eq('user_id', user_id)\
-                .in_('product_id', product_ids)\
+                .in_('product_id', chunk)\
                 .execute()
+            return response.data or []
 
-            if response.data:
-                return [fav['product_id'] for fav in response.data]
+        favorited = set()
+        for chunk, rows, error in self._run_chunked(list(dict.fromkeys(product_ids)), check_chunk):
+            if error is not None:
+                print(f"Check favorited products error: {error}")
+                return []
+            favorited.update(fav['product_id'] for fav in rows)
 
-            return []
+        return [product_id for product_id in dict.fromkeys(product_ids) if product_id in favorited]
 
+    def _cached_favorites(self, user_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        The user's favorites by product_id from the favorites cache, loading them on a miss.
+        None when the cache is disabled, the user has too many favorites to cache, or the load fails.
+        """
+        cache = self._favorites_cache
+        if cache is None:
+            return None
+
+        favorites = cache.get(user_id)
+        if favorites is not None:
+            return favorites
+        if cache.is_oversized(user_id):
+            return None
+
+        cache.begin_load(user_id)
+        try:
+            rows = []
+            for row in self._iter_table_rows('user_favorites', '*', lambda query: query.eq('user_id', user_id)):
+                rows.append(row)
+                if len(rows) > cache.max_per_user:
+                    break
         except Exception as e:
-            print(f"Check favorited products error: {e}")
-            return []
+            print(f"Load favorites error: {e}")
+            rows = None
+        finally:
+            cached = cache.finish_load(user_id, rows)
+
+        if not cached or rows is None:
+            return None
+        return {row['product_id']: row for row in rows}
+
+    def _invalidate_favorites(self, user_id: str):
+        if self._favorites_cache is not None:
+            self._favorites_cache.invalidate(user_id)
+
+    def favorites_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit rate and size of the per-user favorites cache"""
+        if self._favorites_cache is None:
+            return None
+        return self._favorites_cache.stats()
+
+    def _run_chunked(self, items: List[Any], fn) -> List[tuple]:
+        """
+        Run fn over FAVORITES_CHUNK_SIZE chunks of items concurrently.
+        Returns (chunk, result, error) per chunk, in order; a failed chunk has result None.
+        """
+        chunks = _chunked(items, FAVORITES_CHUNK_SIZE)
+
+        def run(chunk):
+            try:
+                return chunk, fn(chunk), None
+            except Exception as e:
+                return chunk, None, e
+
+        if len(chunks) <= 1:
+            return [run(chunk) for chunk in chunks]
+
+        with ThreadPoolExecutor(max_workers=min(FAVORITES_MAX_CONCURRENCY, len(chunks))) as executor:
+            return list(executor.map(run, chunks))
 
     # ============================================
     # SAVED SEARCHES
@@ -683,5 +1528,174 @@ class SupabaseManager:
             return False
 
 
+    # ============================================
+    # BACKGROUND WRITES
+    # ============================================
+
+    def enqueue_store_cache(
+        self,
+        image_url: Optional[str],
+        image_hash: str,
+        cloudinary_url: str,
+        detected_garments: List[Dict],
+        search_results: List[Dict],
+        country: str = 'US',
+        expires_in_days: int = 30,
+        source_url: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        store_cache without waiting for the database when the write queue is enabled.
+        Returns the cache ID the row will have, so it can be referenced right away
+        (e.g. by enqueue_user_search); None if the write failed inline.
+        """
+        if not self.enabled:
+            return None
+        if self._write_queue is None:
+            return self.store_cache(
+                image_url, image_hash, cloudinary_url, detected_garments, search_results,
+                country, expires_in_days, source_url
+            )
+
+        try:
+            cache_entry = self._cache_entry(
+                image_url, image_hash, cloudinary_url, detected_garments, search_results, country, expires_in_days
+            )
+            cache_entry['id'] = str(uuid.uuid4())
+            self._write_queue.submit(
+                'image_cache',
+                {'entry': cache_entry, 'source_url': source_url},
+                key=f"image_cache:{cache_entry['id']}"
+            )
+            return cache_entry['id']
+        except Exception as e:
+            print(f"Cache store error: {e}")
+            return None
+
+    def enqueue_user_search(
+        self,
+        user_id: str,
+        image_cache_id: str,
+        search_type: str,
+        source_url: Optional[str] = None,
+        source_username: Optional[str] = None
+    ) -> bool:
+        """
+        create_or_update_user_search without waiting for the database when the write queue is enabled.
+        The write is sent after any queued image_cache row it references. Returns False if it failed inline.
+        """
+        if not self.enabled:
+            return False
+        search = {
+            'user_id': user_id,
+            'image_cache_id': image_cache_id,
+            'search_type': search_type,
+            'source_url': source_url,
+            'source_username': source_username
+        }
+        if self._write_queue is None:
+            return self.create_or_update_user_search(**search) is not None
+
+        try:
+            self._write_queue.submit(
+                'user_search',
+                search,
+                key=f'user_search:{user_id}:{image_cache_id}',
+                after_key=f'image_cache:{image_cache_id}'
+            )
+            return True
+        except Exception as e:
+            print(f"User search create/update error: {e}")
+            return False
+
+    def enqueue_instagram_url_cache(
+        self,
+        instagram_url: str,
+        image_url: str,
+        extraction_method: str = 'scrapingbee'
+    ) -> bool:
+        """
+        save_instagram_url_cache without waiting for the database when the write queue is enabled.
+        Returns False if it failed inline.
+        """
+        if not self.enabled:
+            return False
+        if self._write_queue is None:
+            return self.save_instagram_url_cache(instagram_url, image_url, extraction_method) is not None
+
+        try:
+            self._write_queue.submit(
+                'instagram_url_cache',
+                {'instagram_url': instagram_url, 'image_url': image_url, 'extraction_method': extraction_method},
+                key=f'instagram:{self._normalize_instagram_url(instagram_url)}'
+            )
+            return True
+        except Exception as e:
+            print(f"Instagram cache save error: {e}")
+            return False
+
+    def _write_cache_entries(self, writes: List[Dict[str, Any]]):
+        """Insert queued image_cache rows; rows already written by an earlier attempt are skipped"""
+        # PostgREST bulk inserts need every row to have the same columns
+        by_columns: Dict[tuple, List[Dict[str, Any]]] = {}
+        for write in writes:
+            by_columns.setdefault(tuple(sorted(write['entry'])), []).append(write['entry'])
+        for entries in by_columns.values():
+            self.client.table('image_cache')\
+                .upsert(entries, on_conflict='id', ignore_duplicates=True)\
+                .execute()
+
+        for write in writes:
+            self._cache_entry_stored(write['entry'], write['source_url'], write['entry']['id'])
+
+    def _write_user_searches(self, writes: List[Dict[str, Any]]):
+        # Each one is a lookup then an insert or update; re-running one that succeeded only bumps its timestamp
+        for search in writes:
+            if self.create_or_update_user_search(**search) is None:
+                raise RuntimeError(f"user search for cache {search['image_cache_id']} was not written")
+
+    def _write_instagram_url_cache(self, writes: List[Dict[str, Any]]):
+        """Upsert queued Instagram URL cache rows in one round trip"""
+        rows = []
+        for write in writes:
+            normalized_url = self._normalize_instagram_url(write['instagram_url'])
+            rows.append({
+                'instagram_url': write['instagram_url'],
+                'normalized_url': normalized_url,
+                'image_url': write['image_url'],
+                'extraction_method': write['extraction_method'],
+                'access_count': 1
+            })
+
+        try:
+            self.client.table('instagram_url_cache')\
+                .upsert(rows, on_conflict='normalized_url')\
+                .execute()
+        except Exception as e:
+            error_text = str(e)
+            if '42P10' not in error_text and 'no unique or exclusion constraint' not in error_text:
+                raise
+            # No unique index on normalized_url yet: save_instagram_url_cache falls back row by row
+            for write in writes:
+                if self.save_instagram_url_cache(**write) is None:
+                    raise RuntimeError(f"Instagram URL cache for {write['instagram_url']} was not written")
+            return
+
+        for row in rows:
+            self._filter_add(f"instagram:{row['instagram_url']}")
+            self._filter_add(f"instagram:{row['normalized_url']}")
+
+    def flush_writes(self) -> int:
+        """Write everything queued that is due now (called on graceful shutdown)"""
+        if self._write_queue is None:
+            return 0
+        return self._write_queue.flush()
+
+    def write_queue_stats(self) -> Optional[Dict[str, Any]]:
+        """Backlog, lag and retry counters of the background write queue, None when it is disabled"""
+        if self._write_queue is None:
+            return None
+        return self._write_queue.stats()
+
+
 # Singleton instance
 supabase_manager = SupabaseManager()
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from artist_memo import ArtistMarketMemo, artist_key, parse_value_range
+
+
+def result(value_range, kind="original", medium="oil on canvas", artist="Gerhard Richter"):
+    return {
+        "identified_artist": artist,
+        "is_original_or_print": kind,
+        "medium_guess": medium,
+        "estimated_value_range": value_range,
+        "value_reasoning": None,
+    }
+
+
+class ArtistMemoTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.memo = ArtistMarketMemo(os.path.join(self.tmp.name, "memo.sqlite3"), max_per_split=3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parses_normalized_ranges(self):
+        self.assertEqual(parse_value_range("$1.5 million - $2 million"), ("$", 1.5e6, 2e6))
+        self.assertEqual(parse_value_range("5k EUR - 12k EUR"), ("EUR", 5000, 12000))
+        self.assertIsNone(parse_value_range("unknown"))
+        self.assertEqual(artist_key("  Gerhard RICHTER "), artist_key("gerhard richter"))
+        self.assertEqual(artist_key("Frida Kahlo"), artist_key("Frída Kahlo"))
+
+    def test_summary_splits_and_prefers_source_text(self):
+        self.memo.record(result("$1,000,000 - $3,000,000"), source="text")
+        self.memo.record(result("$2,000,000 - $4,000,000"), source="text")
+        self.memo.record(result("$9 - $10"), source="model")
+        self.memo.record(result("$500 - $900", kind="print", medium="offset print"), source="model")
+
+        splits = self.memo.summary("gerhard richter")["splits"]
+
+        self.assertEqual(splits["original/painting"]["value_range"], "$1.5 million - $3.5 million")
+        self.assertEqual(splits["original/painting"]["samples"], 2)
+        self.assertEqual(splits["print/print"]["value_range"], "$500 - $900")
+        self.assertEqual(self.memo.valuation_split(result(None, kind="unknown"))["kind"], "original")
+        # The only print split has a single sample
+        self.assertIsNone(self.memo.valuation_split(result(None, kind="print")))
+        self.assertIsNone(self.memo.valuation_split(result(None, artist="Frida Kahlo")))
+
+    def test_fill_needs_enough_fresh_samples(self):
+        unpriced = result(None)
+        self.memo.record(result("$1,000 - $2,000"), source="text", recorded_at=time.time() - 400 * 86400)
+        self.memo.record(result("$3,000 - $5,000"), source="text")
+        self.assertFalse(self.memo.fill_valuation(unpriced))
+
+        self.memo.record(result("$5,000 - $7,000", medium="acrylic"), source="text")
+        self.assertTrue(self.memo.fill_valuation(unpriced))
+        self.assertEqual(unpriced["estimated_value_range"], "$4,000 - $6,000")
+        self.assertIn("2 recent valuations", unpriced["value_reasoning"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,430 @@
+import importlib
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+
+def import_server():
+    sys.modules.pop("artwork_server", None)
+    return importlib.import_module("artwork_server")
+
+
+class ArtworkServerStartupTest(unittest.TestCase):
+    def test_imports_without_api_keys(self):
+        with patch.dict(os.environ, {}, clear=True), \
+             patch("dotenv.load_dotenv"):
+            server = import_server()
+
+        self.assertIsNone(server._anthropic_client)
+        self.assertNotIn("anthropic", sys.modules.get("artwork_server").__dict__)
+        self.assertGreaterEqual(server.IMPORT_SECONDS, 0)
+
+    def test_ready_waits_for_first_warm_up_without_calling_upstreams(self):
+        server = import_server()
+        anthropic_client = MagicMock()
+        session = MagicMock()
+
+        with patch.dict(os.environ, {"SEARCHAPI_KEY": "key", "ANTHROPIC_API_KEY": "key"}), \
+             patch.object(server, "_get_anthropic_client", return_value=anthropic_client), \
+             patch.object(server, "_get_searchapi_session", return_value=session):
+            cold = TestClient(server.app).get("/ready")
+            with patch.object(server, "WARMUP_TIMEOUT", 0):
+                timed_out = TestClient(server.app).get("/ready")
+
+        self.assertEqual(cold.status_code, 503)
+        self.assertEqual(cold.json()["status"], "warming")
+        self.assertEqual(cold.json()["upstream_warmup"], "pending")
+        # A warm-up that never finishes holds the probe back for WARMUP_TIMEOUT at most
+        self.assertEqual(timed_out.status_code, 200)
+        anthropic_client.models.list.assert_not_called()
+        session.head.assert_not_called()
+
+    def test_failed_upstream_warm_up_is_reported_not_gated_on(self):
+        server = import_server()
+        anthropic_client = MagicMock()
+        anthropic_client.models.list.side_effect = RuntimeError("overloaded")
+
+        with patch.dict(os.environ, {"SEARCHAPI_KEY": "key", "ANTHROPIC_API_KEY": "key"}), \
+             patch.object(server, "_get_anthropic_client", return_value=anthropic_client), \
+             patch.object(server, "_get_searchapi_session", return_value=MagicMock()):
+            server._warm_up()
+            response = TestClient(server.app).get("/ready")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["upstream_warmup"], "failed")
+        self.assertIn("overloaded", response.json()["upstream_error"])
+        # The probe never retries the upstream calls itself
+        anthropic_client.models.list.assert_called_once()
+
+    def test_ready_is_unavailable_without_keys(self):
+        server = import_server()
+
+        with patch.dict(os.environ, {}, clear=True):
+            response = TestClient(server.app).get("/ready")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("SEARCHAPI_KEY", response.json()["error"])
+
+
+VISION_RESULT = {
+    "identified_artist": "Claude Monet",
+    "artwork_title": "Water Lilies",
+    "year_estimate": "1906",
+    "confidence_level": "high",
+    "estimated_value_range": "$30,000,000 - $80,000,000",
+    "artist_confidence": 0.97,
+    "title_confidence": 0.9,
+}
+
+
+class VisionFastPathTest(unittest.TestCase):
+    def setUp(self):
+        self.server = import_server()
+
+    def identify(self, vision_result):
+        server = self.server
+        with patch.object(server, "VISION_FAST_PATH_ENABLED", True), \
+             patch.object(server, "_identify_with_vision", return_value=vision_result), \
+             patch.object(server, "_call_searchapi", return_value="Monet water lilies") as searchapi, \
+             patch.object(server, "_parse_with_claude", return_value={"identified_artist": "Fallback"}):
+            response = TestClient(server.app).post("/identify", json={"image_url": "https://example.com/a.jpg"})
+        return response, searchapi
+
+    def test_confident_vision_result_skips_searchapi(self):
+        response, searchapi = self.identify(VISION_RESULT)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["identified_artist"], "Claude Monet")
+        self.assertNotIn("artist_confidence", response.json())
+        searchapi.assert_not_called()
+        self.assertEqual(self.server._vision_stats.snapshot()["hits"], 1)
+
+    def test_low_confidence_falls_through_to_searchapi(self):
+        response, searchapi = self.identify(dict(VISION_RESULT, title_confidence=0.4))
+
+        self.assertEqual(response.json()["identified_artist"], "Fallback")
+        searchapi.assert_called_once()
+        snapshot = self.server._vision_stats.snapshot()
+        self.assertEqual(snapshot["hits"], 0)
+        self.assertEqual(snapshot["attempts"], 1)
+
+
+STRUCTURED_TEXT = """**Artist:** Vincent van Gogh
+**Title:** The Starry Night
+The Starry Night is an oil on canvas painting by Vincent van Gogh, painted in June 1889.
+Original works by Vincent van Gogh are valued at an estimated $50 million to $100 million."""
+
+
+class RuleBasedExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = import_server()
+
+    def test_extracts_labeled_fields(self):
+        result, confident = self.server._rule_based_extract(STRUCTURED_TEXT)
+
+        self.assertTrue(confident)
+        self.assertEqual(result["identified_artist"], "Vincent van Gogh")
+        self.assertEqual(result["artwork_title"], "The Starry Night")
+        self.assertEqual(result["year_estimate"], "1889")
+        self.assertEqual(result["estimated_value_range"], "$50 million - $100 million")
+        self.assertEqual(result["medium_guess"], "oil on canvas")
+
+    def test_unlabeled_single_mention_is_not_confident(self):
+        _, confident = self.server._rule_based_extract(
+            'Possibly "Harbor at Dusk" by Jane Doe, 1975. Similar works are valued at $200 - $800.'
+        )
+
+        self.assertFalse(confident)
+
+    def test_confident_extraction_skips_claude(self):
+        server = self.server
+        with patch.object(server, "RULE_EXTRACTION_ENABLED", True), \
+             patch.object(server, "_call_searchapi", return_value=STRUCTURED_TEXT), \
+             patch.object(server, "_parse_with_claude") as parse_with_claude:
+            response = TestClient(server.app).post("/identify", json={"image_url": "https://example.com/a.jpg"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["artwork_title"], "The Starry Night")
+        parse_with_claude.assert_not_called()
+        stats = TestClient(server.app).get("/stats").json()
+        self.assertEqual(stats["rule_extraction"]["bypassed"], 1)
+        # A bypass is not a slow-path run for the vision fast path's numbers
+        self.assertEqual(server._vision_stats.slow_path_runs, 0)
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_equivalent_urls_share_a_cached_result_across_instances(self):
+        from local_cache import LocalResultCache
+
+        server = import_server()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.sqlite3")
+            # Two cache instances on one file stand in for two gunicorn workers
+            worker_caches = [LocalResultCache(path), LocalResultCache(path)]
+            with patch.object(server, "RESULT_CACHE_ENABLED", True), \
+                 patch.object(server, "_get_result_cache", side_effect=worker_caches), \
+                 patch.object(server, "_call_searchapi", return_value="text") as call_searchapi, \
+                 patch.object(server, "_parse_with_claude", return_value=dict(VISION_RESULT)):
+                client = TestClient(server.app)
+                first = client.post("/identify", json={
+                    "image_url": "https://res.cloudinary.com/demo/image/upload/w_300/v1/art.jpg"
+                })
+                second = client.post("/identify", json={
+                    "image_url": "http://res.cloudinary.com/demo/image/upload/art.jpg"
+                })
+
+        self.assertEqual(first.json(), second.json())
+        call_searchapi.assert_called_once()
+        self.assertEqual(worker_caches[1].stats()["hits"], 1)
+
+    def test_cache_evicts_least_recently_used_and_expired(self):
+        from local_cache import LocalResultCache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = LocalResultCache(os.path.join(tmp, "c.sqlite3"), max_entries=2, evict_every=1000)
+            cache.set("a", 1)
+            cache.set("b", 2)
+            cache.set("gone", 3, ttl=-1)
+            self.assertEqual(cache.get("a"), 1)
+            cache.set("c", 3)
+            cache.evict()
+
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNone(cache.get("gone"))
+            self.assertEqual(cache.get("a"), 1)
+            self.assertEqual(cache.get("c"), 3)
+
+
+class ArtistMemoServerTest(unittest.TestCase):
+    UNPRICED_TEXT = 'Results show "Water Lilies" by Claude Monet, 1906, oil on canvas.'
+    CLAUDE_RESULT = dict(VISION_RESULT, is_original_or_print="original", medium_guess="oil on canvas")
+
+    def setUp(self):
+        from artist_memo import ArtistMarketMemo
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.memo = ArtistMarketMemo(os.path.join(tmp.name, "memo.sqlite3"))
+
+    def identify(self, source_text, *claude_results):
+        server = import_server()
+        with patch.object(server, "ARTIST_MEMO_ENABLED", True), \
+             patch.object(server, "_artist_memo", self.memo), \
+             patch.object(server, "_call_searchapi", return_value=source_text), \
+             patch.object(server, "_get_anthropic_client") as get_client:
+            get_client.return_value.messages.create.side_effect = [
+                MagicMock(content=[MagicMock(text=result if isinstance(result, str) else json.dumps(result))]) for result in claude_results
+            ]
+            response = TestClient(server.app).post("/identify", json={"image_url": "https://example.com/m.jpg"})
+        calls = get_client.return_value.messages.create.call_args_list
+        return response.json(), calls
+
+    def record_monet_sales(self):
+        for value_range in ("$20,000,000 - $40,000,000", "$30,000,000 - $60,000,000"):
+            self.memo.record(dict(self.CLAUDE_RESULT, estimated_value_range=value_range), source="text")
+
+    def test_memo_values_unpriced_text_and_claude_only_identifies(self):
+        self.record_monet_sales()
+        identified = {key: value for key, value in self.CLAUDE_RESULT.items() if key != "estimated_value_range"}
+
+        result, calls = self.identify(self.UNPRICED_TEXT, identified)
+
+        self.assertEqual(len(calls), 1)
+        prompt = calls[0].kwargs["messages"][0]["content"]
+        self.assertNotIn("estimated_value_range", prompt)
+        self.assertEqual(calls[0].kwargs["max_tokens"], 256)
+        self.assertEqual(result["estimated_value_range"], "$25 million - $50 million")
+        # Memo fills are not fed back into the memo
+        self.assertEqual(self.memo.stats()["recorded"], 2)
+
+    def test_unknown_artist_gets_the_full_prompt(self):
+        result, calls = self.identify(self.UNPRICED_TEXT, self.CLAUDE_RESULT)
+
+        self.assertEqual(len(calls), 1)
+        self.assertIn("estimated_value_range", calls[0].kwargs["messages"][0]["content"])
+        self.assertEqual(result["estimated_value_range"], "$30,000,000 - $80,000,000")
+        self.assertEqual(self.memo.stats()["recorded"], 0)
+
+    def test_claude_naming_another_artist_costs_no_second_call(self):
+        self.record_monet_sales()
+        other_artist = dict(self.CLAUDE_RESULT, identified_artist="Édouard Manet", estimated_value_range=None)
+
+        result, calls = self.identify(self.UNPRICED_TEXT, other_artist)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(result["identified_artist"], "Édouard Manet")
+        self.assertIsNone(result["estimated_value_range"])
+
+    def test_strict_retry_keeps_the_identify_only_prompt(self):
+        self.record_monet_sales()
+        identified = {key: value for key, value in self.CLAUDE_RESULT.items() if key != "estimated_value_range"}
+
+        result, calls = self.identify(self.UNPRICED_TEXT, "not json", identified)
+
+        prompts = [call.kwargs["messages"][0]["content"] for call in calls]
+        self.assertEqual(len(prompts), 2)
+        self.assertNotEqual(prompts[0], prompts[1])
+        self.assertIn("Return ONLY a valid JSON object", prompts[1])
+        self.assertNotIn("estimated_value_range", prompts[1])
+        self.assertEqual(result["estimated_value_range"], "$25 million - $50 million")
+
+    def test_priced_text_is_recorded_and_sent_with_the_full_prompt(self):
+        self.record_monet_sales()
+        priced_text = self.UNPRICED_TEXT + " Comparable works sold for $40,000,000 - $70,000,000."
+
+        result, calls = self.identify(priced_text, dict(self.CLAUDE_RESULT, estimated_value_range="$40,000,000 - $70,000,000"))
+
+        self.assertIn("estimated_value_range", calls[0].kwargs["messages"][0]["content"])
+        self.assertEqual(result["estimated_value_range"], "$40,000,000 - $70,000,000")
+        self.assertEqual(self.memo.stats()["recorded"], 3)
+
+
+class SchedulerServerTest(unittest.TestCase):
+    def test_tier_header_needs_token_and_stats_report_waits(self):
+        from priority_scheduler import PriorityClass, PriorityScheduler
+
+        server = import_server()
+        scheduler = PriorityScheduler([PriorityClass("premium", 6, 2), PriorityClass("free", 1, 1)], default_tier="free")
+        with patch.object(server, "SCHEDULER_ENABLED", True), \
+             patch.object(server, "SCHEDULER_TIER_TOKEN", "secret"), \
+             patch.object(server, "_scheduler", scheduler), \
+             patch.object(server, "RULE_EXTRACTION_ENABLED", True), \
+             patch.object(server, "_call_searchapi", return_value=STRUCTURED_TEXT):
+            client = TestClient(server.app)
+            body = {"image_url": "https://example.com/a.jpg"}
+            trusted = client.post("/identify", json=body, headers={"X-User-Tier": "premium", "X-Tier-Token": "secret"})
+            spoofed = client.post("/identify", json=body, headers={"X-User-Tier": "premium", "X-Tier-Token": "guess"})
+            stats = client.get("/stats").json()["scheduler"]
+
+        self.assertEqual(trusted.status_code, 200)
+        self.assertEqual(spoofed.status_code, 200)
+        self.assertEqual(stats["classes"]["premium"]["admitted"], 1)
+        self.assertEqual(stats["classes"]["free"]["admitted"], 1)
+        self.assertIsNotNone(stats["classes"]["premium"]["queue_wait_p95_ms"])
+        self.assertEqual(stats["running"], 0)
+
+    def test_tier_header_is_ignored_without_a_configured_token(self):
+        from priority_scheduler import PriorityClass, PriorityScheduler
+
+        server = import_server()
+        scheduler = PriorityScheduler([PriorityClass("premium", 6, 2), PriorityClass("free", 1, 1)], default_tier="free")
+        with patch.object(server, "SCHEDULER_ENABLED", True), \
+             patch.object(server, "SCHEDULER_TIER_TOKEN", None), \
+             patch.object(server, "_scheduler", scheduler), \
+             patch.object(server, "RULE_EXTRACTION_ENABLED", True), \
+             patch.object(server, "_call_searchapi", return_value=STRUCTURED_TEXT):
+            client = TestClient(server.app)
+            response = client.post("/identify", json={"image_url": "https://example.com/a.jpg"}, headers={"X-User-Tier": "premium"})
+            stats = client.get("/stats").json()["scheduler"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stats["classes"]["premium"]["admitted"], 0)
+        self.assertEqual(stats["classes"]["free"]["admitted"], 1)
+
+
+class ProfilingServerTest(unittest.TestCase):
+    def test_token_header_profiles_only_that_request(self):
+        import time
+        from request_profiler import RequestProfiler
+
+        def slow_search(image_url):
+            time.sleep(0.05)
+            return STRUCTURED_TEXT
+
+        server = import_server()
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RequestProfiler(os.path.join(tmp, "profiles"), token="secret", interval_ms=1)
+            with patch.object(server, "PROFILING_ENABLED", True), \
+                 patch.object(server, "_profiler", profiler), \
+                 patch.object(server, "RULE_EXTRACTION_ENABLED", True), \
+                 patch.object(server, "_call_searchapi", side_effect=slow_search):
+                client = TestClient(server.app)
+                body = {"image_url": "https://example.com/a.jpg"}
+                plain = client.post("/identify", json=body)
+                profiled = client.post("/identify", json=body, headers={"X-Profile-Token": "secret"})
+                files = os.listdir(profiler.directory)
+                with open(os.path.join(profiler.directory, files[0]), encoding="utf-8") as f:
+                    collapsed = f.read()
+
+        self.assertNotIn("X-Profile-Id", plain.headers)
+        self.assertEqual(profiled.status_code, 200)
+        self.assertEqual(files, [name for name in files if name.endswith(f"{profiled.headers['X-Profile-Id']}.collapsed")])
+        self.assertIn("_run_identify_pipeline", collapsed)
+        self.assertIn("slow_search", collapsed)
+
+
+class MultiImageIdentifyTest(unittest.TestCase):
+    def test_photos_are_searched_concurrently_and_parsed_once(self):
+        import threading
+        import time
+
+        import requests
+
+        texts = {
+            "https://example.com/front.jpg": "Water Lilies by Claude Monet\nOil on canvas",
+            "https://example.com/signature.jpg": "Signed Claude Monet 1906\nWater  Lilies by Claude Monet",
+            "https://example.com/label.jpg": None,
+        }
+        barrier = threading.Barrier(3, timeout=2)
+
+        def search(image_url):
+            # Every search must be running at the same time for the barrier to open
+            barrier.wait()
+            time.sleep(0.05)
+            if texts[image_url] is None:
+                raise requests.ConnectionError("label lookup failed")
+            return texts[image_url]
+
+        server = import_server()
+        with patch.object(server, "_call_searchapi", side_effect=search), \
+             patch.object(server, "_parse_with_claude", return_value=dict(VISION_RESULT)) as parse_with_claude:
+            response = TestClient(server.app).post("/identify", json={
+                "image_url": "https://example.com/front.jpg",
+                "image_urls": list(texts)[1:] + ["https://example.com/front.jpg?utm_source=app"],
+            })
+
+        self.assertEqual(response.status_code, 200)
+        parse_with_claude.assert_called_once()
+        self.assertEqual(
+            parse_with_claude.call_args[0][0],
+            "Water Lilies by Claude Monet\nOil on canvas\nSigned Claude Monet 1906",
+        )
+
+    def test_too_many_photos_is_rejected(self):
+        server = import_server()
+        with patch.object(server, "MAX_IMAGES_PER_REQUEST", 2):
+            response = TestClient(server.app).post("/identify", json={
+                "image_urls": [f"https://example.com/{i}.jpg" for i in range(3)],
+            })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_extra_photo_order_does_not_change_the_cache_key(self):
+        server = import_server()
+
+        self.assertEqual(
+            server._result_cache_key(["https://example.com/a.jpg", "https://example.com/b.jpg", "https://example.com/c.jpg"]),
+            server._result_cache_key(["https://example.com/a.jpg?utm_source=x", "https://example.com/c.jpg", "https://example.com/b.jpg"]),
+        )
+
+    def test_first_photo_stays_in_position_in_the_cache_key(self):
+        server = import_server()
+
+        self.assertNotEqual(
+            server._result_cache_key(["https://example.com/a.jpg", "https://example.com/b.jpg"]),
+            server._result_cache_key(["https://example.com/b.jpg", "https://example.com/a.jpg"]),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
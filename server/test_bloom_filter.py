@@ -0,0 +1,88 @@
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from bloom_filter import BloomFilter, CacheKeyFilter
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"image_url:US:https://example.com/{i}.jpg" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate_near_target(self):
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        for i in range(2000):
+            bloom.add(f"present-{i}")
+
+        false_positives = sum(1 for i in range(20000) if f"absent-{i}" in bloom)
+        self.assertLess(false_positives / 20000, 0.03)
+        self.assertLess(bloom.estimated_false_positive_rate(), 0.03)
+
+    def test_estimated_rate_uses_exact_fill_ratio(self):
+        bloom = BloomFilter(capacity=500, error_rate=0.01)
+        for i in range(500):
+            bloom.add(f"key-{i}")
+
+        set_bits = sum(bin(byte).count('1') for byte in bloom._bits)
+        self.assertAlmostEqual(
+            bloom.estimated_false_positive_rate(),
+            (set_bits / bloom.num_bits) ** bloom.num_hashes
+        )
+
+
+class CacheKeyFilterTest(unittest.TestCase):
+    def test_passes_everything_through_until_built(self):
+        key_filter = CacheKeyFilter(lambda: [], rebuild_interval=3600)
+        key_filter._thread = object()  # keep the background rebuild from starting
+
+        self.assertTrue(key_filter.might_contain("anything"))
+
+    def test_skips_definite_misses_and_tracks_local_writes(self):
+        key_filter = CacheKeyFilter(lambda: ["source:a"], capacity=100, rebuild_interval=3600)
+        key_filter._thread = object()
+        self.assertTrue(key_filter.rebuild())
+
+        self.assertTrue(key_filter.might_contain("source:a"))
+        self.assertFalse(key_filter.might_contain("source:b"))
+
+        key_filter.add("source:b")
+        self.assertTrue(key_filter.might_contain("source:b", "source:c"))
+
+        stats = key_filter.stats()
+        self.assertEqual(stats["skipped_lookups"], 1)
+        self.assertEqual(stats["passed_lookups"], 2)
+        self.assertGreater(stats["memory_bytes"], 0)
+
+    def test_counts_every_lookup_across_threads(self):
+        key_filter = CacheKeyFilter(lambda: ["source:a"], capacity=100, rebuild_interval=3600)
+        key_filter._thread = object()
+        self.assertTrue(key_filter.rebuild())
+
+        def lookups():
+            for i in range(2000):
+                key_filter.might_contain("source:a" if i % 2 else f"source:missing-{i}")
+                key_filter.record_false_positive()
+
+        threads = [threading.Thread(target=lookups) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = key_filter.stats()
+        self.assertEqual(stats["passed_lookups"] + stats["skipped_lookups"], 8000)
+        self.assertEqual(stats["observed_false_positives"], 8000)
+
+
+if __name__ == "__main__":
+    unittest.main()
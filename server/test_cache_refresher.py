@@ -0,0 +1,51 @@
+import sys
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from cache_refresher import CacheRefresher
+
+
+class CacheRefresherTest(unittest.TestCase):
+    def test_stale_entry_is_revalidated_once(self):
+        manager = MagicMock()
+        release = threading.Event()
+
+        def revalidate(entry):
+            release.wait(5)
+            return [{"garment": 1}], [{"title": "new"}]
+
+        refresher = CacheRefresher(manager, revalidate, max_concurrency=1)
+        entry = {"id": "c1", "image_url": "https://example.com/a.jpg"}
+
+        self.assertTrue(refresher.schedule(entry))
+        self.assertFalse(refresher.schedule(entry))
+        release.set()
+        refresher._executor.shutdown(wait=True)
+
+        manager.refresh_cache_entry.assert_called_once_with(
+            "c1", [{"garment": 1}], [{"title": "new"}], expires_in_days=30
+        )
+        stats = refresher.stats()
+        self.assertEqual((stats["refreshed"], stats["deduplicated"], stats["in_flight"]), (1, 1, 0))
+
+    def test_refresh_ahead_schedules_hot_entries(self):
+        manager = MagicMock()
+        manager.find_refresh_candidates.return_value = [{"id": "hot1"}, {"id": "hot2"}]
+        refresher = CacheRefresher(manager, lambda entry: None, min_hits=50, refresh_ahead=600, batch_size=5)
+
+        self.assertEqual(refresher.refresh_ahead_once(), 2)
+        refresher._executor.shutdown(wait=True)
+
+        manager.find_refresh_candidates.assert_called_once_with(600, 50, 5)
+        manager.refresh_cache_entry.assert_not_called()
+        self.assertEqual(refresher.stats()["unchanged"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from cache_sweeper import CacheSweeper
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+MIGRATIONS_DIR = server_dir.parent / "supabase" / "migrations"
+# The sweeper and every later migration that changes image_cache or the sweeper function
+MIGRATIONS = [
+    "20261019000300_add_image_cache_expiry_sweeper.sql",
+    "20261019000400_create_user_search_summaries_view.sql",
+    "20261019000500_add_compressed_cache_payload.sql",
+    "20261019000600_add_image_cache_url_key.sql",
+    "20261019000700_add_sweeper_stale_grace.sql",
+]
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+
+class CacheSweeperTest(unittest.TestCase):
+    def test_sweeps_in_batches_until_short_batch(self):
+        remaining = [250]
+
+        def sweep_batch(batch_size, archive):
+            swept = min(batch_size, remaining[0])
+            remaining[0] -= swept
+            return swept
+
+        sweeper = CacheSweeper(sweep_batch, batch_size=100, max_batches=10, batch_pause=0)
+        result = sweeper.sweep_once()
+
+        self.assertEqual(result["rows_reclaimed"], 250)
+        self.assertEqual(result["batches"], 3)
+        self.assertEqual(sweeper.stats()["rows_reclaimed"], 250)
+
+    def test_stops_at_max_batches(self):
+        sweeper = CacheSweeper(lambda size, archive: size, batch_size=10, max_batches=2, batch_pause=0)
+
+        result = sweeper.sweep_once()
+
+        self.assertEqual(result["batches"], 2)
+        self.assertEqual(result["rows_reclaimed"], 20)
+
+    def test_records_errors(self):
+        def failing(batch_size, archive):
+            raise RuntimeError("statement timeout")
+
+        sweeper = CacheSweeper(failing, batch_pause=0)
+        result = sweeper.sweep_once()
+
+        self.assertEqual(result["error"], "statement timeout")
+        self.assertEqual(sweeper.stats()["errors"], 1)
+
+
+@unittest.skipUnless(TEST_DATABASE_URL and psycopg, "set TEST_DATABASE_URL to run against a local Postgres")
+class CacheSweeperPostgresTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = psycopg.connect(TEST_DATABASE_URL, autocommit=True)
+        self.conn.execute("DROP SCHEMA IF EXISTS sweeper_test CASCADE")
+        self.conn.execute("CREATE SCHEMA sweeper_test")
+        self.conn.execute("SET search_path TO sweeper_test")
+        for role in ("service_role", "authenticated"):
+            self.conn.execute(
+                f"DO $$ BEGIN CREATE ROLE {role}; EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+            )
+        self.conn.execute("""
+            CREATE TABLE image_cache (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                image_url TEXT,
+                cloudinary_url TEXT,
+                detected_garments JSONB DEFAULT '[]',
+                search_results JSONB DEFAULT '[]',
+                total_results INTEGER DEFAULT 0,
+                country TEXT DEFAULT 'US',
+                cache_hits INTEGER DEFAULT 0,
+                expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE user_searches (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                user_id UUID,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                search_type TEXT,
+                source_url TEXT,
+                source_username TEXT,
+                image_cache_id UUID REFERENCES image_cache(id)
+            )
+        """)
+        for name in MIGRATIONS:
+            self.conn.execute((MIGRATIONS_DIR / name).read_text())
+
+    def tearDown(self):
+        self.conn.execute("DROP SCHEMA IF EXISTS sweeper_test CASCADE")
+        self.conn.close()
+
+    def sweep_batch(self, batch_size, archive, grace_seconds=0):
+        row = self.conn.execute(
+            "SELECT sweep_expired_image_cache(%s, %s, %s)", (batch_size, archive, grace_seconds)
+        ).fetchone()
+        return row[0]
+
+    def test_removes_only_unreferenced_expired_rows(self):
+        self.conn.execute("""
+            INSERT INTO image_cache (image_url, expires_at)
+            SELECT 'expired-' || i, NOW() - INTERVAL '1 day' FROM generate_series(1, 25) AS i
+        """)
+        self.conn.execute("""
+            INSERT INTO image_cache (image_url, expires_at)
+            SELECT 'fresh-' || i, NOW() + INTERVAL '1 day' FROM generate_series(1, 5) AS i
+        """)
+        self.conn.execute("""
+            INSERT INTO user_searches (image_cache_id)
+            SELECT id FROM image_cache WHERE image_url = 'expired-1'
+        """)
+
+        sweeper = CacheSweeper(self.sweep_batch, batch_size=10, batch_pause=0, archive=True)
+        result = sweeper.sweep_once()
+
+        self.assertEqual(result["rows_reclaimed"], 24)
+        self.assertEqual(result["batches"], 3)
+        remaining = self.conn.execute("SELECT COUNT(*) FROM image_cache").fetchone()[0]
+        archived = self.conn.execute("SELECT COUNT(*) FROM image_cache_archive").fetchone()[0]
+        self.assertEqual(remaining, 6)
+        self.assertEqual(archived, 24)
+
+    def test_archives_columns_added_after_the_archive_table(self):
+        self.conn.execute("""
+            INSERT INTO image_cache (image_url, image_url_key, payload_format, payload, summary_title, expires_at)
+            VALUES ('https://example.com/a.jpg', 'key-a', 1, 'blob', 'Water Lilies', NOW() - INTERVAL '1 day')
+        """)
+
+        self.assertEqual(self.sweep_batch(10, True), 1)
+        archived = self.conn.execute(
+            "SELECT image_url, image_url_key, payload_format, payload, summary_title, archived_at IS NOT NULL "
+            "FROM image_cache_archive"
+        ).fetchall()
+        self.assertEqual(archived, [("https://example.com/a.jpg", "key-a", 1, "blob", "Water Lilies", True)])
+
+    def test_grace_period_keeps_recently_expired_rows(self):
+        self.conn.execute("""
+            INSERT INTO image_cache (image_url, expires_at)
+            VALUES ('recent', NOW() - INTERVAL '10 minutes'), ('old', NOW() - INTERVAL '2 days')
+        """)
+
+        self.assertEqual(self.sweep_batch(10, False, grace_seconds=3600), 1)
+        remaining = self.conn.execute("SELECT image_url FROM image_cache").fetchall()
+        self.assertEqual(remaining, [("recent",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import sys
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from counter_buffer import CounterBuffer, PartialFlush
+
+
+class CounterBufferTest(unittest.TestCase):
+    def test_aggregates_increments_per_key(self):
+        flushed = []
+        buffer = CounterBuffer("test", flushed.append, flush_interval=60)
+
+        buffer.increment("a")
+        buffer.increment("a")
+        buffer.increment("b", 3)
+
+        self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(flushed, [{"a": 2, "b": 3}])
+        self.assertEqual(buffer.flush(), 0)
+        buffer.close()
+
+    def test_failed_flush_keeps_increments_pending(self):
+        calls = []
+
+        def failing_flush(batch):
+            calls.append(dict(batch))
+            if len(calls) == 1:
+                raise RuntimeError("database unavailable")
+
+        buffer = CounterBuffer("test", failing_flush, flush_interval=60)
+        buffer.increment("a")
+        self.assertEqual(buffer.flush(), 0)
+
+        buffer.increment("a")
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(calls[-1], {"a": 2})
+        self.assertEqual(buffer.stats()["failed_flushes"], 1)
+        buffer.close()
+
+    def test_partial_flush_keeps_only_unwritten_increments(self):
+        calls = []
+
+        def partial_flush(batch):
+            calls.append(dict(batch))
+            if len(calls) == 1:
+                raise PartialFlush({"b": 2}, "database went away")
+
+        buffer = CounterBuffer("test", partial_flush, flush_interval=60)
+        buffer.increment("a", 3)
+        buffer.increment("b", 2)
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(buffer.pending, {"b": 2})
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(calls[-1], {"b": 2})
+        self.assertEqual(buffer.stats()["flushed_increments"], 5)
+        buffer.close()
+
+    def test_size_threshold_wakes_background_flush(self):
+        flushed = []
+        buffer = CounterBuffer("test", flushed.append, flush_interval=60, max_pending=2)
+
+        buffer.increment("a")
+        buffer.increment("b")
+        for _ in range(50):
+            if flushed:
+                break
+            buffer._stop_event.wait(0.01)
+
+        self.assertEqual(flushed, [{"a": 1, "b": 1}])
+        buffer.close()
+
+    def test_close_flushes_pending(self):
+        flushed = []
+        buffer = CounterBuffer("test", flushed.append, flush_interval=60)
+
+        buffer.increment("a")
+        buffer.close()
+
+        self.assertEqual(flushed, [{"a": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
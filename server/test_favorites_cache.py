@@ -0,0 +1,78 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from favorites_cache import FavoritesCache
+
+
+def rows(*product_ids):
+    return [{"id": f"fav-{pid}", "product_id": pid} for pid in product_ids]
+
+
+def load(cache, user_id, favorites):
+    cache.begin_load(user_id)
+    return cache.finish_load(user_id, favorites)
+
+
+class FavoritesCacheTest(unittest.TestCase):
+    def test_total_size_bound_evicts_least_recently_used_users(self):
+        cache = FavoritesCache(max_entries=5, max_per_user=3)
+        load(cache, "a", rows("p1", "p2"))
+        load(cache, "b", rows("p1", "p2"))
+        self.assertIsNotNone(cache.get("a"))
+        load(cache, "c", rows("p1", "p2"))
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(set(cache.get("a")), {"p1", "p2"})
+        self.assertFalse(load(cache, "d", rows("p1", "p2", "p3", "p4")))
+        self.assertEqual(cache.stats()["entries"], 4)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_writes_update_cached_sets_and_discard_racing_loads(self):
+        cache = FavoritesCache()
+        load(cache, "a", rows("p1", "p2"))
+        cache.add("a", rows("p3"))
+        cache.remove_ids("a", ["fav-p1"])
+        self.assertEqual(set(cache.get("a")), {"p2", "p3"})
+
+        # A load that read the database before this write must not be cached
+        cache.begin_load("b")
+        cache.add("b", rows("p9"))
+        self.assertFalse(cache.finish_load("b", rows("p1")))
+        self.assertIsNone(cache.get("b"))
+        self.assertTrue(load(cache, "b", rows("p1", "p9")))
+        self.assertEqual(cache.stats()["discarded_loads"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = FavoritesCache(ttl=10)
+        with patch("favorites_cache.time.monotonic", return_value=100.0):
+            load(cache, "a", rows("p1"))
+        with patch("favorites_cache.time.monotonic", return_value=105.0):
+            self.assertIsNotNone(cache.get("a"))
+        with patch("favorites_cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_oversized_users_are_remembered_until_ttl_or_a_removal(self):
+        cache = FavoritesCache(ttl=10, max_per_user=2)
+        with patch("favorites_cache.time.monotonic", return_value=100.0):
+            self.assertFalse(load(cache, "a", rows("p1", "p2", "p3")))
+            self.assertFalse(load(cache, "b", rows("p1", "p2", "p3")))
+        with patch("favorites_cache.time.monotonic", return_value=105.0):
+            self.assertTrue(cache.is_oversized("a"))
+            cache.remove_ids("b", ["fav-p1"])
+            self.assertFalse(cache.is_oversized("b"))
+        with patch("favorites_cache.time.monotonic", return_value=111.0):
+            self.assertFalse(cache.is_oversized("a"))
+
+        stats = cache.stats()
+        self.assertEqual((stats["oversized_users"], stats["oversized_skips"]), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
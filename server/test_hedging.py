@@ -0,0 +1,98 @@
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from hedging import HedgedCaller
+
+
+def warmed_caller(**kwargs):
+    caller = HedgedCaller("test", min_samples=5, **kwargs)
+    for _ in range(5):
+        caller.call(lambda: time.sleep(0.01))
+    return caller
+
+
+class HedgedCallerTest(unittest.TestCase):
+    def test_slow_call_is_hedged_and_first_result_wins(self):
+        caller = warmed_caller(max_hedge_rate=0.5)
+        calls = []
+        lock = threading.Lock()
+
+        def request():
+            with lock:
+                calls.append(len(calls))
+                attempt = calls[-1]
+            time.sleep(1.0 if attempt == 0 else 0.01)
+            return attempt
+
+        started = time.perf_counter()
+        self.assertEqual(caller.call(request), 1)
+
+        self.assertLess(time.perf_counter() - started, 0.5)
+        stats = caller.stats()
+        self.assertEqual(stats["hedges"], 1)
+        self.assertEqual(stats["hedge_wins"], 1)
+
+    def test_hedge_rate_is_capped(self):
+        caller = warmed_caller(max_hedge_rate=0.2)
+        caller.hedge_delay = lambda: 0.001
+
+        for _ in range(3):
+            caller.call(lambda: time.sleep(0.05))
+
+        stats = caller.stats()
+        self.assertEqual(stats["hedges"], 1)
+        self.assertEqual(stats["rate_limited"], 2)
+
+    def test_failed_primary_falls_back_to_hedge(self):
+        caller = warmed_caller(max_hedge_rate=0.5)
+        attempts = []
+
+        def request():
+            attempts.append(1)
+            if len(attempts) == 1:
+                time.sleep(0.05)
+                raise RuntimeError("overloaded")
+            return "ok"
+
+        self.assertEqual(caller.call(request), "ok")
+        self.assertEqual(caller.stats()["errors"], 0)
+
+    def test_saturated_pool_skips_hedge_and_ignores_queue_time(self):
+        caller = warmed_caller(max_hedge_rate=1.0, max_workers=2)
+        release = threading.Event()
+        # Abandoned loser still holding a thread
+        blocker, _, _ = caller._submit(release.wait)
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.addCleanup(release.set)
+
+        self.assertEqual(caller.call(lambda: time.sleep(0.05) or "done"), "done")
+        blocker.result(timeout=1)
+
+        stats = caller.stats()
+        self.assertEqual(stats["hedges"], 0)
+        self.assertEqual(stats["saturated"], 1)
+
+        # Fill both threads so the next call queues well past the hedge delay
+        release.clear()
+        caller._submit(release.wait)
+        caller._submit(release.wait)
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(caller.call(lambda: "fast"), "fast")
+        stats = caller.stats()
+        self.assertEqual((stats["hedges"], stats["saturated"]), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+import payload_codec
+from payload_codec import (
+    FORMAT_RAW,
+    FORMAT_ZLIB,
+    FORMAT_ZSTD,
+    FORMAT_ZSTD_DICT,
+    PayloadDecodeError,
+    decode_cache_entry,
+    decode_payload,
+    encode_payload,
+)
+
+PAYLOAD = {
+    "detected_garments": [{"label": "painting", "score": 0.91}],
+    "search_results": [
+        {"title": f"Untitled #{i}", "price": "$1,200", "link": f"https://example.com/{i}"}
+        for i in range(50)
+    ],
+}
+
+
+class PayloadCodecTest(unittest.TestCase):
+    def test_raw_format_keeps_columns(self):
+        self.assertEqual(encode_payload(PAYLOAD, FORMAT_RAW), (FORMAT_RAW, None))
+
+    def test_zlib_round_trip(self):
+        payload_format, blob = encode_payload(PAYLOAD, FORMAT_ZLIB)
+
+        self.assertEqual(payload_format, FORMAT_ZLIB)
+        self.assertEqual(decode_payload(payload_format, blob), PAYLOAD)
+
+    @unittest.skipIf(payload_codec.zstandard is None, "zstandard not installed")
+    def test_zstd_round_trip(self):
+        payload_format, blob = encode_payload(PAYLOAD, FORMAT_ZSTD)
+
+        self.assertEqual(decode_payload(payload_format, blob), PAYLOAD)
+
+    @unittest.skipIf(payload_codec.zstandard is None, "zstandard not installed")
+    def test_rows_keep_decoding_with_their_own_dictionary_after_retraining(self):
+        import tempfile
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        samples = [
+            {"search_results": [{"title": f"{kind} #{i}", "price": f"${i * 37},000", "link": f"https://{kind}.example/{i}"}]}
+            for kind in ("gallery", "auction") for i in range(400)
+        ]
+        old_path, new_path = f"{tmp.name}/old.dict", f"{tmp.name}/new.dict"
+        payload_codec.train_dictionary(samples[:400], old_path, dict_size=4096)
+        payload_codec.train_dictionary(samples[400:], new_path, dict_size=4096)
+
+        def configure(write_path, old_paths):
+            return patch.multiple(
+                payload_codec, PAYLOAD_COMPRESSION="zstd", PAYLOAD_ZSTD_DICT=write_path, PAYLOAD_ZSTD_DICTS=old_paths,
+                _dictionary=None, _dictionaries={}, _dictionary_loaded=False,
+            )
+
+        with configure(old_path, []):
+            old_format, old_blob = encode_payload(PAYLOAD, FORMAT_ZSTD_DICT)
+        with configure(new_path, [old_path]):
+            new_format, new_blob = encode_payload(PAYLOAD)
+            self.assertEqual(new_format, FORMAT_ZSTD_DICT)
+            self.assertEqual(decode_payload(old_format, old_blob), PAYLOAD)
+            self.assertEqual(decode_payload(new_format, new_blob), PAYLOAD)
+        with configure(new_path, []):
+            with self.assertRaises(PayloadDecodeError):
+                decode_payload(old_format, old_blob)
+
+    def test_decode_cache_entry_fills_result_columns(self):
+        payload_format, blob = encode_payload(PAYLOAD, FORMAT_ZLIB)
+        entry = {
+            "id": "cache-1",
+            "detected_garments": [],
+            "search_results": [],
+            "payload_format": payload_format,
+            "payload": blob,
+        }
+
+        decoded = decode_cache_entry(entry)
+
+        self.assertEqual(decoded["search_results"], PAYLOAD["search_results"])
+        self.assertNotIn("payload", decoded)
+
+    def test_decode_cache_entry_leaves_raw_rows_alone(self):
+        entry = {"id": "cache-1", "search_results": [{"title": "A"}], "payload_format": 0, "payload": None}
+
+        self.assertEqual(decode_cache_entry(entry)["search_results"], [{"title": "A"}])
+
+    def test_zstd_falls_back_to_zlib_without_zstandard(self):
+        with patch.object(payload_codec, "zstandard", None), \
+             patch.object(payload_codec, "PAYLOAD_COMPRESSION", "zstd"):
+            self.assertEqual(payload_codec.default_format(), FORMAT_ZLIB)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import random
+import sys
+import time
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+import price_tokenizer
+from artwork_server import _clean_price_amount, _normalize_estimated_value_range, _normalize_text_field
+
+LEGACY = price_tokenizer._legacy_patterns()
+
+CORPUS = [
+    "$30,000,000 - $80,000,000",
+    "$50 million - $100 million",
+    "Estimated value: USD 5k to USD 12k",
+    "Between 2,000 EUR and 3,500 EUR at auction",
+    "£ 1 200 – £ 1 800",
+    "¥1000000—¥2000000",
+    "Prints typically sell for $200-$800; originals $5,000+",
+    "around 40 000 NOK",
+    "$1.5M to $2.2M",
+    "usd 300 to usd 450",
+    "Worth roughly 500 to 900 depending on condition",
+    "Estimated 1,000-2,000",
+    "Value: 300 TO 500",
+    "priceless",
+    "$ 12,345,6789 to $9",
+    "1,2345 USD",
+    "CHF 10k - CHF 20 billion",
+    "5 kUSD",
+    "$1 to tomorrow $2",
+    "ſek 100 - SEK 200",
+    "",
+]
+
+
+def legacy_normalize_estimated_value_range(value):
+    """_normalize_estimated_value_range as it was with the regexes"""
+    text = _normalize_text_field(value)
+    if not text:
+        return None
+
+    range_match = LEGACY["range"].search(text)
+    if range_match:
+        return f"{_clean_price_amount(range_match.group(1))} - {_clean_price_amount(range_match.group(2))}"
+
+    amounts = []
+    for match in LEGACY["amount"].finditer(text):
+        cleaned = _clean_price_amount(match.group(0))
+        if cleaned not in amounts:
+            amounts.append(cleaned)
+
+    if amounts:
+        has_range_signal = " to " in text.lower() or "-" in text or "–" in text or "—" in text
+        if len(amounts) >= 2 and has_range_signal:
+            return f"{amounts[0]} - {amounts[1]}"
+        return amounts[0]
+
+    plain_range = LEGACY["plain_range"].search(text)
+    if plain_range and any(
+        keyword in text.lower()
+        for keyword in ("value", "worth", "price", "estimate", "estimated")
+    ):
+        return f"{plain_range.group(1).replace(' ', '')} - {plain_range.group(2).replace(' ', '')}"
+
+    return text
+
+
+def fuzz_corpus(count, seed=0):
+    tokens = [
+        "1", "12", "123", "1234", ",", ", ", " ", ".", "$", "€", "£", "USD", "usd", "eUr", "K", "k",
+        "K", "m", "M", "b", "million", "Billion", "to", "TO", "-", "–", "—", "x", "_", "\n",
+        "ſek", "İ", "nok", "٣", "1,234", "1 234", "5.5", "mil", "value ",
+    ]
+    rng = random.Random(seed)
+    return ["".join(rng.choice(tokens) for _ in range(rng.randint(1, 14))) for _ in range(count)]
+
+
+def match_groups(match):
+    return (match.group(0), match.group(1), match.group(2)) if match else None
+
+
+class PriceTokenizerEquivalenceTest(unittest.TestCase):
+    def test_matches_legacy_regexes(self):
+        for text in CORPUS + fuzz_corpus(5000):
+            with self.subTest(text=text):
+                price_range = price_tokenizer.find_price_range(text)
+                plain_range = price_tokenizer.find_plain_numeric_range(text)
+                self.assertEqual(tuple(price_range) if price_range else None, match_groups(LEGACY["range"].search(text)))
+                self.assertEqual(
+                    list(price_tokenizer.iter_price_amounts(text)),
+                    [match.group(0) for match in LEGACY["amount"].finditer(text)],
+                )
+                self.assertEqual(
+                    tuple(plain_range) if plain_range else None,
+                    match_groups(LEGACY["plain_range"].search(text)),
+                )
+
+    def test_normalized_value_range_is_unchanged(self):
+        for text in CORPUS + fuzz_corpus(2000, seed=1) + [["$100", "$200"], 1500, None]:
+            with self.subTest(text=text):
+                self.assertEqual(_normalize_estimated_value_range(text), legacy_normalize_estimated_value_range(text))
+
+
+class PriceTokenizerWorstCaseTest(unittest.TestCase):
+    def test_worst_case_inputs_scale_linearly(self):
+        def elapsed(size):
+            started = time.perf_counter()
+            for text in price_tokenizer.worst_case_inputs(size).values():
+                _normalize_estimated_value_range(text)
+            return time.perf_counter() - started
+
+        small, large = elapsed(5000), elapsed(40000)
+        # 8x the input; quadratic regexes would take ~64x (and minutes at this size)
+        self.assertLess(large, max(small, 0.01) * 24)
+        self.assertLess(large, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
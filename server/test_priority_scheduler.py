@@ -0,0 +1,88 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from priority_scheduler import PriorityClass, PriorityScheduler, SchedulerFull, parse_classes
+
+
+CLASSES = [PriorityClass("premium", 3, 2), PriorityClass("free", 1, 2)]
+
+
+async def admission_order(scheduler, tiers):
+    """Queue every tier behind one occupied slot, then record the order they are admitted in"""
+    order = []
+    blocker = await scheduler.acquire("premium")
+
+    async def request(index, tier):
+        async with scheduler.slot(tier):
+            order.append(index)
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(request(i, tier)) for i, tier in enumerate(tiers)]
+    await asyncio.sleep(0)
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class PrioritySchedulerTest(unittest.TestCase):
+    def test_weights_favor_premium_and_unknown_tiers_use_default(self):
+        scheduler = PriorityScheduler(CLASSES, concurrency=1, default_tier="free", starvation_seconds=60)
+        tiers = ["free"] * 4 + ["premium"] * 4
+        order = asyncio.run(admission_order(scheduler, tiers))
+
+        # Three premium admissions for every free one while both are waiting
+        self.assertEqual(sorted(tiers[i] for i in order[:4]), ["free", "premium", "premium", "premium"])
+        self.assertEqual(scheduler.resolve_tier("Gold"), "free")
+        stats = scheduler.stats()["classes"]
+        self.assertEqual(stats["premium"]["admitted"], 5)
+        self.assertIsNotNone(stats["free"]["queue_wait_p95_ms"])
+
+    def test_starved_requests_jump_the_weighted_order(self):
+        scheduler = PriorityScheduler(CLASSES, concurrency=1, starvation_seconds=0)
+        tiers = ["free", "premium", "premium", "premium"]
+        order = asyncio.run(admission_order(scheduler, tiers))
+
+        self.assertEqual(order, [0, 1, 2, 3])
+        self.assertGreater(scheduler.stats()["classes"]["free"]["starvation_promotions"], 0)
+
+    def test_class_cap_full_queue_and_timeout(self):
+        scheduler = PriorityScheduler(
+            [PriorityClass("premium", 3, 2), PriorityClass("free", 1, 1)],
+            concurrency=3, max_queue=1, queue_timeout=0.05
+        )
+
+        async def scenario():
+            held = await scheduler.acquire("free")
+            waiting = asyncio.create_task(scheduler.acquire("free"))
+            await asyncio.sleep(0)
+            # The free cap is 1 even though total capacity is free
+            self.assertFalse(waiting.done())
+            with self.assertRaises(SchedulerFull):
+                await scheduler.acquire("free")
+            self.assertEqual(await scheduler.acquire("premium"), "premium")
+            with self.assertRaises(SchedulerFull):
+                await waiting
+            scheduler.release(held)
+
+        asyncio.run(scenario())
+        stats = scheduler.stats()
+        self.assertEqual(stats["classes"]["free"]["rejected"], 1)
+        self.assertEqual(stats["classes"]["free"]["timed_out"], 1)
+        self.assertEqual(stats["classes"]["free"]["queued"], 0)
+        self.assertEqual(stats["running"], 1)
+
+    def test_parse_classes(self):
+        self.assertEqual(
+            parse_classes("premium:6:8, free:1:2"),
+            [PriorityClass("premium", 6.0, 8), PriorityClass("free", 1.0, 2)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from request_profiler import RequestProfiler
+
+
+def parse_json_slowly():
+    time.sleep(0.05)
+
+
+def handle_request():
+    parse_json_slowly()
+
+
+class RequestProfilerTest(unittest.TestCase):
+    def test_profile_is_written_as_collapsed_stacks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RequestProfiler(tmp, token="secret", interval_ms=1)
+            with profiler.profile("req1") as profile:
+                handle_request()
+
+            with open(profile["path"], encoding="utf-8") as f:
+                lines = f.read().splitlines()
+
+        self.assertTrue(profile["path"].endswith("-req1.collapsed"))
+        self.assertTrue(lines)
+        leaf_stack = max(lines, key=lambda line: int(line.rsplit(" ", 1)[1])).rsplit(" ", 1)[0]
+        frames = [frame.split(" (")[0] for frame in leaf_stack.split(";")]
+        self.assertEqual(frames[-2:], ["handle_request", "parse_json_slowly"])
+
+    def test_token_and_sample_rate_decide_and_old_files_are_pruned(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RequestProfiler(tmp, token="secret", sample_rate=0, max_files=2)
+            self.assertTrue(profiler.should_profile("secret"))
+            self.assertFalse(profiler.should_profile("guess"))
+            self.assertFalse(profiler.should_profile(None))
+            self.assertTrue(RequestProfiler(tmp, token=None, sample_rate=1.0).should_profile(None))
+            self.assertFalse(RequestProfiler(tmp, token=None, sample_rate=0).enabled)
+
+            for name in ("a", "b", "c"):
+                with profiler.profile(name):
+                    pass
+                time.sleep(0.01)
+            remaining = sorted(os.listdir(tmp))
+
+        self.assertEqual([name.rsplit("-", 1)[1] for name in remaining], ["b.collapsed", "c.collapsed"])
+        self.assertEqual(profiler.stats()["written"], 3)
+
+    def test_file_pruned_by_another_worker_is_not_a_write_error(self):
+        real_remove = os.remove
+
+        def remove_twice(path):
+            # Another worker removes the file first
+            real_remove(path)
+            real_remove(path)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = RequestProfiler(tmp, token="secret", max_files=1)
+            with profiler.profile("a"):
+                pass
+            time.sleep(0.01)
+            with patch("request_profiler.os.remove", side_effect=remove_twice):
+                with profiler.profile("b") as profile:
+                    pass
+            remaining = os.listdir(tmp)
+
+        self.assertTrue(profile["path"].endswith("-b.collapsed"))
+        self.assertEqual([name.rsplit("-", 1)[1] for name in remaining], ["b.collapsed"])
+        stats = profiler.stats()
+        self.assertEqual((stats["written"], stats["errors"], stats["prune_errors"]), (2, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,561 @@
+import re
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+import supabase_client
+from supabase_client import SupabaseManager
+
+
+def make_manager(client):
+    manager = object.__new__(SupabaseManager)
+    manager._client = client
+    return manager
+
+
+def query_returning(rows_for_call):
+    """A chainable PostgREST query mock whose execute() returns rows_for_call(call_args)"""
+    query = MagicMock()
+    for method in ("select", "eq", "in_", "upsert", "delete", "order", "limit"):
+        getattr(query, method).return_value = query
+    query.execute.side_effect = lambda: MagicMock(data=rows_for_call(query))
+    return query
+
+
+class FavoritesBulkTest(unittest.TestCase):
+    def test_check_favorited_products_chunks_ids(self):
+        client = MagicMock()
+        favorited = {"p1", "p150", "p249"}
+        query = query_returning(
+            lambda q: [{"product_id": pid} for pid in q.in_.call_args[0][1] if pid in favorited]
+        )
+        client.table.return_value = query
+        manager = make_manager(client)
+        product_ids = [f"p{i}" for i in range(250)]
+
+        with patch.object(supabase_client, "FAVORITES_CHUNK_SIZE", 100), \
+             patch.object(supabase_client, "FAVORITES_MAX_CONCURRENCY", 1):
+            result = manager.check_favorited_products("user", product_ids)
+
+        self.assertEqual(result, ["p1", "p150", "p249"])
+        chunk_sizes = sorted(len(call[0][1]) for call in query.in_.call_args_list)
+        self.assertEqual(chunk_sizes, [50, 100, 100])
+
+    def test_failed_chunk_fails_the_whole_check(self):
+        client = MagicMock()
+
+        def rows(q):
+            if "p150" in q.in_.call_args[0][1]:
+                raise RuntimeError("statement timeout")
+            return [{"product_id": "p1"}]
+
+        client.table.return_value = query_returning(rows)
+        manager = make_manager(client)
+
+        with patch.object(supabase_client, "FAVORITES_CHUNK_SIZE", 100), \
+             patch.object(supabase_client, "FAVORITES_MAX_CONCURRENCY", 1):
+            result = manager.check_favorited_products("user", [f"p{i}" for i in range(250)])
+
+        self.assertEqual(result, [])
+
+    def test_remove_favorites_reports_failed_chunks_per_item(self):
+        client = MagicMock()
+
+        def rows(q):
+            if "f2" in q.in_.call_args[0][1]:
+                raise RuntimeError("connection reset")
+            return [{"id": "f0"}]
+
+        client.table.return_value = query_returning(rows)
+        manager = make_manager(client)
+
+        with patch.object(supabase_client, "FAVORITES_CHUNK_SIZE", 2), \
+             patch.object(supabase_client, "FAVORITES_MAX_CONCURRENCY", 1):
+            result = manager.remove_favorites("user", ["f0", "f1", "f2"])
+
+        self.assertEqual(result, {
+            "f0": {"status": "removed"}, "f1": {"status": "not_found"}, "f2": {"status": "error"},
+        })
+
+    def test_add_favorites_reports_duplicates_per_item(self):
+        client = MagicMock()
+        query = query_returning(lambda q: [{"id": "fav-1", "product_id": "p1"}])
+        client.table.return_value = query
+        manager = make_manager(client)
+
+        result = manager.add_favorites("user", [
+            {"product_id": "p1", "product_name": "A"},
+            {"product_id": "p2", "product_name": "B"},
+        ])
+
+        self.assertEqual(result["p1"], {"status": "added", "favorite_id": "fav-1"})
+        self.assertEqual(result["p2"], {"status": "duplicate", "favorite_id": None})
+        self.assertTrue(query.upsert.call_args.kwargs["ignore_duplicates"])
+
+
+class KeysetQuery:
+    """Just enough of a PostgREST query to run _fetch_keyset_page over in-memory rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.after = None
+        self.row_limit = None
+
+    def eq(self, column, value):
+        return self
+
+    def or_(self, filters):
+        created_at, row_id = re.findall(r'"([^"]*)"', filters)[::2]
+        self.after = (created_at, row_id)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        if self.after:
+            rows = [r for r in rows if (r["created_at"], r["id"]) < self.after]
+        return MagicMock(data=rows[:self.row_limit])
+
+
+class KeysetPaginationTest(unittest.TestCase):
+    def pages(self, rows, limit):
+        client = MagicMock()
+        manager = make_manager(client)
+        items, cursor = [], None
+        while True:
+            client.table.return_value.select.return_value = KeysetQuery(rows)
+            page = manager.get_user_favorites_page("user", limit=limit, cursor=cursor)
+            items.append([row["id"] for row in page["items"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return items
+
+    def test_cursor_round_trip(self):
+        row = {"created_at": "2026-10-19T08:30:00.123456+00:00", "id": "0b0e6f1c-2f7a-4a4e-9d43-5d1f8c6a7e21"}
+        self.assertEqual(
+            supabase_client._decode_cursor(supabase_client._encode_cursor(row)),
+            (row["created_at"], row["id"]),
+        )
+
+    def test_pages_split_created_at_ties_by_id(self):
+        rows = [
+            {"created_at": "2026-10-19T08:00:00+00:00", "id": "a"},
+            {"created_at": "2026-10-19T09:00:00+00:00", "id": "b"},
+            {"created_at": "2026-10-19T09:00:00+00:00", "id": "c"},
+            {"created_at": "2026-10-19T09:00:00+00:00", "id": "d"},
+        ]
+        self.assertEqual(self.pages(rows, limit=2), [["d", "c"], ["b", "a"]])
+
+    def test_last_page_has_no_cursor(self):
+        rows = [{"created_at": f"2026-10-19T0{i}:00:00+00:00", "id": f"r{i}"} for i in range(5)]
+        self.assertEqual(self.pages(rows, limit=2), [["r4", "r3"], ["r2", "r1"], ["r0"]])
+        self.assertEqual(self.pages(rows[:2], limit=2), [["r1", "r0"]])
+
+    def test_malformed_cursor_raises(self):
+        manager = make_manager(MagicMock())
+        forged = supabase_client._encode_cursor({"created_at": '2026",id.gt."0', "id": "x"})
+        for cursor in ("not-a-cursor", forged):
+            with self.assertRaises(ValueError):
+                manager.get_user_searches_page("user", cursor=cursor)
+            with self.assertRaises(ValueError):
+                manager.get_user_favorites_page("user", cursor=cursor)
+
+
+class HistorySummaryTest(unittest.TestCase):
+    def test_summaries_select_only_list_columns(self):
+        client = MagicMock()
+        view = KeysetQuery([{"created_at": "2026-10-19T09:00:00+00:00", "id": "s1", "title": "Water Lilies"}])
+        client.from_.return_value.select.return_value = view
+        manager = make_manager(client)
+
+        page = manager.get_user_search_summaries("user")
+
+        client.from_.assert_called_with("v_user_search_summaries")
+        columns = client.from_.return_value.select.call_args[0][0]
+        self.assertEqual(columns, supabase_client.USER_SEARCH_SUMMARY_COLUMNS)
+        self.assertNotIn("search_results", columns)
+        self.assertEqual([row["title"] for row in page["items"]], ["Water Lilies"])
+
+    def test_detail_loads_one_users_search_with_decoded_cache(self):
+        from payload_codec import FORMAT_ZLIB, encode_payload
+
+        payload_format, blob = encode_payload({"detected_garments": [], "search_results": [{"title": "A"}]}, FORMAT_ZLIB)
+        client = MagicMock()
+        query = query_returning(lambda q: [{
+            "id": "s1",
+            "image_cache": {"id": "c1", "payload_format": payload_format, "payload": blob, "search_results": []},
+        }])
+        client.table.return_value = query
+        manager = make_manager(client)
+
+        search = manager.get_user_search_detail("user", "s1")
+
+        client.table.assert_called_with("user_searches")
+        self.assertEqual(query.select.call_args[0][0], "*, image_cache(*)")
+        self.assertEqual([call.args for call in query.eq.call_args_list], [("user_id", "user"), ("id", "s1")])
+        self.assertEqual(search["image_cache"]["search_results"], [{"title": "A"}])
+        self.assertNotIn("payload", search["image_cache"])
+
+    def test_source_lookup_can_skip_result_payloads(self):
+        from datetime import datetime, timedelta, timezone
+
+        expires_at = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+        client = MagicMock()
+        query = query_returning(lambda q: [{"image_cache_id": "c1", "image_cache": {"id": "c1", "expires_at": expires_at}}])
+        client.table.return_value = query
+        manager = make_manager(client)
+
+        entry = manager.check_cache_by_source("https://www.instagram.com/p/Cxyz/", summary_only=True)
+
+        self.assertEqual(entry["id"], "c1")
+        self.assertEqual(
+            query.select.call_args[0][0],
+            f"image_cache_id, image_cache({supabase_client.IMAGE_CACHE_SUMMARY_COLUMNS})",
+        )
+
+
+class CounterFlushTest(unittest.TestCase):
+    def test_per_entry_fallback_reports_only_unapplied_hits(self):
+        from counter_buffer import PartialFlush
+
+        client = MagicMock()
+        rpc = MagicMock()
+        # Bulk function missing, then two single increments land before the database goes away
+        rpc.execute.side_effect = [RuntimeError("no bulk function"), None, None, RuntimeError("connection reset")]
+        client.rpc.return_value = rpc
+        manager = make_manager(client)
+
+        with self.assertRaises(PartialFlush) as raised:
+            manager._flush_cache_hits({"c1": 2, "c2": 2})
+
+        self.assertEqual(raised.exception.remaining, {"c2": 2})
+
+    def test_instagram_fallback_applies_every_access_and_keeps_the_rest_pending(self):
+        from counter_buffer import PartialFlush
+
+        client = MagicMock()
+        client.rpc.return_value.execute.side_effect = RuntimeError("no bulk function")
+        query = MagicMock()
+        query.update.return_value = query
+        query.in_.return_value = query
+        # One touch per pending access: the first round lands, the second fails
+        query.execute.side_effect = [None, RuntimeError("connection reset")]
+        client.table.return_value = query
+        manager = make_manager(client)
+
+        with self.assertRaises(PartialFlush) as raised:
+            manager._flush_instagram_cache_access({1: 1, 2: 3})
+
+        self.assertEqual(query.in_.call_args_list[0][0], ("id", [1, 2]))
+        self.assertEqual(raised.exception.remaining, {2: 2})
+
+
+class FavoritesCacheManagerTest(unittest.TestCase):
+    def test_favorite_checks_use_cache_kept_current_by_writes(self):
+        from favorites_cache import FavoritesCache
+
+        client = MagicMock()
+        query = query_returning(lambda q: [])
+        # Exactly one load, one insert and one delete may reach the database
+        query.execute.side_effect = [
+            MagicMock(data=[{"id": "fav-1", "product_id": "p1"}, {"id": "fav-2", "product_id": "p2"}]),
+            MagicMock(data=[{"id": "fav-3", "product_id": "p3"}]),
+            MagicMock(data=[{"id": "fav-1", "product_id": "p1"}]),
+        ]
+        client.table.return_value = query
+        manager = make_manager(client)
+        manager._favorites_cache = FavoritesCache()
+
+        self.assertEqual(manager.check_favorited_products("user", ["p1", "p3"]), ["p1"])
+        self.assertEqual(manager.add_favorite("user", "p3", "C", "B", 1.0, "img", None, "art"), "fav-3")
+        self.assertTrue(manager.remove_favorite("user", "fav-1"))
+        self.assertEqual(manager.check_favorited_products("user", ["p1", "p2", "p3"]), ["p2", "p3"])
+        self.assertEqual(manager.get_existing_favorite("user", "p3")["id"], "fav-3")
+        self.assertIsNone(manager.get_existing_favorite("user", "p1"))
+
+        self.assertEqual(query.execute.call_count, 3)
+        self.assertEqual(manager.favorites_cache_stats()["hits"], 3)
+
+    def test_user_with_too_many_favorites_is_not_reloaded_on_every_check(self):
+        from favorites_cache import FavoritesCache
+
+        client = MagicMock()
+        query = query_returning(lambda q: [{"id": f"fav-{n}", "product_id": f"p{n}"} for n in range(3)])
+        client.table.return_value = query
+        manager = make_manager(client)
+        manager._favorites_cache = FavoritesCache(max_per_user=2)
+
+        with patch.object(manager, "_iter_table_rows", wraps=manager._iter_table_rows) as iter_rows:
+            for _ in range(3):
+                self.assertEqual(manager.check_favorited_products("user", ["p1", "p9"]), ["p1"])
+
+        self.assertEqual(iter_rows.call_count, 1)
+        self.assertEqual(manager.favorites_cache_stats()["oversized_skips"], 2)
+
+
+class CanonicalUrlLookupTest(unittest.TestCase):
+    def test_check_cache_by_source_matches_canonical_and_legacy_forms(self):
+        client = MagicMock()
+        query = query_returning(lambda q: [])
+        client.table.return_value = query
+        manager = make_manager(client)
+
+        manager.check_cache_by_source("http://instagram.com/p/Cxyz/?igsh=abc")
+
+        client.table.assert_called_with("image_cache_sources")
+        column, keys = query.in_.call_args[0]
+        self.assertEqual(column, "source_url_key")
+        self.assertEqual(keys, [
+            "http://instagram.com/p/Cxyz/?igsh=abc",
+            "https://www.instagram.com/p/Cxyz/",
+            "http://instagram.com/p/Cxyz/",
+        ])
+
+    def test_search_history_and_store_cache_maintain_source_mapping(self):
+        client = MagicMock()
+        query = query_returning(lambda q: [{"id": "row-1"}])
+        query.insert.return_value = query
+        client.table.return_value = query
+        manager = make_manager(client)
+
+        manager.create_user_search("user", "cache-1", "instagram", source_url="http://instagram.com/p/Cxyz/?igsh=abc")
+        manager.store_cache("https://example.com/a.jpg", "hash", "cloud", [], [], source_url="https://instagram.com/p/Cxyz/")
+
+        mappings = [call.args[0] for call in query.upsert.call_args_list]
+        self.assertEqual([m["source_url_key"] for m in mappings], ["https://www.instagram.com/p/Cxyz/"] * 2)
+        self.assertEqual([m["image_cache_id"] for m in mappings], ["cache-1", "row-1"])
+        self.assertEqual(query.upsert.call_args.kwargs["on_conflict"], "source_url_key")
+
+
+class CompressedHistoryTest(unittest.TestCase):
+    def test_history_rows_are_decoded_from_compressed_cache_entries(self):
+        from payload_codec import FORMAT_ZLIB, encode_payload
+
+        payload_format, blob = encode_payload(
+            {"detected_garments": [], "search_results": [{"title": "Water Lilies"}]}, FORMAT_ZLIB
+        )
+        history = [
+            {"id": "s1", "image_cache_id": "c1", "created_at": "2026-10-19T09:00:00+00:00", "search_results": []},
+            {"id": "s2", "image_cache_id": "c2", "created_at": "2026-10-19T08:00:00+00:00",
+             "search_results": [{"title": "Raw"}]},
+        ]
+        client = MagicMock()
+        view = query_returning(lambda q: history)
+        view.range.return_value = view
+        blobs = query_returning(lambda q: [{"id": "c1", "payload_format": payload_format, "payload": blob}])
+        blobs.neq.return_value = blobs
+        client.from_.return_value = view
+        client.table.return_value = blobs
+        manager = make_manager(client)
+
+        rows = manager.get_user_searches("user")
+
+        self.assertEqual(rows[0]["search_results"], [{"title": "Water Lilies"}])
+        self.assertEqual(rows[1]["search_results"], [{"title": "Raw"}])
+        # Rows that already carry results are raw and need no blob
+        self.assertEqual(blobs.in_.call_args[0], ("id", ["c1"]))
+
+    def test_pages_of_raw_rows_skip_the_blob_fetch(self):
+        client = MagicMock()
+        view = query_returning(lambda q: [
+            {"id": "s1", "image_cache_id": "c1", "created_at": "2026-10-19T09:00:00+00:00",
+             "search_results": [{"title": "Raw"}]},
+        ])
+        view.range.return_value = view
+        client.from_.return_value = view
+        manager = make_manager(client)
+
+        rows = manager.get_user_searches("user")
+
+        self.assertEqual(rows[0]["search_results"], [{"title": "Raw"}])
+        client.table.assert_not_called()
+
+    def test_undecodable_row_does_not_blank_the_page(self):
+        from payload_codec import FORMAT_ZLIB, encode_payload
+
+        payload_format, blob = encode_payload({"detected_garments": [], "search_results": [{"title": "A"}]}, FORMAT_ZLIB)
+        history = [
+            {"id": "s1", "image_cache_id": "c1", "created_at": "2026-10-19T09:00:00+00:00", "search_results": []},
+            {"id": "s2", "image_cache_id": "c2", "created_at": "2026-10-19T08:00:00+00:00", "search_results": []},
+        ]
+        client = MagicMock()
+        view = query_returning(lambda q: history)
+        view.lt.return_value = view
+        view.or_.return_value = view
+        blobs = query_returning(lambda q: [
+            {"id": "c1", "payload_format": payload_format, "payload": blob},
+            {"id": "c2", "payload_format": 3, "payload": "bm90IGEgZnJhbWU="},
+        ])
+        blobs.neq.return_value = blobs
+        client.from_.return_value = view
+        client.table.return_value = blobs
+        manager = make_manager(client)
+
+        page = manager.get_user_searches_page("user", limit=2)
+
+        self.assertEqual([row["id"] for row in page["items"]], ["s1", "s2"])
+        self.assertEqual(page["items"][0]["search_results"], [{"title": "A"}])
+        self.assertEqual(page["items"][1]["search_results"], [])
+        self.assertNotIn("payload", page["items"][1])
+
+
+class StaleWhileRevalidateTest(unittest.TestCase):
+    def lookup(self, expired_seconds_ago, stale_max=3600, register_handler=True):
+        from datetime import datetime, timedelta, timezone
+
+        expires_at = (datetime.now(timezone.utc) - timedelta(seconds=expired_seconds_ago)).isoformat()
+        client = MagicMock()
+        query = query_returning(lambda q: [{"id": "c1", "expires_at": expires_at, "search_results": []}])
+        for method in ("or_", "gt"):
+            getattr(query, method).return_value = query
+        client.table.return_value = query
+        manager = make_manager(client)
+        handler = MagicMock()
+        if register_handler:
+            manager.set_stale_handler(handler)
+        self.addCleanup(manager.set_stale_handler, None)
+
+        with patch.object(supabase_client, "CACHE_STALE_MAX_SECONDS", stale_max):
+            entry = manager.check_cache(image_url="https://example.com/a.jpg")
+        return entry, handler
+
+    def test_recently_expired_entry_is_served_stale_and_revalidated(self):
+        entry, handler = self.lookup(expired_seconds_ago=600)
+
+        self.assertTrue(entry["stale"])
+        handler.assert_called_once()
+        self.assertEqual(handler.call_args[0][0]["id"], "c1")
+
+    def test_entry_past_stale_bound_is_a_miss(self):
+        entry, handler = self.lookup(expired_seconds_ago=7200)
+
+        self.assertIsNone(entry)
+        handler.assert_not_called()
+
+    def test_expired_entry_is_a_miss_without_a_revalidation_handler(self):
+        entry, handler = self.lookup(expired_seconds_ago=600, register_handler=False)
+
+        self.assertIsNone(entry)
+        handler.assert_not_called()
+
+    def test_key_filter_covers_entries_still_servable_stale(self):
+        from datetime import datetime, timedelta
+        from bloom_filter import CacheKeyFilter
+
+        rows = [{
+            "id": "c1", "image_url": "https://example.com/a.jpg", "image_url_key": None, "image_hash": None,
+            "country": "US", "expires_at": (datetime.now() - timedelta(seconds=600)).isoformat(),
+            "search_results": [],
+        }]
+
+        def table(name):
+            # Applies gt() filters the way PostgREST would, so the filter only sees servable rows
+            bounds = []
+            query = MagicMock()
+            for method in ("select", "or_", "eq", "order", "limit"):
+                getattr(query, method).return_value = query
+            query.gt.side_effect = lambda column, value: bounds.append((column, value)) or query
+            query.execute.side_effect = lambda: MagicMock(data=[
+                row for row in (rows if name == "image_cache" else [])
+                if all(str(row[column]) > value for column, value in bounds)
+            ])
+            return query
+
+        client = MagicMock()
+        client.table.side_effect = table
+        manager = make_manager(client)
+        manager.set_stale_handler(MagicMock())
+        self.addCleanup(manager.set_stale_handler, None)
+
+        with patch.object(supabase_client, "CACHE_STALE_MAX_SECONDS", 3600):
+            manager._key_filter = CacheKeyFilter(manager._load_cache_keys, capacity=100, rebuild_interval=3600)
+            manager._key_filter._thread = object()  # keep the background rebuild from starting
+            self.assertTrue(manager._key_filter.rebuild())
+            entry = manager.check_cache(image_url="https://example.com/a.jpg", country="US")
+
+        self.assertTrue(entry["stale"])
+
+    def test_cache_refresher_stays_off_without_the_flag(self):
+        manager = make_manager(MagicMock())
+
+        with patch.object(supabase_client, "CACHE_REFRESH_ENABLED", False):
+            self.assertFalse(manager.start_cache_refresher(MagicMock()))
+
+        self.assertIsNone(manager.cache_refresher_stats())
+        self.assertFalse(manager._stale_serving_enabled())
+
+    def test_started_cache_refresher_serves_stale_entries(self):
+        manager = make_manager(MagicMock())
+        self.addCleanup(manager.stop_cache_refresher)
+
+        with patch.object(supabase_client, "CACHE_REFRESH_ENABLED", True), \
+             patch.object(supabase_client, "CACHE_STALE_MAX_SECONDS", 3600), \
+             patch.object(manager, "find_refresh_candidates", return_value=[]):
+            self.assertTrue(manager.start_cache_refresher(MagicMock()))
+            self.assertTrue(manager._stale_serving_enabled())
+            self.assertEqual(manager.cache_refresher_stats()["scheduled_stale"], 0)
+
+            manager.stop_cache_refresher()
+            self.assertFalse(manager._stale_serving_enabled())
+
+    def test_sweeper_keeps_stale_window_when_refresh_is_enabled(self):
+        client = MagicMock()
+        client.rpc.return_value.execute.return_value = MagicMock(data=3)
+        manager = make_manager(client)
+
+        with patch.object(supabase_client, "CACHE_REFRESH_ENABLED", True), \
+             patch.object(supabase_client, "CACHE_STALE_MAX_SECONDS", 3600):
+            self.assertEqual(manager.sweep_expired_cache_batch(100), 3)
+
+        self.assertEqual(client.rpc.call_args[0][1]["p_grace_seconds"], 3600)
+
+
+class WriteQueueManagerTest(unittest.TestCase):
+    def test_result_and_history_writes_reach_database_only_on_flush(self):
+        import tempfile
+        from write_queue import WriteQueue
+
+        client = MagicMock()
+        query = query_returning(lambda q: [])
+        query.insert.return_value = query
+        query.execute.side_effect = None
+        query.execute.return_value = MagicMock(data=[{"id": "search-1"}])
+        client.table.return_value = query
+        manager = make_manager(client)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        manager._write_queue = WriteQueue("test", {
+            "image_cache": manager._write_cache_entries,
+            "user_search": manager._write_user_searches,
+            "instagram_url_cache": manager._write_instagram_url_cache,
+        }, path=f"{tmp.name}/queue.sqlite3", flush_interval=60)
+        self.addCleanup(manager._write_queue.close)
+
+        cache_id = manager.enqueue_store_cache("https://example.com/a.jpg", "hash", "cloud", [], [])
+        self.assertTrue(manager.enqueue_user_search("user", cache_id, "instagram"))
+        self.assertTrue(manager.enqueue_instagram_url_cache("https://instagram.com/p/Cxyz/", "https://example.com/a.jpg"))
+        client.table.assert_not_called()
+
+        self.assertEqual(manager.flush_writes(), 3)
+        tables = [call.args[0] for call in client.table.call_args_list]
+        # The search is only written after the cache row it references
+        self.assertLess(tables.index("image_cache"), tables.index("user_searches"))
+        cache_rows = query.upsert.call_args_list[0]
+        self.assertEqual(cache_rows.args[0][0]["id"], cache_id)
+        self.assertTrue(cache_rows.kwargs["ignore_duplicates"])
+        self.assertEqual(manager.write_queue_stats()["pending"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import importlib
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import requests
+from fastapi.testclient import TestClient
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from upstream_cassette import CassetteMiss, UpstreamCassette
+
+CLAUDE_RESULT = {
+    "identified_artist": "Claude Monet",
+    "artwork_title": "Water Lilies",
+    "confidence_level": "high",
+    "estimated_value_range": "$20,000,000 - $40,000,000",
+}
+
+
+def import_server():
+    sys.modules.pop("artwork_server", None)
+    return importlib.import_module("artwork_server")
+
+
+class UpstreamCassetteTest(unittest.TestCase):
+    def test_recorded_identify_replays_offline_without_secrets(self):
+        server = import_server()
+        search_response = MagicMock()
+        search_response.json.return_value = {"answer": "Water Lilies by Claude Monet (echo key sk-search-123)"}
+        session = MagicMock()
+        session.get.return_value = search_response
+        client = MagicMock()
+        client.messages.create.return_value = SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=json.dumps(CLAUDE_RESULT))], stop_reason="end_turn"
+        )
+        body = {"image_url": "https://example.com/monet.jpg"}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cassette.jsonl")
+            with patch.dict(os.environ, {"SEARCHAPI_KEY": "sk-search-123"}):
+                with patch.object(server, "_cassette", UpstreamCassette(path, "record")), \
+                     patch.object(server, "UPSTREAM_CASSETTE_MODE", "record"), \
+                     patch.object(server, "_searchapi_session", session), \
+                     patch.object(server, "_anthropic_client", client):
+                    recorded = TestClient(server.app).post("/identify", json=body)
+
+            with open(path, encoding="utf-8") as f:
+                cassette_text = f.read()
+
+            offline = MagicMock(side_effect=AssertionError("network used during replay"))
+            with patch.object(server, "_cassette", UpstreamCassette(path, "replay", timing="none")), \
+                 patch.object(server, "UPSTREAM_CASSETTE_MODE", "replay"), \
+                 patch.object(server, "_get_searchapi_session", offline), \
+                 patch.object(server, "_get_anthropic_client", offline):
+                replayed = TestClient(server.app).post("/identify", json=body)
+
+        self.assertEqual(recorded.status_code, 200)
+        self.assertEqual(session.get.call_args.kwargs["params"]["api_key"], "sk-search-123")
+        self.assertNotIn("sk-search-123", cassette_text)
+        self.assertEqual([json.loads(line)["upstream"] for line in cassette_text.splitlines()], ["searchapi", "claude"])
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), recorded.json())
+
+    def test_benchmark_replays_a_recording_made_with_the_artist_memo_enabled(self):
+        from artist_memo import ArtistMarketMemo
+        from upstream_cassette import benchmark
+
+        server = import_server()
+        answers = {
+            "https://example.com/unpriced.jpg": 'Results show "Water Lilies" by Claude Monet, 1906.',
+            "https://example.com/priced.jpg": 'Results show "Water Lilies" by Claude Monet, sold for $20,000,000 - $40,000,000.',
+        }
+        session = MagicMock()
+        session.get.side_effect = lambda *args, **kwargs: MagicMock(
+            **{"json.return_value": {"answer": answers[kwargs["params"]["url"]]}}
+        )
+        client = MagicMock()
+        client.messages.create.return_value = SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=json.dumps(CLAUDE_RESULT))], stop_reason="end_turn"
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cassette.jsonl")
+            memo = ArtistMarketMemo(os.path.join(tmp, "memo.sqlite3"))
+            memo.record(CLAUDE_RESULT, source="text")
+            with patch.dict(os.environ, {"SEARCHAPI_KEY": "sk-search-123"}), \
+                 patch.object(server, "ARTIST_MEMO_ENABLED", True), \
+                 patch.object(server, "_artist_memo", memo), \
+                 patch.object(server, "_searchapi_session", session), \
+                 patch.object(server, "_anthropic_client", client):
+                # The priced request would give the memo enough samples to change the unpriced prompt on replay
+                with patch.object(server, "_cassette", UpstreamCassette(path, "record")), \
+                     patch.object(server, "UPSTREAM_CASSETTE_MODE", "record"):
+                    for image_url in answers:
+                        TestClient(server.app).post("/identify", json={"image_url": image_url})
+
+                with patch.object(server, "_cassette", None), \
+                     patch.object(server, "UPSTREAM_CASSETTE_MODE", "off"):
+                    report = benchmark(path, "none", runs=2)
+
+        self.assertEqual(report["failures"], 0)
+        self.assertEqual(report["requests"], 4)
+        self.assertEqual(memo.stats()["recorded"], 1)
+
+    def test_retries_replay_in_order_and_errors_are_reraised(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cassette.jsonl")
+            recorder = UpstreamCassette(path, "record")
+            request = {"engine": "google_lens", "url": "https://example.com/a.jpg"}
+            with self.assertRaises(requests.HTTPError):
+                recorder.exchange("searchapi", request, MagicMock(side_effect=requests.HTTPError("503 Server Error")))
+            recorder.exchange("searchapi", request, lambda: {"answer": "first"})
+            recorder.exchange("searchapi", request, lambda: {"answer": "second"})
+
+            player = UpstreamCassette(path, "replay", timing="none")
+            with self.assertRaises(requests.HTTPError):
+                player.exchange("searchapi", request, None)
+            answers = [player.exchange("searchapi", request, None)["answer"] for _ in range(3)]
+            with self.assertRaises(CassetteMiss):
+                player.exchange("searchapi", dict(request, url="https://example.com/b.jpg"), None)
+
+        self.assertEqual(answers, ["first", "second", "second"])
+        self.assertEqual(player.stats()["misses"], 1)
+
+    def test_median_timing_normalizes_replay_latency(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cassette.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                for i, elapsed in enumerate((100.0, 300.0, 2000.0)):
+                    f.write(json.dumps({
+                        "upstream": "claude", "key": f"k{i}", "request": {}, "response": {}, "elapsed_ms": elapsed
+                    }) + "\n")
+
+            with patch("upstream_cassette.time.sleep") as sleep, \
+                 patch("upstream_cassette.request_key", side_effect=["k0", "k2"]):
+                player = UpstreamCassette(path, "replay", timing="median")
+                player.exchange("claude", {}, None)
+                player.exchange("claude", {}, None)
+
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.3, 0.3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import sys
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from url_canonicalizer import canonicalize_url, register_rule, replay, _RULES
+
+
+class CanonicalizeUrlTest(unittest.TestCase):
+    def test_cloudinary_ignores_transformations_version_and_scheme(self):
+        base = "https://res.cloudinary.com/demo/image/upload/v1712345678/artworks/abc123.jpg"
+        variants = [
+            "http://res.cloudinary.com/demo/image/upload/artworks/abc123.jpg",
+            "https://res.cloudinary.com/demo/image/upload/w_300,h_200,c_fill/v99/artworks/abc123.jpg",
+            "https://res.cloudinary.com/demo/image/upload/s--AbCdEf12--/f_auto/q_auto/artworks/abc123.jpg",
+        ]
+        expected = "https://res.cloudinary.com/demo/image/upload/artworks/abc123.jpg"
+        self.assertEqual(canonicalize_url(base), expected)
+        for variant in variants:
+            self.assertEqual(canonicalize_url(variant), expected)
+
+    def test_cloudinary_keeps_public_id_folders(self):
+        cats = canonicalize_url("https://res.cloudinary.com/demo/image/upload/v1/my_cats/photo.jpg")
+        dogs = canonicalize_url("https://res.cloudinary.com/demo/image/upload/v1/my_dogs/photo.jpg")
+        self.assertEqual(cats, "https://res.cloudinary.com/demo/image/upload/my_cats/photo.jpg")
+        self.assertNotEqual(cats, dogs)
+        self.assertEqual(canonicalize_url("https://res.cloudinary.com/demo/image/upload/my_cats/photo.jpg"), cats)
+        # Folders after the version are never stripped, even when they look like a transformation
+        self.assertEqual(
+            canonicalize_url("https://res.cloudinary.com/demo/image/upload/w_300/v2/w_folder/photo.jpg"),
+            "https://res.cloudinary.com/demo/image/upload/w_folder/photo.jpg",
+        )
+
+    def test_instagram_cdn_ignores_host_shard_and_signature(self):
+        first = "https://scontent-lax3-1.cdninstagram.com/v/t51.2885-15/123_456_n.jpg?stp=dst&_nc_ht=x&oh=aa&oe=11"
+        second = "https://scontent-ord5-2.cdninstagram.com/v/t51.2885-15/123_456_n.jpg?oh=bb&oe=22"
+        self.assertEqual(canonicalize_url(first), canonicalize_url(second))
+        self.assertNotEqual(
+            canonicalize_url(first),
+            canonicalize_url("https://scontent-lax3-1.cdninstagram.com/v/t51.2885-15/789_456_n.jpg?oh=aa"),
+        )
+
+    def test_instagram_post_drops_share_params(self):
+        self.assertEqual(
+            canonicalize_url("http://instagram.com/p/Cxyz123/?igsh=abc"),
+            "https://www.instagram.com/p/Cxyz123/",
+        )
+
+    def test_generic_keeps_content_params_and_drops_tracking_and_signing(self):
+        a = canonicalize_url("https://Example.com/img?id=7&size=l&utm_source=x&X-Amz-Signature=s1")
+        b = canonicalize_url("https://example.com:443/img?size=l&id=7&X-Amz-Signature=s2&fbclid=f")
+        self.assertEqual(a, "https://example.com/img?id=7&size=l")
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, canonicalize_url("https://example.com/img?id=8&size=l"))
+
+    def test_unparseable_urls_pass_through(self):
+        self.assertEqual(canonicalize_url("not a url"), "not a url")
+        self.assertIsNone(canonicalize_url(None))
+
+    def test_registered_rule_takes_precedence(self):
+        rules = list(_RULES)
+        try:
+            register_rule(lambda host: host == "cdn.example.org", lambda host, path, query: f"cdn:{path}")
+            self.assertEqual(canonicalize_url("https://cdn.example.org/a.jpg?x=1"), "cdn:/a.jpg")
+        finally:
+            _RULES[:] = rules
+
+
+class ReplayTest(unittest.TestCase):
+    def test_replay_counts_hits_per_key_function(self):
+        report = replay([
+            "https://res.cloudinary.com/demo/image/upload/w_100/a.jpg",
+            "https://res.cloudinary.com/demo/image/upload/w_300/a.jpg",
+            "https://example.com/img?id=1",
+            "https://example.com/img?id=2",
+        ])
+        self.assertEqual(report["urls"], 4)
+        self.assertEqual(report["raw"]["hits"], 0)
+        self.assertEqual(report["canonical"]["hits"], 1)
+        # Legacy normalization merged two different images
+        self.assertEqual(report["legacy"]["hits"], 1)
+        self.assertEqual(report["canonical"]["distinct_keys"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
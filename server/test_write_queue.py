@@ -0,0 +1,137 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+server_dir = Path(__file__).resolve().parent
+if str(server_dir) not in sys.path:
+    sys.path.insert(0, str(server_dir))
+
+from write_queue import WriteQueue
+
+
+class WriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "queue.sqlite3")
+        self.calls = []
+        self.fail_payloads = set()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_queue(self, **kwargs):
+        def handler(op):
+            def write(payloads):
+                self.calls.append((op, [p["n"] for p in payloads]))
+                if self.fail_payloads & {p["n"] for p in payloads}:
+                    raise RuntimeError("write rejected")
+            return write
+
+        kwargs.setdefault("flush_interval", 60)
+        kwargs.setdefault("base_backoff", 0)
+        queue = WriteQueue("test", {"row": handler("row"), "ref": handler("ref")}, path=self.path, **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_batches_per_op_in_key_and_dependency_order(self):
+        queue = self.make_queue()
+
+        self.assertTrue(queue.submit("row", {"n": 1}, key="a"))
+        self.assertTrue(queue.submit("row", {"n": 2}, key="a"))
+        self.assertTrue(queue.submit("row", {"n": 3}, key="b"))
+        self.assertTrue(queue.submit("ref", {"n": 4}, key="r", after_key="a"))
+        self.assertEqual(self.calls, [])
+
+        self.assertEqual(queue.flush(), 4)
+        # Second write to "a" waits for the first; the ref waits until "a" is drained
+        self.assertEqual(self.calls, [("row", [1, 3]), ("row", [2]), ("ref", [4])])
+        stats = queue.stats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["written"], 4)
+        self.assertIsNotNone(stats["write_lag_p95_ms"])
+
+    def test_failed_batch_is_retried_one_by_one_then_given_up(self):
+        queue = self.make_queue(max_attempts=3)
+        self.fail_payloads = {2}
+        for n in (1, 2, 3):
+            queue.submit("row", {"n": n}, key=f"k{n}")
+        queue.submit("row", {"n": 4}, key="k2")
+
+        self.assertEqual(queue.flush(), 3)
+        # Once given up on, 2 no longer holds back the write queued behind it on the same key
+        self.assertEqual(
+            self.calls,
+            [("row", [1, 2, 3]), ("row", [1]), ("row", [2]), ("row", [3]), ("row", [2]), ("row", [4])]
+        )
+        self.assertEqual([dead["payload"]["n"] for dead in queue.dead_writes()], [2])
+        stats = queue.stats()
+        self.assertEqual((stats["pending"], stats["dead_writes"], stats["retries"]), (0, 1, 4))
+
+    def test_dependents_of_a_given_up_write_are_given_up_with_it(self):
+        queue = self.make_queue(max_attempts=2)
+        self.fail_payloads = {1}
+        queue.submit("row", {"n": 1}, key="a")
+        queue.submit("ref", {"n": 2}, key="r", after_key="a")
+        queue.submit("row", {"n": 3}, key="b")
+
+        self.assertEqual(queue.flush(), 1)
+        # The ref is never sent: the row it refers to was never written
+        self.assertEqual(self.calls, [("row", [1, 3]), ("row", [1]), ("row", [3])])
+        dead = queue.dead_writes()
+        self.assertEqual(sorted(d["payload"]["n"] for d in dead), [1, 2])
+        self.assertIn("given up on", next(d for d in dead if d["op"] == "ref")["last_error"])
+        stats = queue.stats()
+        self.assertEqual((stats["pending"], stats["dead_writes"], stats["given_up"]), (0, 2, 2))
+
+    def test_close_drains_writes_that_are_still_backing_off(self):
+        queue = self.make_queue(base_backoff=3600)
+        self.fail_payloads = {1}
+        queue.submit("row", {"n": 1}, key="a")
+        queue.submit("row", {"n": 2}, key="a")
+        self.assertEqual(queue.flush(), 0)
+        self.assertEqual(queue.flush(), 0)
+
+        self.fail_payloads = set()
+        queue.close()
+
+        self.assertEqual(self.calls, [("row", [1]), ("row", [1]), ("row", [2])])
+        self.assertEqual(queue.stats()["pending"], 0)
+
+    def test_close_gives_each_failing_write_one_more_attempt(self):
+        queue = self.make_queue(base_backoff=3600)
+        self.fail_payloads = {1}
+        queue.submit("row", {"n": 1}, key="a")
+        queue.flush()
+
+        queue.close()
+
+        self.assertEqual(self.calls, [("row", [1]), ("row", [1])])
+        self.assertEqual(queue.stats()["pending"], 1)
+
+    def test_full_queue_writes_inline_unless_ordering_requires_queueing(self):
+        queue = self.make_queue(max_pending=1)
+
+        self.assertTrue(queue.submit("row", {"n": 1}, key="a"))
+        self.assertFalse(queue.submit("row", {"n": 2}, key="b"))
+        self.assertTrue(queue.submit("ref", {"n": 3}, key="r", after_key="a"))
+        self.assertEqual(self.calls, [("row", [2])])
+
+        stats = queue.stats()
+        self.assertEqual((stats["pending"], stats["inline_writes"], stats["overflow"]), (2, 1, 1))
+
+    def test_queued_writes_survive_restart(self):
+        first = self.make_queue()
+        first.submit("row", {"n": 1}, key="a")
+        # Stop without the shutdown flush, as a crash would
+        first._closed = True
+        first._stop_event.set()
+        first._wake_event.set()
+
+        self.assertEqual(self.make_queue().flush(), 1)
+        self.assertEqual(self.calls, [("row", [1])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+"""
+Record and replay upstream traffic (SearchAPI, Claude) for reproducible benchmarks.
+
+In record mode every upstream exchange the server makes is appended to a
+cassette, one JSON object per line:
+
+    {"upstream": "searchapi", "key": "...", "request": {...}, "response": {...}, "elapsed_ms": 1834.2}
+
+Credentials never reach the cassette: api_key/authorization fields are dropped
+and any occurrence of SEARCHAPI_KEY or ANTHROPIC_API_KEY is replaced before a
+line is written.
+
+In replay mode the same requests are answered from the cassette without any
+network access, so _call_searchapi and _parse_with_claude see identical
+content on every run. Timing is one of:
+    recorded  each exchange takes as long as it did when recorded
+    median    each exchange takes its upstream's median recorded latency
+    none      no delay (pure pipeline CPU time)
+
+A request recorded several times (retries) replays its responses in order and
+then keeps repeating the last one. A request that was never recorded raises
+CassetteMiss.
+
+While a cassette is active the server bypasses its result cache and artist
+memo. Both are state left by earlier requests: the memo changes which prompt
+Claude gets, so a replay would otherwise ask for requests that were never
+recorded.
+
+Benchmark the pipeline offline against a cassette with:
+    python upstream_cassette.py bench cassette.jsonl [--timing median] [--runs 3]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from latency_stats import percentile
+
+MODES = ("off", "record", "replay")
+TIMINGS = ("recorded", "median", "none")
+
+_SECRET_FIELDS = {"api_key", "x-api-key", "authorization"}
+_SECRET_ENV_VARS = ("SEARCHAPI_KEY", "ANTHROPIC_API_KEY")
+REDACTED = "<redacted>"
+
+
+class CassetteMiss(Exception):
+    """Replay mode got a request the cassette has no recording for"""
+
+
+class ReplayedUpstreamError(Exception):
+    """A recorded upstream failure that is not a requests exception"""
+
+
+def redact(value: Any, secrets: List[str]) -> Any:
+    """Copy of value with credential fields dropped and secret strings masked"""
+    if isinstance(value, dict):
+        return {
+            key: redact(item, secrets)
+            for key, item in value.items()
+            if str(key).lower() not in _SECRET_FIELDS
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, secrets) for item in value]
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+    return value
+
+
+def request_key(upstream: str, request: Dict[str, Any]) -> str:
+    canonical = json.dumps([upstream, request], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def message_to_dict(message: Any) -> Dict[str, Any]:
+    """The parts of an Anthropic Message the server reads"""
+    return {
+        'content': [
+            {'type': getattr(block, 'type', 'text'), 'text': getattr(block, 'text', None)}
+            for block in message.content
+        ],
+        'stop_reason': getattr(message, 'stop_reason', None),
+    }
+
+
+def message_from_dict(data: Dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(
+        content=[SimpleNamespace(**block) for block in data['content']],
+        stop_reason=data.get('stop_reason'),
+    )
+
+
+def _error_from_record(error: Dict[str, Any]) -> Exception:
+    exc_type = getattr(requests, error.get('type', ''), None)
+    if isinstance(exc_type, type) and issubclass(exc_type, requests.RequestException):
+        return exc_type(error.get('message'))
+    return ReplayedUpstreamError(f"{error.get('type')}: {error.get('message')}")
+
+
+class UpstreamCassette:
+    """Records upstream exchanges to, or replays them from, a JSONL cassette"""
+
+    def __init__(self, path: str, mode: str, timing: str = 'recorded'):
+        """
+        Args:
+            path: Cassette file (appended to when recording)
+            mode: 'record' or 'replay'
+            timing: Replay delay: 'recorded', 'median' or 'none'
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"cassette mode must be 'record' or 'replay', not {mode!r}")
+        if timing not in TIMINGS:
+            raise ValueError(f"replay timing must be one of {TIMINGS}, not {timing!r}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+
+        self._lock = threading.Lock()
+        # Very short values would mask ordinary text rather than a real key
+        self._secrets = [os.environ[name] for name in _SECRET_ENV_VARS if len(os.getenv(name) or '') >= 8]
+        self._recorded = 0
+        self._replayed = 0
+        self._misses = 0
+
+        self._exchanges: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        self._median_ms: Dict[str, float] = {}
+        if mode == 'replay':
+            self._load()
+
+    def _load(self):
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                exchange = json.loads(line)
+                self._exchanges[exchange['key']].append(exchange)
+                latencies[exchange['upstream']].append(exchange.get('elapsed_ms') or 0.0)
+        self._median_ms = {upstream: statistics.median(values) for upstream, values in latencies.items()}
+
+    def exchange(self, upstream: str, request: Dict[str, Any], call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Answer request: record mode runs call() and saves its JSON-serializable result
+        (or the error it raised); replay mode returns the recorded result without calling it.
+        """
+        # Keyed on the masked request: replayed responses carry the mask, so requests built from them match
+        request = redact(request, self._secrets)
+        key = request_key(upstream, request)
+        if self.mode == 'replay':
+            return self._replay(upstream, key)
+
+        started = time.perf_counter()
+        exchange = {'upstream': upstream, 'key': key, 'request': request}
+        try:
+            response = call()
+            exchange['response'] = response
+            return response
+        except Exception as e:
+            exchange['error'] = {'type': type(e).__name__, 'message': str(e)}
+            raise
+        finally:
+            exchange['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self._append(exchange)
+
+    def _append(self, exchange: Dict[str, Any]):
+        line = json.dumps(redact(exchange, self._secrets), ensure_ascii=False, default=str)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self._recorded += 1
+
+    def _replay(self, upstream: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            recorded = self._exchanges.get(key)
+            if not recorded:
+                self._misses += 1
+                raise CassetteMiss(f"No recorded {upstream} exchange for request {key[:12]}")
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            self._replayed += 1
+        exchange = recorded[min(position, len(recorded) - 1)]
+
+        if self.timing == 'recorded':
+            delay_ms = exchange.get('elapsed_ms') or 0.0
+        elif self.timing == 'median':
+            delay_ms = self._median_ms.get(upstream, 0.0)
+        else:
+            delay_ms = 0.0
+        if delay_ms:
+            time.sleep(delay_ms / 1000)
+
+        if 'error' in exchange:
+            raise _error_from_record(exchange['error'])
+        return exchange['response']
+
+    def rewind(self):
+        """Start replaying every request from its first recording again"""
+        with self._lock:
+            self._positions.clear()
+
+    def recorded_image_urls(self) -> List[str]:
+        """Image URLs of the recorded SearchAPI requests, in first-seen order"""
+        urls: List[str] = []
+        for exchanges in self._exchanges.values():
+            for exchange in exchanges:
+                url = exchange['request'].get('url') if exchange['upstream'] == 'searchapi' else None
+                if url and url not in urls:
+                    urls.append(url)
+        return urls
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'path': self.path,
+                'timing': self.timing if self.mode == 'replay' else None,
+                'recorded': self._recorded,
+                'replayed': self._replayed,
+                'misses': self._misses,
+            }
+
+
+# ============================================
+# TOOLING: offline pipeline benchmark
+# ============================================
+
+def benchmark(path: str, timing: str, runs: int) -> Dict[str, Any]:
+    """Run the identify pipeline for every image URL in the cassette, replayed, and time it"""
+    import artwork_server
+
+    cassette = UpstreamCassette(path, 'replay', timing)
+    artwork_server._cassette = cassette
+    artwork_server.UPSTREAM_CASSETTE_MODE = 'replay'
+
+    image_urls = cassette.recorded_image_urls()
+    durations: List[float] = []
+    failures = 0
+    for _ in range(runs):
+        cassette.rewind()
+        for image_url in image_urls:
+            started = time.perf_counter()
+            try:
+                artwork_server._run_identify_pipeline([image_url])
+            except Exception as e:
+                print(f"Replay of {image_url} failed: {e}", file=sys.stderr)
+                failures += 1
+                continue
+            durations.append(time.perf_counter() - started)
+
+    def percentile_ms(value: float) -> Optional[float]:
+        seconds = percentile(durations, value)
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    return {
+        'images': len(image_urls),
+        'runs': runs,
+        'timing': timing,
+        'requests': len(durations),
+        'failures': failures,
+        'p50_ms': percentile_ms(50),
+        'p95_ms': percentile_ms(95),
+        'mean_ms': round(statistics.mean(durations) * 1000, 1) if durations else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream cassette tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench = subparsers.add_parser("bench", help="Time the identify pipeline replayed from a cassette")
+    bench.add_argument("cassette")
+    bench.add_argument("--timing", choices=TIMINGS, default="median")
+    bench.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(args.cassette, args.timing, args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Canonical cache keys for image and source URLs.
+Equivalent URLs (http vs https, Cloudinary transformation/version segments,
+rotating Instagram CDN signatures, tracking parameters) map to one key so they
+share cache entries. Keys are for lookups only; always fetch with the original URL.
+
+Rules are picked per host; add one with register_rule(matches, canonicalize).
+
+Replay historical URLs to measure the hit-rate change against the old
+"strip every query parameter" normalization:
+    python url_canonicalizer.py replay [--input urls.txt] [--limit 50000]
+"""
+
+import argparse
+import json
+import re
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that never change the content a URL points to
+_TRACKING_PARAMS = {'fbclid', 'gclid', 'igsh', 'igshid', 'si', 'ref', 'ref_src', 'mc_cid', 'mc_eid'}
+# Per-request signing parameters (S3, GCS, CloudFront) that rotate for the same object
+_SIGNING_PARAM_PREFIXES = ('x-amz-', 'x-goog-')
+_SIGNING_PARAMS = {'expires', 'signature', 'key-pair-id', 'policy'}
+
+_CLOUDINARY_VERSION = re.compile(r'^v\d+$')
+_CLOUDINARY_SIGNATURE = re.compile(r'^s--[\w-]{8,}--$')
+# Transformation segments are comma-separated key_value parameters, e.g. w_300,h_200,c_fill.
+# Only real parameter keys count, so public-ID folders like my_cats/ are kept.
+_CLOUDINARY_PARAM = (
+    r'(?:a|ac|af|ar|b|bo|br|c|co|cs|d|dl|dn|dpr|du|e|eo|f|fl|fn|fps|g|h|if|ki|l|o|p|pg|q|r|so|sp|t|u|vc|vs|w|x|y|z)'
+    r'_[^/,]+'
+)
+_CLOUDINARY_TRANSFORMATION = re.compile(rf'^{_CLOUDINARY_PARAM}(?:,{_CLOUDINARY_PARAM})*$')
+_CLOUDINARY_DELIVERY_TYPES = {'upload', 'fetch', 'private', 'authenticated'}
+
+Rule = Tuple[Callable[[str], bool], Callable[[str, str, str], str]]
+_RULES: List[Rule] = []
+
+
+def register_rule(matches: Callable[[str], bool], canonicalize: Callable[[str, str, str], str]):
+    """
+    Register a host rule. matches(host) selects it; canonicalize(host, path, query)
+    returns the canonical URL. Rules registered later take precedence.
+    """
+    _RULES.insert(0, (matches, canonicalize))
+
+
+def _filtered_query(query: str) -> str:
+    params = [
+        (key, value)
+        for key, value in parse_qsl(query, keep_blank_values=True)
+        if not key.lower().startswith('utm_')
+        and key.lower() not in _TRACKING_PARAMS
+        and key.lower() not in _SIGNING_PARAMS
+        and not key.lower().startswith(_SIGNING_PARAM_PREFIXES)
+    ]
+    return urlencode(sorted(params))
+
+
+def _generic(host: str, path: str, query: str) -> str:
+    return urlunsplit(('https', host, path or '/', _filtered_query(query), ''))
+
+
+def _cloudinary(host: str, path: str, query: str) -> str:
+    """res.cloudinary.com/<cloud>/<resource>/<type>/[transformations/][v123/]<public_id>"""
+    segments = path.strip('/').split('/')
+    if len(segments) < 4 or segments[2] not in _CLOUDINARY_DELIVERY_TYPES:
+        return _generic(host, path, query)
+
+    prefix, rest = segments[:3], segments[3:]
+    # Signature and transformations come first, then an optional version; everything after is the public ID
+    index = 0
+    while index < len(rest) - 1 and (
+        _CLOUDINARY_SIGNATURE.match(rest[index]) or _CLOUDINARY_TRANSFORMATION.match(rest[index])
+    ):
+        index += 1
+    if index < len(rest) - 1 and _CLOUDINARY_VERSION.match(rest[index]):
+        index += 1
+    rest = rest[index:]
+
+    return urlunsplit(('https', host, '/' + '/'.join(prefix + rest), '', ''))
+
+
+def _instagram_cdn(host: str, path: str, query: str) -> str:
+    """The file name identifies the media; host shards and signed query params rotate."""
+    file_name = path.rstrip('/').rsplit('/', 1)[-1]
+    return f"https://cdninstagram.com/{file_name}"
+
+
+def _instagram_post(host: str, path: str, query: str) -> str:
+    """Post/reel share links: the query only carries share tracking like ?igsh="""
+    return urlunsplit(('https', 'www.instagram.com', path, '', ''))
+
+
+register_rule(lambda host: True, _generic)
+register_rule(lambda host: host == 'res.cloudinary.com', _cloudinary)
+register_rule(lambda host: host.endswith('.cdninstagram.com') or host.endswith('.fbcdn.net'), _instagram_cdn)
+register_rule(lambda host: host in {'instagram.com', 'www.instagram.com', 'm.instagram.com'}, _instagram_post)
+
+
+def canonicalize_url(url: Optional[str]) -> Optional[str]:
+    """Canonical cache key for a URL; returns the input unchanged if it can't be parsed"""
+    if not url:
+        return url
+
+    try:
+        parts = urlsplit(url.strip())
+        if not parts.scheme or not parts.netloc:
+            return url
+
+        host = (parts.hostname or '').lower()
+        if parts.port and parts.port not in (80, 443):
+            host = f"{host}:{parts.port}"
+
+        for matches, canonicalize in _RULES:
+            if matches(host):
+                return canonicalize(host, parts.path, parts.query)
+    except Exception:
+        pass
+
+    return url
+
+
+def legacy_normalize_url(url: str) -> str:
+    """The previous normalization: keep scheme, host and path, drop every query parameter"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def replay(urls: Iterable[str]) -> dict:
+    """Simulate an unbounded cache over the URLs in order and compare key functions"""
+    key_functions = {
+        'raw': lambda url: url,
+        'legacy': legacy_normalize_url,
+        'canonical': canonicalize_url,
+    }
+    seen = {name: set() for name in key_functions}
+    hits = {name: 0 for name in key_functions}
+    total = 0
+
+    for url in urls:
+        total += 1
+        for name, key_function in key_functions.items():
+            key = key_function(url)
+            if key in seen[name]:
+                hits[name] += 1
+            else:
+                seen[name].add(key)
+
+    report = {'urls': total}
+    for name in key_functions:
+        report[name] = {
+            'hits': hits[name],
+            'hit_rate': hits[name] / total if total else None,
+            'distinct_keys': len(seen[name]),
+        }
+    return report
+
+
+def _historical_urls(limit: int) -> List[str]:
+    """source_url and image_url values from the database, oldest first"""
+    from supabase_client import supabase_manager
+
+    if not supabase_manager.enabled:
+        raise SystemExit("Supabase is not configured; pass --input or set SUPABASE_URL and SUPABASE_SERVICE_KEY")
+
+    urls = []
+    for table, column in (('user_searches', 'source_url'), ('image_cache', 'image_url')):
+        rows = supabase_manager.client.table(table)\
+            .select(f'{column}, created_at')\
+            .not_.is_(column, 'null')\
+            .order('created_at')\
+            .limit(limit)\
+            .execute().data or []
+        urls.extend((row['created_at'], row[column]) for row in rows)
+
+    return [url for _, url in sorted(urls)][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canonical URL cache key tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    replay_parser = subparsers.add_parser('replay', help='Compare cache hit rates over historical URLs')
+    replay_parser.add_argument('--input', help='File with one URL per line (defaults to database history)')
+    replay_parser.add_argument('--limit', type=int, default=50000)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()][:args.limit]
+    else:
+        urls = _historical_urls(args.limit)
+
+    print(json.dumps(replay(urls), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""
+Durable background write queue for Worthify backend.
+Database writes that do not decide the response (result cache rows, search
+history, Instagram URL cache) are appended to a node-local SQLite queue and
+the request returns at once; a background thread writes them to the database
+in batches.
+
+Ordering: every write has a key, and a write is only attempted once every
+earlier write with the same key has succeeded or been given up on. A write
+can also name an after_key it depends on (a user search waits for the
+image_cache row it references) without serializing everything else under
+that key.
+
+Durability: the queue is SQLite in WAL mode with synchronous=FULL, so a write
+that was accepted survives a process crash and is sent by the next process
+that flushes the same file - but only as long as the file itself survives.
+WRITE_QUEUE_PATH must be on a persistent disk; the default under the temp
+directory, like any path on Render's ephemeral filesystem, is wiped on every
+deploy and restart, and whatever was still queued is lost. Claimed writes are
+leased; if a worker dies mid-flush another one retries them after the lease
+expires. Writes are therefore delivered at least once and handlers must be
+idempotent.
+
+Shutdown: close() drains the queue, giving every write still waiting (even one
+backing off from an earlier failure) one more attempt. Whatever fails then
+stays queued for the next process, which only helps on a persistent disk.
+
+Retries: a failed batch backs off as a whole (one round trip per outage, not
+one per write); on the retry its writes are sent one by one so a single bad
+write cannot hold up the rest. After max_attempts a write is moved to the
+dead_writes table with its last error, together with every queued write that
+named its key as after_key (they could only fail the same way).
+
+Backpressure: once max_pending writes are waiting, submit() writes inline on
+the caller's thread instead of queueing, so the request pays the round trip
+again but the queue stays bounded. A write whose key or after_key still has
+queued writes is queued anyway to keep its ordering.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from latency_stats import percentile
+
+WRITE_QUEUE_PATH = os.getenv(
+    "WRITE_QUEUE_PATH", os.path.join(tempfile.gettempdir(), "worthify_write_queue.sqlite3")
+)
+WRITE_QUEUE_MAX_PENDING = int(os.getenv("WRITE_QUEUE_MAX_PENDING", "10000"))
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "50"))
+WRITE_QUEUE_FLUSH_INTERVAL = float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", "0.5"))
+WRITE_QUEUE_MAX_ATTEMPTS = int(os.getenv("WRITE_QUEUE_MAX_ATTEMPTS", "8"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    key TEXT NOT NULL,
+    after_key TEXT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_writes_key ON writes (key, seq);
+CREATE TABLE IF NOT EXISTS dead_writes (
+    seq INTEGER PRIMARY KEY,
+    op TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    enqueued_at REAL NOT NULL,
+    failed_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+# Writes that are due, unclaimed, first in line for their key and not waiting on their after_key
+_CLAIM_SQL = """
+SELECT seq, op, key, payload, attempts, enqueued_at FROM writes w
+WHERE next_attempt_at <= :due AND claimed_until <= :now
+  AND NOT EXISTS (SELECT 1 FROM writes p WHERE p.key = w.key AND p.seq < w.seq)
+  AND (w.after_key IS NULL
+       OR NOT EXISTS (SELECT 1 FROM writes d WHERE d.key = w.after_key AND d.seq < w.seq))
+ORDER BY seq
+LIMIT :limit
+"""
+
+
+class WriteQueue:
+    """SQLite-backed queue of database writes, flushed in batches by a background thread"""
+
+    def __init__(
+        self,
+        name: str,
+        handlers: Dict[str, Callable[[List[Dict[str, Any]]], None]],
+        path: str = WRITE_QUEUE_PATH,
+        max_pending: int = WRITE_QUEUE_MAX_PENDING,
+        batch_size: int = WRITE_QUEUE_BATCH_SIZE,
+        flush_interval: float = WRITE_QUEUE_FLUSH_INTERVAL,
+        max_attempts: int = WRITE_QUEUE_MAX_ATTEMPTS,
+        base_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        lease: float = 60.0,
+        window: int = 1000
+    ):
+        """
+        Args:
+            name: Label used in log output and thread names
+            handlers: op -> function writing a list of payloads; raising fails the whole list
+            path: SQLite file; every process using the same path shares the queue
+            max_pending: Queued writes beyond which submit() writes inline
+            batch_size: Writes claimed per batch, and queued writes that wake the flush thread early
+            flush_interval: Seconds between background flushes
+            max_attempts: Attempts before a write is moved to dead_writes
+            base_backoff: Seconds before the first retry; doubled per attempt up to max_backoff
+            lease: Seconds a claimed write is hidden from other flushers
+            window: Recent enqueue-to-write delays kept for percentiles
+        """
+        self.name = name
+        self.path = path
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self._handlers = handlers
+
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._queued_since_flush = 0
+
+        self._enqueued = 0
+        self._inline_writes = 0
+        self._overflow = 0
+        self._written = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._retries = 0
+        self._dead = 0
+        self._errors = 0
+        self._lags: Deque[float] = deque(maxlen=window)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Unlike the result cache, an accepted write must survive power loss
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def submit(self, op: str, payload: Dict[str, Any], key: str, after_key: Optional[str] = None) -> bool:
+        """
+        Queue a write, or perform it inline when the queue is full or unusable.
+        Returns True if it was queued; inline writes return False and raise the handler's error.
+        """
+        if op not in self._handlers:
+            raise ValueError(f"{self.name} write queue has no handler for {op!r}")
+
+        if not self._closed:
+            try:
+                queued = self._insert(op, payload, key, after_key)
+            except sqlite3.Error as e:
+                self._count('_errors')
+                print(f"{self.name} write queue error, writing inline: {e}")
+                queued = False
+            if queued:
+                self._ensure_started()
+                return True
+
+        self._count('_inline_writes')
+        self._handlers[op]([payload])
+        return False
+
+    def _insert(self, op: str, payload: Dict[str, Any], key: str, after_key: Optional[str]) -> bool:
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            pending = conn.execute('SELECT COUNT(*) FROM writes').fetchone()[0]
+            overflow = False
+            if pending >= self.max_pending:
+                # Writing inline would jump ahead of queued writes this one must follow
+                keys = [key] if after_key is None else [key, after_key]
+                blocked = conn.execute(
+                    f"SELECT 1 FROM writes WHERE key IN ({','.join('?' * len(keys))}) LIMIT 1", keys
+                ).fetchone()
+                if blocked is None:
+                    conn.execute('COMMIT')
+                    return False
+                overflow = True
+            conn.execute(
+                'INSERT INTO writes (op, key, after_key, payload, next_attempt_at, enqueued_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (op, key, after_key, json.dumps(payload, ensure_ascii=False, separators=(',', ':')), now, now)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        with self._lock:
+            self._enqueued += 1
+            self._overflow += overflow
+            self._queued_since_flush += 1
+            wake = self._queued_since_flush >= self.batch_size
+        if wake:
+            self._wake_event.set()
+        return True
+
+    def flush(self, drain: bool = False) -> int:
+        """
+        Write every queued write that is due, in batches. Returns the number written.
+        With drain, writes still backing off are attempted too, each at most once.
+        """
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                self._queued_since_flush = 0
+            while True:
+                try:
+                    batch = self._claim(drain)
+                except sqlite3.Error as e:
+                    self._count('_errors')
+                    print(f"{self.name} write queue claim error: {e}")
+                    break
+                if not batch:
+                    break
+                written += self._write_batch(batch, drain)
+        return written
+
+    def _claim(self, drain: bool = False) -> List[Dict[str, Any]]:
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                _CLAIM_SQL, {'now': now, 'due': float('inf') if drain else now, 'limit': self.batch_size}
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    f"UPDATE writes SET claimed_until = ? WHERE seq IN ({','.join('?' * len(rows))})",
+                    [now + self.lease] + [row[0] for row in rows]
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return [
+            {
+                'seq': seq, 'op': op, 'key': key, 'payload': json.loads(payload),
+                'attempts': attempts, 'enqueued_at': enqueued_at,
+            }
+            for seq, op, key, payload, attempts, enqueued_at in rows
+        ]
+
+    def _write_batch(self, batch: List[Dict[str, Any]], drain: bool = False) -> int:
+        # One group per op; writes that already failed once go alone so they cannot sink the others
+        groups: Dict[Any, List[Dict[str, Any]]] = {}
+        for item in batch:
+            group_key = (item['op'], item['seq']) if item['attempts'] else (item['op'], None)
+            groups.setdefault(group_key, []).append(item)
+
+        written = 0
+        for (op, _), items in groups.items():
+            try:
+                self._handlers[op]([item['payload'] for item in items])
+            except Exception as e:
+                self._count('_failed_batches')
+                print(f"{self.name} write queue {op} batch of {len(items)} failed: {e}")
+                self._fail(items, str(e), hold=drain)
+                continue
+
+            self._finish(items)
+            written += len(items)
+        return written
+
+    def _finish(self, items: List[Dict[str, Any]]):
+        now = time.time()
+        try:
+            self._connection().execute(
+                f"DELETE FROM writes WHERE seq IN ({','.join('?' * len(items))})",
+                [item['seq'] for item in items]
+            )
+        except sqlite3.Error as e:
+            # The lease runs out and the writes are sent again; handlers are idempotent
+            self._count('_errors')
+            print(f"{self.name} write queue delete error: {e}")
+        with self._lock:
+            self._written += len(items)
+            self._batches += 1
+            self._lags.extend(now - item['enqueued_at'] for item in items)
+
+    def _fail(self, items: List[Dict[str, Any]], error: str, hold: bool = False):
+        """Back off or give up on failed writes; with hold they stay claimed until the lease ends"""
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for item in items:
+                    attempts = item['attempts'] + 1
+                    if attempts >= self.max_attempts:
+                        conn.execute(
+                            'INSERT OR REPLACE INTO dead_writes '
+                            '(seq, op, key, payload, attempts, enqueued_at, failed_at, last_error) '
+                            'SELECT seq, op, key, payload, ?, enqueued_at, ?, ? FROM writes WHERE seq = ?',
+                            (attempts, now, error, item['seq'])
+                        )
+                        conn.execute('DELETE FROM writes WHERE seq = ?', (item['seq'],))
+                        print(f"{self.name} write queue gave up on {item['op']} write {item['seq']}: {error}")
+                        self._count('_dead')
+                        self._bury_dependents(conn, item, now)
+                    else:
+                        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+                        conn.execute(
+                            'UPDATE writes SET attempts = ?, next_attempt_at = ?, claimed_until = ?, '
+                            'last_error = ? WHERE seq = ?',
+                            (attempts, now + delay, now + self.lease if hold else 0, error, item['seq'])
+                        )
+                        self._count('_retries')
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            self._count('_errors')
+            print(f"{self.name} write queue retry bookkeeping error: {e}")
+
+    def _bury_dependents(self, conn: sqlite3.Connection, item: Dict[str, Any], now: float):
+        """Move writes that depend on a given-up write's key to dead_writes; they would only fail the same way"""
+        keys = [item['key']]
+        while keys:
+            key = keys.pop()
+            rows = conn.execute(
+                'SELECT seq, op, key FROM writes WHERE after_key = ? AND seq > ?', (key, item['seq'])
+            ).fetchall()
+            for seq, op, dependent_key in rows:
+                conn.execute(
+                    'INSERT OR REPLACE INTO dead_writes '
+                    '(seq, op, key, payload, attempts, enqueued_at, failed_at, last_error) '
+                    'SELECT seq, op, key, payload, attempts, enqueued_at, ?, ? FROM writes WHERE seq = ?',
+                    (now, f"depends on {item['op']} write {item['seq']}, which was given up on", seq)
+                )
+                conn.execute('DELETE FROM writes WHERE seq = ?', (seq,))
+                print(f"{self.name} write queue gave up on {op} write {seq}: depends on write {item['seq']}")
+                self._count('_dead')
+                keys.append(dependent_key)
+
+    def close(self):
+        """Stop the background thread and drain the queue, retrying writes that are backing off once more"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5.0)
+        self.flush(drain=True)
+
+    def dead_writes(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent writes that were given up on"""
+        rows = self._connection().execute(
+            'SELECT seq, op, key, payload, attempts, enqueued_at, failed_at, last_error '
+            'FROM dead_writes ORDER BY failed_at DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [
+            {
+                'seq': seq, 'op': op, 'key': key, 'payload': json.loads(payload), 'attempts': attempts,
+                'enqueued_at': enqueued_at, 'failed_at': failed_at, 'last_error': last_error,
+            }
+            for seq, op, key, payload, attempts, enqueued_at, failed_at, last_error in rows
+        ]
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-process counters; pending, oldest and dead counts are shared by all processes"""
+        try:
+            conn = self._connection()
+            pending, oldest = conn.execute('SELECT COUNT(*), MIN(enqueued_at) FROM writes').fetchone()
+            dead = conn.execute('SELECT COUNT(*) FROM dead_writes').fetchone()[0]
+        except sqlite3.Error:
+            pending = oldest = dead = None
+
+        with self._lock:
+            lags = list(self._lags)
+            p50 = percentile(lags, 50)
+            p95 = percentile(lags, 95)
+            return {
+                'name': self.name,
+                'path': self.path,
+                'pending': pending,
+                'max_pending': self.max_pending,
+                'oldest_pending_seconds': time.time() - oldest if oldest is not None else None,
+                'dead_writes': dead,
+                'enqueued': self._enqueued,
+                'inline_writes': self._inline_writes,
+                'overflow': self._overflow,
+                'written': self._written,
+                'batches': self._batches,
+                'failed_batches': self._failed_batches,
+                'retries': self._retries,
+                'given_up': self._dead,
+                'errors': self._errors,
+                'write_lag_p50_ms': p50 * 1000 if p50 is not None else None,
+                'write_lag_p95_ms': p95 * 1000 if p95 is not None else None,
+            }
+
+    def _ensure_started(self):
+        """Start the background flush thread on first use"""
+        if self._thread is not None or self._closed:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"{self.name}-write-queue",
+                daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.flush_interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            self.flush()
@@ -0,0 +1,94 @@
+-- Query plans for check_cache_by_source: user_searches history scan vs image_cache_sources.
+-- Runs against a throwaway schema in any local Postgres (e.g. `supabase start`):
+--
+--     psql "$LOCAL_DATABASE_URL" -f supabase/benchmarks/source_lookup_plans.sql
+--
+-- Seeds 200k searches over 50k source URLs, builds the mapping the same way the
+-- 20261019000800 migration backfills it, then EXPLAIN ANALYZEs both lookups for
+-- a URL in its three lookup forms (raw, canonical, legacy normalized).
+
+\set ON_ERROR_STOP on
+\timing off
+
+DROP SCHEMA IF EXISTS source_lookup_bench CASCADE;
+CREATE SCHEMA source_lookup_bench;
+SET search_path = source_lookup_bench;
+
+CREATE TABLE image_cache (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    image_url TEXT,
+    expires_at TIMESTAMP WITH TIME ZONE,
+    search_results JSONB
+);
+
+CREATE TABLE user_searches (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL,
+    image_cache_id UUID REFERENCES image_cache(id),
+    source_url TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+-- Indexes user_searches has from earlier migrations
+CREATE INDEX ON user_searches (user_id, created_at DESC, id DESC);
+CREATE INDEX ON user_searches (image_cache_id);
+
+INSERT INTO image_cache (image_url, expires_at, search_results)
+SELECT 'https://res.cloudinary.com/demo/image/upload/' || g || '.jpg',
+       NOW() + INTERVAL '30 days',
+       '[{"title": "result"}]'::jsonb
+FROM generate_series(1, 50000) AS g;
+
+INSERT INTO user_searches (user_id, image_cache_id, source_url, created_at)
+SELECT md5((g % 5000)::text)::uuid,
+       c.id,
+       'https://www.instagram.com/p/post' || (g % 50000) || '/',
+       NOW() - (g || ' seconds')::interval
+FROM generate_series(1, 200000) AS g
+JOIN (SELECT id, row_number() OVER () AS n FROM image_cache) c ON c.n = (g % 50000) + 1;
+
+-- Same DDL and backfill as the migration
+CREATE TABLE image_cache_sources (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    source_url_key TEXT NOT NULL,
+    image_cache_id UUID NOT NULL REFERENCES image_cache(id) ON DELETE CASCADE,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+CREATE UNIQUE INDEX ON image_cache_sources (source_url_key);
+CREATE INDEX ON image_cache_sources (image_cache_id);
+
+INSERT INTO image_cache_sources (source_url_key, image_cache_id, updated_at)
+SELECT DISTINCT ON (s.source_url) s.source_url, s.image_cache_id, s.created_at
+FROM user_searches s
+JOIN image_cache c ON c.id = s.image_cache_id
+WHERE s.source_url IS NOT NULL
+ORDER BY s.source_url, s.created_at DESC;
+
+ANALYZE;
+
+\echo '== Before: latest user_searches row for any lookup form, joined to image_cache =='
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT s.image_cache_id, c.*
+FROM user_searches s
+LEFT JOIN image_cache c ON c.id = s.image_cache_id
+WHERE s.source_url IN (
+    'http://instagram.com/p/post4242/?igsh=abc',
+    'https://www.instagram.com/p/post4242/',
+    'http://instagram.com/p/post4242/'
+)
+ORDER BY s.created_at DESC
+LIMIT 1;
+
+\echo '== After: image_cache_sources point read on the unique source_url_key index =='
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT m.image_cache_id, c.*
+FROM image_cache_sources m
+LEFT JOIN image_cache c ON c.id = m.image_cache_id
+WHERE m.source_url_key IN (
+    'http://instagram.com/p/post4242/?igsh=abc',
+    'https://www.instagram.com/p/post4242/',
+    'http://instagram.com/p/post4242/'
+)
+ORDER BY m.updated_at DESC
+LIMIT 1;
+
+DROP SCHEMA source_lookup_bench CASCADE;
@@ -0,0 +1,41 @@
+-- Bulk counter functions used by the server's write-behind counter buffer.
+-- The server aggregates cache hits / Instagram cache accesses in memory and
+-- flushes them as (id, increment) arrays instead of one RPC per hit.
+
+CREATE OR REPLACE FUNCTION increment_cache_hits_bulk(
+    cache_ids UUID[],
+    increments INTEGER[]
+)
+RETURNS VOID AS $$
+    UPDATE image_cache AS c
+    SET cache_hits = COALESCE(c.cache_hits, 0) + d.increment
+    FROM unnest(cache_ids, increments) AS d(id, increment)
+    WHERE c.id = d.id;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+-- Let explicit access_count writes through; plain updates still count as one access
+CREATE OR REPLACE FUNCTION update_instagram_cache_access()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.last_accessed_at = NOW();
+    IF NEW.access_count IS NOT DISTINCT FROM OLD.access_count THEN
+        NEW.access_count = COALESCE(OLD.access_count, 0) + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION increment_instagram_cache_access_bulk(
+    entry_ids BIGINT[],
+    increments INTEGER[]
+)
+RETURNS VOID AS $$
+    UPDATE instagram_url_cache AS c
+    SET access_count = COALESCE(c.access_count, 0) + d.increment,
+        last_accessed_at = NOW()
+    FROM unnest(entry_ids, increments) AS d(id, increment)
+    WHERE c.id = d.id;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION increment_cache_hits_bulk(UUID[], INTEGER[]) TO service_role;
+GRANT EXECUTE ON FUNCTION increment_instagram_cache_access_bulk(BIGINT[], INTEGER[]) TO service_role;
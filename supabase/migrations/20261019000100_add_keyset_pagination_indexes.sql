@@ -0,0 +1,9 @@
+-- Composite indexes backing (created_at, id) keyset pagination of history and favorites.
+-- get_user_searches_page / get_user_favorites_page filter by user_id and seek past the
+-- last (created_at, id) of the previous page, so every page is a single index range scan.
+
+CREATE INDEX IF NOT EXISTS idx_user_searches_user_created_id
+    ON user_searches (user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_user_favorites_user_created_id
+    ON user_favorites (user_id, created_at DESC, id DESC);
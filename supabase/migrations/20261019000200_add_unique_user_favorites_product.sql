@@ -0,0 +1,32 @@
+-- Ensure (user_id, product_id) is unique in user_favorites so bulk adds can use
+-- ON CONFLICT DO NOTHING and report duplicates per item.
+-- Existing duplicates are resolved by keeping the oldest row of each pair. The
+-- removed rows are copied to user_favorites_duplicates_backup first, so no
+-- favorite is lost; restore or drop that table once the duplicates are reviewed.
+
+CREATE TABLE IF NOT EXISTS user_favorites_duplicates_backup (LIKE user_favorites INCLUDING DEFAULTS);
+ALTER TABLE user_favorites_duplicates_backup ADD COLUMN IF NOT EXISTS backed_up_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+ALTER TABLE user_favorites_duplicates_backup ENABLE ROW LEVEL SECURITY;
+
+WITH ranked AS (
+    SELECT
+        id,
+        ROW_NUMBER() OVER (
+            PARTITION BY user_id, product_id
+            ORDER BY created_at ASC NULLS LAST, id ASC
+        ) AS rn
+    FROM user_favorites
+),
+removed AS (
+    DELETE FROM user_favorites
+    USING ranked
+    WHERE user_favorites.id = ranked.id
+      AND ranked.rn > 1
+    RETURNING user_favorites.*
+)
+INSERT INTO user_favorites_duplicates_backup
+SELECT removed.*, NOW() FROM removed;
+
+CREATE UNIQUE INDEX IF NOT EXISTS user_favorites_user_product_key
+    ON user_favorites (user_id, product_id);
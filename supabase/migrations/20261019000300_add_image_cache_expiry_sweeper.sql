@@ -0,0 +1,56 @@
+-- Batched sweeper for expired image_cache rows (driven by server/cache_sweeper.py).
+-- Expired rows were only filtered out at read time, so the table grew without bound.
+
+CREATE INDEX IF NOT EXISTS idx_image_cache_expires_at
+    ON image_cache (expires_at);
+
+-- Used by the NOT EXISTS check that keeps rows still shown in search history
+CREATE INDEX IF NOT EXISTS idx_user_searches_image_cache_id
+    ON user_searches (image_cache_id);
+
+CREATE TABLE IF NOT EXISTS image_cache_archive (LIKE image_cache INCLUDING DEFAULTS);
+ALTER TABLE image_cache_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+ALTER TABLE image_cache_archive ENABLE ROW LEVEL SECURITY;
+
+-- Removes at most p_batch_size expired rows, oldest first. Only orphaned rows are
+-- removed: anything still referenced from user_searches is kept.
+-- SKIP LOCKED lets concurrent sweepers and user traffic proceed without waiting.
+CREATE OR REPLACE FUNCTION sweep_expired_image_cache(
+    p_batch_size INTEGER DEFAULT 500,
+    p_archive BOOLEAN DEFAULT false
+)
+RETURNS INTEGER AS $$
+DECLARE
+    swept_count INTEGER;
+BEGIN
+    WITH batch AS (
+        SELECT c.id
+        FROM image_cache c
+        WHERE c.expires_at < NOW()
+          AND NOT EXISTS (
+              SELECT 1 FROM user_searches s WHERE s.image_cache_id = c.id
+          )
+        ORDER BY c.expires_at
+        LIMIT p_batch_size
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    deleted AS (
+        DELETE FROM image_cache c
+        USING batch
+        WHERE c.id = batch.id
+        RETURNING c.*
+    ),
+    archived AS (
+        INSERT INTO image_cache_archive
+        SELECT deleted.*, NOW() FROM deleted
+        WHERE p_archive
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO swept_count FROM deleted;
+
+    RETURN swept_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION sweep_expired_image_cache(INTEGER, BOOLEAN) TO service_role;
@@ -0,0 +1,22 @@
+-- Lightweight history rows for list screens.
+-- Only the thumbnail, title and counts are exposed; the detected_garments and
+-- search_results blobs stay behind v_user_recent_searches for the detail view.
+
+CREATE OR REPLACE VIEW v_user_search_summaries
+WITH (security_invoker = true) AS
+SELECT
+    s.id,
+    s.user_id,
+    s.created_at,
+    s.search_type,
+    s.source_url,
+    s.source_username,
+    s.image_cache_id,
+    c.cloudinary_url,
+    c.image_url,
+    c.total_results,
+    c.search_results -> 0 ->> 'title' AS title
+FROM user_searches s
+LEFT JOIN image_cache c ON c.id = s.image_cache_id;
+
+GRANT SELECT ON v_user_search_summaries TO authenticated, service_role;
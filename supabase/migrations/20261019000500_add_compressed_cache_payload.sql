@@ -0,0 +1,29 @@
+-- Optional compressed encoding for image_cache result payloads (see server/payload_codec.py).
+-- payload_format 0 keeps detected_garments/search_results as raw JSON; other formats
+-- store both in the base64 payload column. summary_title stays uncompressed for list views.
+
+ALTER TABLE image_cache ADD COLUMN IF NOT EXISTS payload_format SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE image_cache ADD COLUMN IF NOT EXISTS payload TEXT;
+ALTER TABLE image_cache ADD COLUMN IF NOT EXISTS summary_title TEXT;
+
+-- The sweeper archives whole rows, so the archive needs the same columns
+ALTER TABLE image_cache_archive ADD COLUMN IF NOT EXISTS payload_format SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE image_cache_archive ADD COLUMN IF NOT EXISTS payload TEXT;
+ALTER TABLE image_cache_archive ADD COLUMN IF NOT EXISTS summary_title TEXT;
+
+CREATE OR REPLACE VIEW v_user_search_summaries
+WITH (security_invoker = true) AS
+SELECT
+    s.id,
+    s.user_id,
+    s.created_at,
+    s.search_type,
+    s.source_url,
+    s.source_username,
+    s.image_cache_id,
+    c.cloudinary_url,
+    c.image_url,
+    c.total_results,
+    COALESCE(c.summary_title, c.search_results -> 0 ->> 'title') AS title
+FROM user_searches s
+LEFT JOIN image_cache c ON c.id = s.image_cache_id;
@@ -0,0 +1,12 @@
+-- Canonical cache key for image_cache.image_url (see server/url_canonicalizer.py).
+-- image_url keeps the URL as received so it can still be fetched; lookups match
+-- on image_url_key so equivalent URLs (Cloudinary transformations, rotating CDN
+-- signatures, http vs https) share one entry. Rows written before this column
+-- existed are still found by their raw image_url.
+
+ALTER TABLE image_cache ADD COLUMN IF NOT EXISTS image_url_key TEXT;
+-- Keep the sweeper's archive copy column-compatible
+ALTER TABLE image_cache_archive ADD COLUMN IF NOT EXISTS image_url_key TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_image_cache_url_key_country
+    ON image_cache (image_url_key, country);
@@ -0,0 +1,55 @@
+-- Let the expired-cache sweeper leave a grace period after expires_at, during which
+-- the server may still serve the entry stale while it re-identifies it in the
+-- background (see server/cache_refresher.py and CACHE_STALE_MAX_SECONDS).
+
+DROP FUNCTION IF EXISTS sweep_expired_image_cache(INTEGER, BOOLEAN);
+
+CREATE OR REPLACE FUNCTION sweep_expired_image_cache(
+    p_batch_size INTEGER DEFAULT 500,
+    p_archive BOOLEAN DEFAULT false,
+    p_grace_seconds INTEGER DEFAULT 0
+)
+RETURNS INTEGER AS $$
+DECLARE
+    swept_count INTEGER;
+BEGIN
+    WITH batch AS (
+        SELECT c.id
+        FROM image_cache c
+        WHERE c.expires_at < NOW() - make_interval(secs => p_grace_seconds)
+          AND NOT EXISTS (
+              SELECT 1 FROM user_searches s WHERE s.image_cache_id = c.id
+          )
+        ORDER BY c.expires_at
+        LIMIT p_batch_size
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    deleted AS (
+        DELETE FROM image_cache c
+        USING batch
+        WHERE c.id = batch.id
+        RETURNING c.*
+    ),
+    -- Matched by column name: columns added to image_cache after the archive was
+    -- created sit after archived_at, so a positional deleted.* no longer lines up
+    archived AS (
+        INSERT INTO image_cache_archive
+        SELECT (jsonb_populate_record(
+            NULL::image_cache_archive,
+            to_jsonb(deleted) || jsonb_build_object('archived_at', NOW())
+        )).*
+        FROM deleted
+        WHERE p_archive
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO swept_count FROM deleted;
+
+    RETURN swept_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION sweep_expired_image_cache(INTEGER, BOOLEAN, INTEGER) TO service_role;
+
+-- Refresh-ahead scans for popular entries that are about to expire
+CREATE INDEX IF NOT EXISTS idx_image_cache_expires_at_hits
+    ON image_cache (expires_at, cache_hits DESC);
@@ -0,0 +1,33 @@
+-- Source URL -> image_cache mapping (maintained by server/supabase_client.py).
+-- check_cache_by_source used to answer a global "has anyone analyzed this post?"
+-- question by filtering the per-user user_searches history on source_url,
+-- sorting by created_at and joining image_cache. This table holds one row per
+-- canonical source URL pointing at its latest cache entry, so the lookup is a
+-- unique-index point read.
+
+CREATE TABLE IF NOT EXISTS image_cache_sources (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    source_url_key TEXT NOT NULL,
+    image_cache_id UUID NOT NULL REFERENCES image_cache(id) ON DELETE CASCADE,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS image_cache_sources_source_url_key
+    ON image_cache_sources (source_url_key);
+
+-- Keeps the cascade from swept image_cache rows cheap
+CREATE INDEX IF NOT EXISTS idx_image_cache_sources_image_cache_id
+    ON image_cache_sources (image_cache_id);
+
+-- Only the service role reads or writes it
+ALTER TABLE image_cache_sources ENABLE ROW LEVEL SECURITY;
+
+-- Backfill from history: the latest search per stored source_url wins, as it did
+-- for the old ORDER BY created_at DESC lookup
+INSERT INTO image_cache_sources (source_url_key, image_cache_id, updated_at)
+SELECT DISTINCT ON (s.source_url) s.source_url, s.image_cache_id, s.created_at
+FROM user_searches s
+JOIN image_cache c ON c.id = s.image_cache_id
+WHERE s.source_url IS NOT NULL
+ORDER BY s.source_url, s.created_at DESC
+ON CONFLICT (source_url_key) DO NOTHING;
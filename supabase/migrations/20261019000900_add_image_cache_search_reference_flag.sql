@@ -0,0 +1,97 @@
+-- Mark image_cache rows that are still referenced from search history, so the
+-- expired-cache sweeper can seek straight to orphaned candidates. Filtering with
+-- NOT EXISTS alone made every batch rescan the growing set of expired rows that
+-- user_searches keeps alive before it reached anything it could delete.
+
+ALTER TABLE image_cache ADD COLUMN IF NOT EXISTS referenced_by_search BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE image_cache c
+SET referenced_by_search = true
+WHERE EXISTS (
+    SELECT 1 FROM user_searches s WHERE s.image_cache_id = c.id
+);
+
+-- Kept up to date from user_searches; SECURITY DEFINER because searches are
+-- written with the user's role, which cannot update image_cache
+CREATE OR REPLACE FUNCTION sync_image_cache_search_reference()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.image_cache_id IS NOT NULL THEN
+        UPDATE image_cache c
+        SET referenced_by_search = EXISTS (
+            SELECT 1 FROM user_searches s WHERE s.image_cache_id = c.id
+        )
+        WHERE c.id = OLD.image_cache_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.image_cache_id IS NOT NULL THEN
+        UPDATE image_cache
+        SET referenced_by_search = true
+        WHERE id = NEW.image_cache_id
+          AND NOT referenced_by_search;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS user_searches_image_cache_reference ON user_searches;
+CREATE TRIGGER user_searches_image_cache_reference
+    AFTER INSERT OR DELETE OR UPDATE OF image_cache_id ON user_searches
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_image_cache_search_reference();
+
+-- Only orphaned rows are sweep candidates, so the index stays small even when
+-- most expired entries are still shown in someone's history
+CREATE INDEX IF NOT EXISTS idx_image_cache_orphan_expires_at
+    ON image_cache (expires_at)
+    WHERE NOT referenced_by_search;
+
+CREATE OR REPLACE FUNCTION sweep_expired_image_cache(
+    p_batch_size INTEGER DEFAULT 500,
+    p_archive BOOLEAN DEFAULT false,
+    p_grace_seconds INTEGER DEFAULT 0
+)
+RETURNS INTEGER AS $$
+DECLARE
+    swept_count INTEGER;
+BEGIN
+    WITH batch AS (
+        SELECT c.id
+        FROM image_cache c
+        WHERE NOT c.referenced_by_search
+          AND c.expires_at < NOW() - make_interval(secs => p_grace_seconds)
+          -- The flag drives the index; this still guards against a search
+          -- written after the flag was read
+          AND NOT EXISTS (
+              SELECT 1 FROM user_searches s WHERE s.image_cache_id = c.id
+          )
+        ORDER BY c.expires_at
+        LIMIT p_batch_size
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    deleted AS (
+        DELETE FROM image_cache c
+        USING batch
+        WHERE c.id = batch.id
+        RETURNING c.*
+    ),
+    -- Matched by column name: columns added to image_cache after the archive was
+    -- created sit after archived_at, so a positional deleted.* no longer lines up
+    archived AS (
+        INSERT INTO image_cache_archive
+        SELECT (jsonb_populate_record(
+            NULL::image_cache_archive,
+            to_jsonb(deleted) || jsonb_build_object('archived_at', NOW())
+        )).*
+        FROM deleted
+        WHERE p_archive
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO swept_count FROM deleted;
+
+    RETURN swept_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION sweep_expired_image_cache(INTEGER, BOOLEAN, INTEGER) TO service_role;